@@ -0,0 +1,525 @@
+#!/usr/bin/env python3
+"""
+ADB Server 原生 Socket 客户端
+直接通过 smart-socket 协议与本地 adb server (默认 localhost:5037) 通信，
+避免每次调用都 fork 一个 adb 进程
+
+协议要点：
+- 请求：4 位十六进制长度 + 服务名，例如 "000Chost:devices"
+- 响应：OKAY 或 FAIL + 4 位十六进制长度 + 错误信息
+- 每条连接只能承载一个服务（host:devices / shell: / exec: 用完即关闭），
+  因此连接池缓存的是"已建立但未使用"的预热连接
+"""
+
+import asyncio
+import os
+import socket
+import select
+import subprocess
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================
+# 配置常量
+# ============================================================
+
+# 与 adb 命令行保持一致：支持 ANDROID_ADB_SERVER_ADDRESS / ANDROID_ADB_SERVER_PORT
+DEFAULT_HOST = os.environ.get('ANDROID_ADB_SERVER_ADDRESS', '127.0.0.1')
+DEFAULT_PORT = int(os.environ.get('ANDROID_ADB_SERVER_PORT', '5037'))
+DEFAULT_TIMEOUT = 30
+DEFAULT_POOL_SIZE = 4
+POOL_IDLE_SECONDS = 30  # 预热连接最长闲置时间，超时则丢弃重建
+READ_CHUNK_SIZE = 256 * 1024
+
+# 持久 shell 会话
+SHELL_SESSION_SERVICE = 'exec:sh'  # exec: 无 pty，不回显输入、不转换换行
+SENTINEL_PREFIX = '__SHOWPAGE_DONE_'
+DEFAULT_MAX_IN_FLIGHT = 4  # 已写入但未确认完成的批次上限
+FAILED_RETENTION = 256     # 失败批次号保留的范围（更早的失败记录丢弃，不再能被 wait 取到）
+
+
+class ADBError(Exception):
+    """ADB 通信或服务执行失败"""
+
+
+# ============================================================
+# 协议编解码
+# ============================================================
+
+def encode_request(service: str) -> bytes:
+    """按 smart-socket 协议编码服务请求"""
+    payload = service.encode('utf-8')
+    return f'{len(payload):04x}'.encode('ascii') + payload
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    """精确读取 size 个字节，连接提前关闭则抛出 ADBError"""
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise ADBError('adb server 连接意外关闭')
+        buf += chunk
+    return bytes(buf)
+
+
+def _recv_until_close(sock: socket.socket) -> bytes:
+    """读取直到对端关闭连接（shell:/exec: 服务的输出以 EOF 结束）"""
+    chunks = []
+    while True:
+        chunk = sock.recv(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+
+def _read_length_prefixed(sock: socket.socket) -> bytes:
+    """读取 4 位十六进制长度前缀的数据块"""
+    length = int(_recv_exact(sock, 4), 16)
+    return _recv_exact(sock, length)
+
+
+def read_status(sock: socket.socket, service: str) -> None:
+    """读取 OKAY/FAIL 状态，FAIL 时抛出带服务端信息的 ADBError"""
+    status = _recv_exact(sock, 4)
+    if status == b'OKAY':
+        return
+    if status == b'FAIL':
+        message = _read_length_prefixed(sock).decode('utf-8', errors='replace')
+        raise ADBError(f'{service} 执行失败: {message}')
+    raise ADBError(f'{service} 返回未知状态: {status!r}')
+
+
+def parse_devices(text: str) -> List[Tuple[str, str]]:
+    """解析 host:devices 的输出，返回 [(serial, status), ...]"""
+    devices = []
+    for line in text.strip().split('\n'):
+        parts = line.strip().split('\t')
+        if len(parts) >= 2:
+            devices.append((parts[0], parts[1]))
+    return devices
+
+
+# ============================================================
+# 客户端
+# ============================================================
+
+class ADBClient:
+    """
+    adb server smart-socket 客户端（线程安全）
+
+    参数:
+        host / port: adb server 地址，默认与 adb 命令行一致
+        serial: 默认目标设备序列号，None 表示 transport-any
+        timeout: 单次服务的 socket 超时（秒）
+        pool_size: 预热连接池大小，0 表示不使用连接池
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 serial: Optional[str] = None, timeout: float = DEFAULT_TIMEOUT,
+                 pool_size: int = DEFAULT_POOL_SIZE):
+        self.host = host
+        self.port = port
+        self.serial = serial
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._pool: deque = deque()  # [(socket, 建立时间), ...]
+        self._lock = threading.Lock()
+        self._server_started = False
+        self._warming = False  # 后台补充线程是否在运行
+
+    # ---------------- 连接管理 ----------------
+
+    def _connect(self) -> socket.socket:
+        """建立到 adb server 的新连接，server 未启动时尝试 adb start-server 一次"""
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        except ConnectionRefusedError:
+            if self._server_started:
+                raise ADBError(f'无法连接 adb server {self.host}:{self.port}')
+            self._server_started = True
+            logger.info('adb server 未运行，尝试 adb start-server')
+            try:
+                subprocess.run(['adb', 'start-server'], capture_output=True,
+                               timeout=self.timeout, check=True)
+            except (OSError, subprocess.SubprocessError) as e:
+                raise ADBError(f'启动 adb server 失败: {e}')
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    @staticmethod
+    def _is_alive(sock: socket.socket) -> bool:
+        """闲置连接可读即意味着对端已关闭（未发请求前 server 不会主动发送数据）"""
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        return not readable
+
+    def _acquire(self) -> socket.socket:
+        """从连接池取出一个预热连接，没有则新建"""
+        now = time.monotonic()
+        with self._lock:
+            while self._pool:
+                sock, created = self._pool.pop()
+                if now - created < POOL_IDLE_SECONDS and self._is_alive(sock):
+                    sock.settimeout(self.timeout)
+                    return sock
+                sock.close()
+        return self._connect()
+
+    def warm(self) -> None:
+        """补满预热连接池（失败时静默，下次调用时再直接建连）"""
+        while True:
+            with self._lock:
+                if len(self._pool) >= self.pool_size:
+                    return
+            try:
+                sock = self._connect()
+            except (OSError, ADBError):
+                return
+            with self._lock:
+                if len(self._pool) >= self.pool_size:
+                    sock.close()
+                    return
+                self._pool.append((sock, time.monotonic()))
+
+    def _warm_in_background(self) -> None:
+        """连接用完后在后台线程补充连接池，调用方不等待新连接建立"""
+        with self._lock:
+            if self._warming or len(self._pool) >= self.pool_size:
+                return
+            self._warming = True
+        threading.Thread(target=self._warm_worker, daemon=True).start()
+
+    def _warm_worker(self) -> None:
+        try:
+            self.warm()
+        finally:
+            with self._lock:
+                self._warming = False
+
+    def close(self) -> None:
+        """关闭连接池中所有闲置连接"""
+        with self._lock:
+            while self._pool:
+                self._pool.pop()[0].close()
+
+    # ---------------- 服务调用 ----------------
+
+    def _host_request(self, service: str) -> bytes:
+        """执行 host:* 服务，返回长度前缀数据"""
+        sock = self._acquire()
+        try:
+            sock.sendall(encode_request(service))
+            read_status(sock, service)
+            return _read_length_prefixed(sock)
+        except OSError as e:
+            raise ADBError(f'{service} 通信失败: {e}')
+        finally:
+            sock.close()
+            self._warm_in_background()
+
+    def open_service(self, service: str, serial: Optional[str] = None) -> socket.socket:
+        """
+        切换到目标设备 transport 并打开设备服务，返回已就绪的 socket
+
+        调用方负责读取输出并关闭 socket，可用于流式读写（如交互式 shell:）。
+        """
+        serial = serial if serial is not None else self.serial
+        transport = f'host:transport:{serial}' if serial else 'host:transport-any'
+        sock = self._acquire()
+        try:
+            sock.sendall(encode_request(transport))
+            read_status(sock, transport)
+            sock.sendall(encode_request(service))
+            read_status(sock, service)
+            return sock
+        except OSError as e:
+            sock.close()
+            raise ADBError(f'{service} 通信失败: {e}')
+        except ADBError:
+            sock.close()
+            raise
+
+    def _device_request(self, service: str, serial: Optional[str]) -> bytes:
+        sock = self.open_service(service, serial)
+        try:
+            return _recv_until_close(sock)
+        except OSError as e:
+            raise ADBError(f'{service} 读取输出失败: {e}')
+        finally:
+            sock.close()
+            self._warm_in_background()
+
+    def devices(self) -> List[Tuple[str, str]]:
+        """等价于 adb devices，返回 [(serial, status), ...]"""
+        data = self._host_request('host:devices')
+        return parse_devices(data.decode('utf-8', errors='replace'))
+
+    def shell(self, command: str, serial: Optional[str] = None) -> bytes:
+        """等价于 adb shell <command>，返回合并后的输出（shell v1 无退出码）"""
+        return self._device_request(f'shell:{command}', serial)
+
+    def exec_out(self, command: str, serial: Optional[str] = None) -> bytes:
+        """等价于 adb exec-out <command>，返回未经 pty 转换的原始二进制输出"""
+        return self._device_request(f'exec:{command}', serial)
+
+
+# ============================================================
+# asyncio 客户端
+# ============================================================
+
+class AsyncADBClient:
+    """
+    adb server smart-socket 客户端（asyncio 版本，供 async_proxy 使用）
+
+    建连本身不阻塞事件循环，因此不维护连接池；每个服务使用一条新连接。
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 timeout: float = DEFAULT_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    async def _open(self):
+        try:
+            return await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), self.timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise ADBError(f'无法连接 adb server {self.host}:{self.port}: {e}')
+
+    @staticmethod
+    async def _read_status(reader: asyncio.StreamReader, service: str) -> None:
+        status = await reader.readexactly(4)
+        if status == b'OKAY':
+            return
+        if status == b'FAIL':
+            length = int(await reader.readexactly(4), 16)
+            message = (await reader.readexactly(length)).decode('utf-8', errors='replace')
+            raise ADBError(f'{service} 执行失败: {message}')
+        raise ADBError(f'{service} 返回未知状态: {status!r}')
+
+    async def _request(self, services: List[str], length_prefixed: bool) -> bytes:
+        """依次发送服务请求，返回最后一个服务的输出"""
+        reader, writer = await self._open()
+        try:
+            for service in services:
+                writer.write(encode_request(service))
+                await writer.drain()
+                await self._read_status(reader, service)
+            if length_prefixed:
+                length = int(await reader.readexactly(4), 16)
+                return await reader.readexactly(length)
+            return await reader.read()
+        except asyncio.IncompleteReadError:
+            raise ADBError(f'{services[-1]} 连接意外关闭')
+        except OSError as e:
+            raise ADBError(f'{services[-1]} 通信失败: {e}')
+        finally:
+            writer.close()
+
+    async def _with_timeout(self, coro):
+        try:
+            return await asyncio.wait_for(coro, self.timeout)
+        except asyncio.TimeoutError:
+            raise ADBError(f'adb 请求超时 ({self.timeout}s)')
+
+    async def devices(self) -> List[Tuple[str, str]]:
+        data = await self._with_timeout(self._request(['host:devices'], True))
+        return parse_devices(data.decode('utf-8', errors='replace'))
+
+    async def _device_request(self, service: str, serial: Optional[str]) -> bytes:
+        transport = f'host:transport:{serial}' if serial else 'host:transport-any'
+        return await self._with_timeout(self._request([transport, service], False))
+
+    async def shell(self, command: str, serial: Optional[str] = None) -> bytes:
+        return await self._device_request(f'shell:{command}', serial)
+
+    async def exec_out(self, command: str, serial: Optional[str] = None) -> bytes:
+        return await self._device_request(f'exec:{command}', serial)
+
+
+# ============================================================
+# 持久 shell 会话
+# ============================================================
+
+class ShellSession:
+    """
+    单设备长连接 shell 会话
+
+    命令行直接写入远端 sh 的 stdin，每个批次末尾追加一条 echo 哨兵，
+    后台读线程看到哨兵回显即认为该批次执行完毕。
+
+    - submit() 立即写入并返回批次号，调用方可边规划边下发
+    - 已写入未完成的批次数受 max_in_flight 限制，超出时 submit 阻塞
+    - 连接断开时未完成的批次全部标记失败（点击不幂等，不自动重放），
+      下一次 submit 自动重连
+    - 写入失败时该批次可能已经部分送达并执行，同样不重试，直接抛出 ADBError
+    """
+
+    def __init__(self, client: ADBClient, serial: Optional[str] = None,
+                 max_in_flight: int = DEFAULT_MAX_IN_FLIGHT):
+        self.client = client
+        self.serial = serial
+        self._window = threading.BoundedSemaphore(max_in_flight)
+        self._write_lock = threading.Lock()  # 保证批次按顺序整体写入
+        self._cond = threading.Condition()   # 保护以下状态
+        self._sock: Optional[socket.socket] = None
+        self._next_seq = 0
+        self._pending: set = set()
+        self._failed: set = set()
+        self._lowest_retained = 0  # 低于此批次号的失败记录可能已丢弃，结果不可知
+
+    def _ensure_open(self) -> socket.socket:
+        """返回当前连接，断开时重连并启动读线程（调用方持有 _write_lock）"""
+        with self._cond:
+            if self._sock is not None:
+                return self._sock
+        sock = self.client.open_service(SHELL_SESSION_SERVICE, self.serial)
+        sock.settimeout(None)
+        with self._cond:
+            self._sock = sock
+        threading.Thread(target=self._read_loop, args=(sock,), daemon=True).start()
+        logger.debug(f'shell 会话已建立 ({self.serial or "any"})')
+        return sock
+
+    def _finish(self, seq: int, ok: bool) -> None:
+        """标记批次完成或失败，并归还窗口名额（调用方持有 _cond）"""
+        if seq not in self._pending:
+            return
+        self._pending.discard(seq)
+        if not ok:
+            self._failed.add(seq)
+            # 不被 wait 的失败批次不能无限累积
+            self._lowest_retained = max(self._lowest_retained, self._next_seq - FAILED_RETENTION)
+            self._failed = {s for s in self._failed if s >= self._lowest_retained}
+        self._window.release()
+        self._cond.notify_all()
+
+    def _drop(self, sock: socket.socket, reason: str) -> None:
+        """连接失效：关闭 socket，未完成批次全部标记失败"""
+        with self._cond:
+            if self._sock is sock:
+                self._sock = None
+                if self._pending:
+                    logger.warning(f'shell 会话断开，{len(self._pending)} 个批次未确认: {reason}')
+                for seq in list(self._pending):
+                    self._finish(seq, False)
+        try:
+            sock.close()
+        except OSError:
+            pass
+
+    def _read_loop(self, sock: socket.socket) -> None:
+        """读线程：解析哨兵回显，其余输出记为警告"""
+        buf = b''
+        reason = '对端关闭连接'
+        try:
+            while True:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                buf += chunk
+                *lines, buf = buf.split(b'\n')
+                for line in lines:
+                    text = line.decode('utf-8', errors='replace').strip()
+                    if text.startswith(SENTINEL_PREFIX):
+                        seq = int(text[len(SENTINEL_PREFIX):])
+                        with self._cond:
+                            self._finish(seq, True)
+                    elif text:
+                        logger.warning(f'shell 输出: {text}')
+        except (OSError, ValueError) as e:
+            reason = str(e)
+        self._drop(sock, reason)
+
+    def submit(self, lines: List[str]) -> int:
+        """写入一批命令，返回批次号；窗口已满时阻塞等待"""
+        if not self._window.acquire(timeout=self.client.timeout):
+            raise ADBError('shell 会话等待执行窗口超时')
+        with self._write_lock:
+            try:
+                sock = self._ensure_open()
+            except ADBError:
+                self._window.release()
+                raise
+            with self._cond:
+                seq = self._next_seq
+                self._next_seq += 1
+                self._pending.add(seq)
+            payload = '\n'.join(list(lines) + [f'echo {SENTINEL_PREFIX}{seq}']) + '\n'
+            try:
+                sock.sendall(payload.encode('utf-8'))
+            except OSError as e:
+                # sendall 失败时可能已写入部分命令，重发会重复点击：本批次直接失败，
+                # 归还窗口名额（读线程可能已先关闭连接），下一次 submit 重连
+                self._drop(sock, str(e))
+                with self._cond:
+                    self._finish(seq, False)
+                    self._failed.discard(seq)
+                raise ADBError(f'shell 会话写入失败（批次可能已部分执行）: {e}')
+        return seq
+
+    def done(self, seq: int) -> bool:
+        """批次是否已结束（成功或失败），不阻塞"""
+        with self._cond:
+            return seq not in self._pending
+
+    def wait(self, seq: int, timeout: Optional[float] = None) -> None:
+        """等待批次执行完毕，失败、超时或结果已丢弃（早于 FAILED_RETENTION 范围）时抛出 ADBError"""
+        timeout = timeout if timeout is not None else self.client.timeout
+        with self._cond:
+            if not self._cond.wait_for(lambda: seq not in self._pending, timeout):
+                raise ADBError(f'shell 批次 {seq} 等待超时')
+            if seq < self._lowest_retained:
+                raise ADBError(f'shell 批次 {seq} 的结果已丢弃，无法确认是否执行成功')
+            if seq in self._failed:
+                self._failed.discard(seq)
+                raise ADBError(f'shell 批次 {seq} 执行中连接断开')
+
+    def run(self, lines: List[str], timeout: Optional[float] = None) -> None:
+        """写入一批命令并等待完成"""
+        self.wait(self.submit(lines), timeout)
+
+    def close(self) -> None:
+        with self._cond:
+            sock = self._sock
+        if sock is not None:
+            self._drop(sock, '会话关闭')
+
+
+# 进程内共享的默认客户端，adb_proxy 与 puzzle_solver 默认通过它访问设备
+_default_client: Optional[ADBClient] = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client() -> ADBClient:
+    """返回进程内共享的默认 ADBClient（懒加载）"""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = ADBClient()
+        return _default_client
+
+
+_shell_sessions: Dict[Optional[str], ShellSession] = {}
+
+
+def get_shell_session(serial: Optional[str] = None) -> ShellSession:
+    """返回指定设备的共享 shell 会话（基于默认客户端，懒加载）"""
+    client = get_default_client()
+    with _default_client_lock:
+        session = _shell_sessions.get(serial)
+        if session is None:
+            session = _shell_sessions[serial] = ShellSession(client, serial)
+        return session
@@ -6,19 +6,27 @@ ADB 代理服务器
 
 from logger_config import setup_logger
 from bugcatcher_constants import JSONKeys
-from bugcatcher_solver import solve_puzzle
-from bugcatcher_recognizer import recognize_bugs
+from bugcatcher_recognizer import recognize_bugs_from_source
+from adb_client import ADBError, get_default_client, get_shell_session
+from device_lane import KnownDevices, configure_lanes, get_device_lane, shutdown_lanes
+from frame_grabber import get_frame_grabber
+from image_source import encode_png
+from raw_frame import RawFrame, parse_raw_screencap
+from screenshot_render import (FORMAT_PNG, FORMAT_RAW, METADATA_HEADERS, parse_roi,
+                               parse_scale, render_screenshot)
+import glyph_cache
+import metrics
+import nonogram_race
 import nonogram_recognizer
-import nonogram_solver
+import solution_cache
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from concurrent.futures import ThreadPoolExecutor
-import subprocess
 import json
 import sys
+import time
 import base64
 import os
-import tempfile
-from pathlib import Path
+from urllib.parse import parse_qs, urlparse
 import logging
 
 # 添加当前目录到 path 以便导入模块
@@ -37,20 +45,97 @@ class Status:
 
 class HttpCode:
     OK = 200
+    BAD_REQUEST = 400
     NOT_FOUND = 404
     SERVER_ERROR = 500
+    SERVICE_UNAVAILABLE = 503
 
 
 class Config:
     DEFAULT_PORT = 8085
-    DEVICE_TIMEOUT = 5
     DEFAULT_TIMEOUT = 30
     MAX_WORKERS = 10  # 限制并发请求数，防止线程膨胀导致性能退化
 
 
+# 指标中的 endpoint 标签只使用已知路由，避免任意路径造成标签膨胀
+ENDPOINTS = {'/health', '/devices', '/screenshot', '/analyze-nonogram', '/solve-bugcatcher',
+             '/race-nonogram', '/race-nonogram/stream', '/tap', '/solve-nonogram', '/metrics'}
+
+
+def endpoint_label(route: str) -> str:
+    return route if route in ENDPOINTS else 'other'
+
+
+_known_devices = KnownDevices()
+
+
+def is_known_device(device) -> bool:
+    """device 参数是否为已连接的设备（None 表示默认设备）"""
+    known = _known_devices.lookup(device)
+    if known is None:
+        try:
+            _known_devices.update(get_default_client().devices())
+        except ADBError as e:
+            logger.warning(f"获取设备列表失败，无法校验设备 {device}: {e}")
+            return False
+        known = _known_devices.lookup(device)
+    return bool(known)
+
+
+def device_label(device) -> str:
+    """指标中的 device 标签：未连接的设备统一记为 invalid，避免任意参数造成标签膨胀"""
+    return device if is_known_device(device) else metrics.INVALID_DEVICE
+
+
+# /screenshot 的兼容格式：base64 编码的 PNG 包在 JSON 中
+SCREENSHOT_FORMAT_JSON = 'json'
+
+
 class ADBCommand:
-    DEVICES = ['adb', 'devices']
-    SCREENCAP = ['adb', 'exec-out', 'screencap', '-p']
+    """设备端命令，通过 adb server socket 发送（见 adb_client）"""
+    SCREENCAP = 'screencap -p'
+    SCREENCAP_RAW = 'screencap'  # 不带 -p：输出原始帧缓冲，省去设备端 PNG 编码
+
+
+def analyze_nonogram_constraints(source, device=None) -> dict:
+    """使用本地识别器分析数织游戏的行约束和列约束（source 为原始帧或 PNG 字节，
+    device 的约束区域变化检测状态见 nonogram_recognizer.get_tracker）"""
+    try:
+        logger.info("开始使用本地识别器分析数织约束")
+        result = nonogram_recognizer.recognize_from_source(
+            source, tracker=nonogram_recognizer.get_tracker(device))
+        pos = result.get('pos')
+        game_area = None
+        if pos and len(pos) == 2:
+            x1, y1 = pos[0]
+            x2, y2 = pos[1]
+            game_area = {'startX': x1, 'startY': y1,
+                         'gridWidth': x2 - x1, 'gridHeight': y2 - y1}
+            logger.debug(f"识别到游戏区域: 起点({x1},{y1}), 尺寸({x2-x1}x{y2-y1})")
+
+        data = {'row': result.get('row', '').replace(
+            '\n', '\\n'), 'col': result.get('col', '').replace('\n', '\\n')}
+        if game_area:
+            data['gameArea'] = game_area
+        logger.info(
+            f"本地识别成功: row={data['row'][:30]}..., col={data['col'][:30]}...")
+        return data
+
+    except Exception as e:
+        raise Exception(f'本地识别失败: {str(e)}')
+
+
+def plan_bugcatcher_taps(puzzle_data, solution) -> list[tuple[int, int]]:
+    """根据“田地捉虫”的解生成点击坐标：每个虫子所在格子的中心点击两次"""
+    solution_set = set(solution)
+    taps = []
+    for cell in puzzle_data[JSONKeys.CELLS]:
+        if (cell[JSONKeys.ROW], cell[JSONKeys.COL]) in solution_set:
+            center = (cell[JSONKeys.X] + cell[JSONKeys.W] // 2,
+                      cell[JSONKeys.Y] + cell[JSONKeys.H] // 2)
+            taps.append(center)
+            taps.append(center)
+    return taps
 
 
 class ADBProxyHandler(BaseHTTPRequestHandler):
@@ -64,64 +149,138 @@ class ADBProxyHandler(BaseHTTPRequestHandler):
 
     def do_GET(self):
         """处理 GET 请求"""
-        if self.path == '/health':
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        device = query.get('device', [None])[0]
+        with metrics.track_request(endpoint_label(parsed.path), device_label(device)):
+            self._route_get(parsed.path, query, device)
+
+    def _route_get(self, route, query, device):
+        if route == '/health':
             self.send_json_response({
                 'status': 'ok',
-                'message': 'ADB 代理服务器运行中'
+                'message': 'ADB 代理服务器运行中',
+                'solution_cache': solution_cache.stats(),
+                'glyph_cache': glyph_cache.stats()
             })
-        elif self.path == '/devices':
+        elif route == '/devices':
             self._handle_get_devices()
-        elif self.path == '/screenshot':
-            self._handle_get_screenshot()
-        elif self.path == '/analyze-nonogram':
-            self._handle_analyze_nonogram()
-        elif self.path == '/solve-bugcatcher':
-            self._handle_solve_bugcatcher()
+        elif route == '/metrics':
+            self.send_bytes_response(metrics.render().encode('utf-8'), metrics.CONTENT_TYPE)
+        elif route == '/screenshot':
+            self._dispatch_device(device, self._handle_get_screenshot, query)
+        elif route == '/analyze-nonogram':
+            self._dispatch_device(device, self._handle_analyze_nonogram, query)
+        elif route == '/solve-bugcatcher':
+            self._dispatch_device(device, self._handle_solve_bugcatcher, query)
+        elif route == '/race-nonogram':
+            self._dispatch_device(device, self._handle_race_nonogram, query)
+        elif route == '/race-nonogram/stream':
+            self._dispatch_device(device, self._handle_race_nonogram_stream, query)
         else:
             self.send_error(HttpCode.NOT_FOUND, "Endpoint not found")
 
+    def _dispatch_device(self, device, handler, *args):
+        """按设备准入后执行 handler(device, *args)：未连接的设备返回 400，设备名额已满时返回 503"""
+        if not is_known_device(device):
+            self.send_json_response(
+                {'status': Status.ERROR, 'message': f"未知设备: {device}"}, HttpCode.BAD_REQUEST)
+            return
+        lane = get_device_lane(device)
+        if not lane.try_admit():
+            logger.warning(f"设备 {device or '默认'} 繁忙，拒绝请求 {self.path}")
+            self.send_json_response(
+                {'status': Status.ERROR, 'message': f"设备 {device or '默认'} 繁忙，请稍后重试"},
+                HttpCode.SERVICE_UNAVAILABLE)
+            return
+        try:
+            handler(device, *args)
+        finally:
+            lane.release()
+
+    def _dispatch_tap(self, device, post_data):
+        """点击单独准入：名额已满时短暂排队，不与截图类请求争抢名额"""
+        if not is_known_device(device):
+            self.send_json_response(
+                {'status': Status.ERROR, 'message': f"未知设备: {device}"}, HttpCode.BAD_REQUEST)
+            return
+        lane = get_device_lane(device)
+        if not lane.admit_tap():
+            logger.warning(f"设备 {device or '默认'} 点击排队超时，拒绝请求 {self.path}")
+            self.send_json_response(
+                {'status': Status.ERROR, 'message': f"设备 {device or '默认'} 点击繁忙，请稍后重试"},
+                HttpCode.SERVICE_UNAVAILABLE)
+            return
+        try:
+            self._handle_post_tap(device, post_data)
+        finally:
+            lane.release_tap()
+
     def _handle_get_devices(self):
         try:
-            result = subprocess.run(
-                ADBCommand.DEVICES, capture_output=True, text=True, timeout=Config.DEVICE_TIMEOUT
-            )
-            devices = []
-            for line in result.stdout.strip().split('\n')[1:]:
-                if line.strip():
-                    parts = line.split('\t')
-                    if len(parts) >= 2:
-                        devices.append(
-                            {'serial': parts[0], 'status': parts[1]})
+            devices = [{'serial': serial, 'status': status}
+                       for serial, status in get_default_client().devices()]
             self.send_json_response({'status': Status.OK, 'devices': devices})
         except Exception as e:
             logger.error(f"获取设备列表失败: {e}", exc_info=True)
             self.send_json_response(
                 {'status': Status.ERROR, 'message': str(e)}, HttpCode.SERVER_ERROR)
 
-    def _handle_get_screenshot(self):
+    def _handle_get_screenshot(self, device, query):
+        try:
+            image_format = query.get('format', [FORMAT_PNG])[0]
+            roi = parse_roi(query.get('roi', [None])[0])
+            scale = parse_scale(query.get('scale', [None])[0])
+            max_age_ms = self._query_max_age(query)
+        except ValueError as e:
+            self.send_json_response(
+                {'status': Status.ERROR, 'message': str(e)}, HttpCode.BAD_REQUEST)
+            return
+
         try:
             logger.info("开始获取设备截图")
-            base64_data = self._capture_screenshot()
-            # 用公式估算原始大小，避免全量 base64 解码
-            estimated_size = len(base64_data) * 3 // 4
-            self.send_json_response({
-                'status': Status.OK,
-                'data': base64_data,
-                'format': 'png',
-                'size': estimated_size
-            })
-            logger.info(f"截图获取成功，约 {estimated_size} 字节")
+            if image_format == SCREENSHOT_FORMAT_JSON:
+                base64_data = self._capture_screenshot(device, max_age_ms)
+                # 用公式估算原始大小，避免全量 base64 解码
+                estimated_size = len(base64_data) * 3 // 4
+                self.send_json_response({
+                    'status': Status.OK,
+                    'data': base64_data,
+                    'format': 'png',
+                    'size': estimated_size
+                })
+                logger.info(f"截图获取成功，约 {estimated_size} 字节")
+                return
+
+            if image_format == FORMAT_RAW:
+                raw_bytes = self._capture_raw_bytes(device, max_age_ms)
+                try:
+                    source = parse_raw_screencap(raw_bytes)
+                except ValueError as e:
+                    raise Exception(f'原始帧不可用: {e}')
+            else:
+                source = self._capture_image_source(device, max_age_ms)
+            body, content_type, headers = render_screenshot(source, image_format, roi, scale)
+            if image_format == FORMAT_RAW and roi is None and scale == 1.0:
+                # 不裁剪不缩放时原样返回设备输出，省去一次复制
+                body = raw_bytes
+            self.send_bytes_response(body, content_type, headers=headers)
+            logger.info(f"截图获取成功（{image_format}），{len(body)} 字节")
+        except ValueError as e:
+            logger.error(f"截图参数无效: {e}")
+            self.send_json_response(
+                {'status': Status.ERROR, 'message': str(e)}, HttpCode.BAD_REQUEST)
         except Exception as e:
             logger.error(f"截图处理异常: {e}", exc_info=True)
             self.send_json_response(
                 {'status': Status.ERROR, 'message': str(e)}, HttpCode.SERVER_ERROR)
 
-    def _handle_analyze_nonogram(self):
+    def _handle_analyze_nonogram(self, device, query):
         try:
             logger.info("开始分析数织游戏约束")
-            # 直接使用原始 PNG 字节，避免 base64 编解码开销
-            png_bytes = self._capture_screenshot_bytes()
-            constraints = self._analyze_nonogram_constraints(png_bytes)
+            # 截图在内存中直接交给识别器，不落盘
+            source = self._capture_image_source(device, self._query_max_age(query))
+            constraints = analyze_nonogram_constraints(source, device)
             response_data = {'status': Status.OK, 'row': constraints.get(
                 'row', ''), 'col': constraints.get('col', '')}
             if 'gameArea' in constraints:
@@ -133,50 +292,27 @@ class ADBProxyHandler(BaseHTTPRequestHandler):
             self.send_json_response(
                 {'status': Status.ERROR, 'message': str(e)}, HttpCode.SERVER_ERROR)
 
-    def _handle_solve_bugcatcher(self):
+    def _handle_solve_bugcatcher(self, device, query):
         logger.info("开始“田地捉虫”自动化流程")
-        temp_path = None
         try:
-            # 直接获取原始 PNG 字节，避免 base64 编解码开销
-            png_bytes = self._capture_screenshot_bytes()
-            with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_file:
-                tmp_file.write(png_bytes)
-                temp_path = tmp_file.name
-            logger.info(f"截图已临时保存到 {temp_path}")
-
-            puzzle_data, _ = recognize_bugs(
-                str(temp_path), output_path=None, debug=False)
+            # 截图在内存中直接交给识别器，不落盘
+            source = self._capture_image_source(device, self._query_max_age(query))
+            puzzle_data, _ = recognize_bugs_from_source(
+                source, output_path=None, debug=False)
             if not puzzle_data:
                 raise Exception("图像识别返回空数据")
             logger.info("图像识别成功")
 
-            solution = solve_puzzle(puzzle_data)
+            solution = solution_cache.solve_bugcatcher(puzzle_data)
             if not solution:
                 raise Exception("谜题求解失败")
             logger.info(f"谜题求解成功，找到 {len(solution)} 个虫子。")
 
-            solution_set = set(solution)
-            taps = []
-            # taps = [
-            #     (cell[JSONKeys.X] + cell[JSONKeys.W] // 2,
-            #      cell[JSONKeys.Y] + cell[JSONKeys.H] // 2)
-            #     for cell in puzzle_data[JSONKeys.CELLS]
-            #     if (cell[JSONKeys.ROW], cell[JSONKeys.COL]) not in solution_set
-            # ]
-            # for cell in puzzle_data[JSONKeys.CELLS]:
-            #     if (cell[JSONKeys.ROW], cell[JSONKeys.COL]) not in solution_set:
-            #         taps.append((cell[JSONKeys.X] + cell[JSONKeys.W] //
-            #                     2, cell[JSONKeys.Y] + cell[JSONKeys.H] // 2))
-            for cell in puzzle_data[JSONKeys.CELLS]:
-                if (cell[JSONKeys.ROW], cell[JSONKeys.COL]) in solution_set:
-                    taps.append((cell[JSONKeys.X] + cell[JSONKeys.W] //
-                                2, cell[JSONKeys.Y] + cell[JSONKeys.H] // 2))
-                    taps.append((cell[JSONKeys.X] + cell[JSONKeys.W] //
-                                2, cell[JSONKeys.Y] + cell[JSONKeys.H] // 2))
+            taps = plan_bugcatcher_taps(puzzle_data, solution)
 
             if taps:
                 logger.info(f"准备点击 {len(taps)} 个单元格")
-                self._batch_tap(taps)
+                self._batch_tap(taps, device)
                 logger.info("点击命令发送成功")
 
             self.send_json_response({
@@ -189,25 +325,90 @@ class ADBProxyHandler(BaseHTTPRequestHandler):
             logger.error(f"“田地捉虫”自动化流程失败: {str(e)}", exc_info=True)
             self.send_json_response(
                 {'status': Status.ERROR, 'message': str(e)}, HttpCode.SERVER_ERROR)
-        finally:
-            if temp_path and os.path.exists(temp_path):
-                os.remove(temp_path)
-                logger.info(f"临时截图 {temp_path} 已删除")
+
+    def _handle_race_nonogram(self, device, query):
+        """竞速一轮：截图、识别、求解、点击全部在服务端完成，返回各阶段耗时"""
+        try:
+            area = nonogram_race.parse_area(query.get('area', [None])[0])
+            result = self._race_round(device, area)
+            self.send_json_response({'status': Status.OK, **result})
+        except Exception as e:
+            logger.error(f"数织竞速失败: {e}", exc_info=True)
+            self.send_json_response(
+                {'status': Status.ERROR, 'message': str(e)}, HttpCode.SERVER_ERROR)
+
+    def _handle_race_nonogram_stream(self, device, query):
+        """连续竞速：每完成一轮输出一行 JSON（NDJSON），出错、达到 rounds 或客户端断开时结束"""
+        try:
+            area = nonogram_race.parse_area(query.get('area', [None])[0])
+            rounds = int(query.get('rounds', [0])[0])  # 0 表示不限轮数
+            interval = float(query.get('interval_ms', [0])[0]) / 1000
+        except ValueError as e:
+            self.send_json_response(
+                {'status': Status.ERROR, 'message': str(e)}, HttpCode.BAD_REQUEST)
+            return
+
+        self.send_response(HttpCode.OK)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        session = nonogram_race.RaceSession()
+        round_index = 0
+        try:
+            while not rounds or round_index < rounds:
+                round_index += 1
+                try:
+                    line = {'status': Status.OK, 'round': round_index,
+                            **self._race_round(device, area, session)}
+                except Exception as e:
+                    logger.error(f"数织竞速第 {round_index} 轮失败: {e}", exc_info=True)
+                    line = {'status': Status.ERROR, 'round': round_index, 'message': str(e)}
+                self.wfile.write(json.dumps(line, ensure_ascii=False).encode('utf-8') + b'\n')
+                self.wfile.flush()
+                if line['status'] == Status.ERROR:
+                    break
+                time.sleep(interval)
+        except (BrokenPipeError, ConnectionResetError):
+            logger.info(f"客户端已断开，连续竞速在第 {round_index} 轮结束")
+
+    def _race_round(self, device, area, session=None):
+        return nonogram_race.run_round(
+            lambda: self._capture_image_source(device),
+            lambda taps: self._batch_tap(taps, device),
+            area, session)
 
     def do_POST(self):
         """处理 POST 请求"""
-        if self.path == '/tap':
-            self._handle_post_tap()
-        elif self.path == '/solve-nonogram':
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        with metrics.track_request(endpoint_label(parsed.path), device_label(query.get('device', [None])[0])):
+            self._route_post(parsed.path, query)
+
+    def _route_post(self, route, query):
+        if route == '/tap':
+            post_data = self._read_json_body()
+            if post_data is not None:
+                device = post_data.get('device') or query.get('device', [None])[0]
+                metrics.set_device(device_label(device))
+                self._dispatch_tap(device, post_data)
+        elif route == '/solve-nonogram':
             self._handle_solve_nonogram()
         else:
             self.send_error(HttpCode.NOT_FOUND, "Endpoint not found")
 
-    def _handle_post_tap(self):
+    def _read_json_body(self):
+        """读取 JSON 请求体，失败时直接返回错误响应并返回 None"""
         try:
             content_length = int(self.headers['Content-Length'])
-            post_data = json.loads(self.rfile.read(
-                content_length).decode('utf-8'))
+            return json.loads(self.rfile.read(content_length).decode('utf-8'))
+        except Exception as e:
+            logger.error(f"请求体解析失败: {e}", exc_info=True)
+            self.send_json_response(
+                {'status': Status.ERROR, 'message': str(e)}, HttpCode.SERVER_ERROR)
+            return None
+
+    def _handle_post_tap(self, device, post_data):
+        try:
             taps_coords = [(tap.get('x', 0), tap.get('y', 0))
                            for tap in post_data.get('taps', [])]
 
@@ -217,7 +418,7 @@ class ADBProxyHandler(BaseHTTPRequestHandler):
                 return
 
             logger.info(f'批量执行 {len(taps_coords)} 个点击命令')
-            self._batch_tap(taps_coords)
+            self._batch_tap(taps_coords, device)
             self.send_json_response({'status': Status.OK, 'total': len(
                 taps_coords), 'success': len(taps_coords), 'failed': 0})
 
@@ -243,7 +444,7 @@ class ADBProxyHandler(BaseHTTPRequestHandler):
 
             n = len(rows)
             logger.info(f"开始求解 {n}x{n} 数织...")
-            result = nonogram_solver.solve(rows, cols)
+            result = solution_cache.solve_nonogram(rows, cols)
 
             if result is None:
                 self.send_json_response(
@@ -263,66 +464,77 @@ class ADBProxyHandler(BaseHTTPRequestHandler):
             self.send_json_response(
                 {'status': Status.ERROR, 'message': str(e)}, HttpCode.SERVER_ERROR)
 
-    def _capture_screenshot_bytes(self) -> bytes:
-        """截取手机屏幕，返回原始 PNG 字节数据（内部使用，避免不必要的编解码）"""
+    @staticmethod
+    def _query_max_age(query):
+        """解析 max_age_ms 参数；未提供时返回 None，表示现场截图而不使用后台截图帧"""
+        value = query.get('max_age_ms', [None])[0]
+        return None if value is None else float(value)
+
+    def _capture_screenshot_bytes(self, device=None, max_age_ms=None) -> bytes:
+        """截取手机屏幕，返回原始 PNG 字节数据（内部使用，避免不必要的编解码）
+
+        指定 max_age_ms 时取后台截图帧，在本地编码为 PNG。
+        """
+        if max_age_ms is not None:
+            return encode_png(self._capture_raw_frame(device, max_age_ms).to_bgr())
+        try:
+            with metrics.timed('capture'):
+                png_bytes = get_device_lane(device).run(
+                    get_default_client().exec_out, ADBCommand.SCREENCAP, device)
+        except ADBError as e:
+            raise Exception(f'截图失败: {e}')
+        if not png_bytes:
+            raise Exception('截图失败: 设备返回空数据')
+        return png_bytes
+
+    @metrics.timed('capture')
+    def _capture_raw_bytes(self, device=None, max_age_ms=None) -> bytes:
+        """截取手机屏幕，返回 screencap 原始帧字节（无 PNG 编码）
+
+        指定 max_age_ms 时从后台截图器取帧龄不超过该值的最新帧，没有则等待下一帧。
+        """
+        if max_age_ms is not None:
+            age_ms, raw_bytes = get_frame_grabber(device).get(max_age_ms, timeout=Config.DEFAULT_TIMEOUT)
+            logger.debug(f"使用后台截图帧，帧龄 {age_ms:.0f} ms")
+            return raw_bytes
         try:
-            result = subprocess.run(
-                ADBCommand.SCREENCAP, capture_output=True, timeout=Config.DEFAULT_TIMEOUT, check=True
-            )
-            return result.stdout
-        except (subprocess.TimeoutExpired, subprocess.CalledProcessError) as e:
-            error_msg = e.stderr.decode() if hasattr(e, 'stderr') and e.stderr else str(e)
-            raise Exception(f'截图失败: {error_msg}')
-
-    def _capture_screenshot(self) -> str:
+            raw_bytes = get_device_lane(device).run(
+                get_default_client().exec_out, ADBCommand.SCREENCAP_RAW, device)
+        except ADBError as e:
+            raise Exception(f'截图失败: {e}')
+        if not raw_bytes:
+            raise Exception('截图失败: 设备返回空数据')
+        return raw_bytes
+
+    def _capture_raw_frame(self, device=None, max_age_ms=None) -> RawFrame:
+        """截取手机屏幕，返回像素为零拷贝视图的原始帧"""
+        return parse_raw_screencap(self._capture_raw_bytes(device, max_age_ms))
+
+    def _capture_image_source(self, device=None, max_age_ms=None):
+        """截图供识别器使用：优先原始帧，像素格式不支持时退回 PNG 字节（均在内存中解码）"""
+        try:
+            return self._capture_raw_frame(device, max_age_ms)
+        except ValueError as e:
+            logger.warning(f"原始帧不可用，改用 PNG 截图: {e}")
+            return self._capture_screenshot_bytes(device)
+
+    def _capture_screenshot(self, device=None, max_age_ms=None) -> str:
         """截取手机屏幕，返回 base64 编码的图片数据"""
-        png_bytes = self._capture_screenshot_bytes()
+        png_bytes = self._capture_screenshot_bytes(device, max_age_ms)
         return base64.b64encode(png_bytes).decode('utf-8')
 
-    def _batch_tap(self, taps: list[tuple[int, int]]):
-        """批量执行点击操作"""
+    @metrics.timed('tap')
+    def _batch_tap(self, taps: list[tuple[int, int]], device=None):
+        """批量执行点击操作（在设备的输入通道上写入其持久 shell 会话，等待哨兵确认完成）"""
         tap_commands = [f"input tap {x} {y}" for x, y in taps]
-        shell_script = '\n'.join(tap_commands)
         try:
-            subprocess.run(
-                ['adb', 'shell', shell_script], capture_output=True, text=True,
-                timeout=Config.DEFAULT_TIMEOUT, check=True
-            )
-        except subprocess.CalledProcessError as e:
-            logger.warning(f"点击命令可能部分失败: {e.stderr}")
-
-    def _analyze_nonogram_constraints(self, png_bytes: bytes) -> dict:
-        """使用本地识别器分析数织游戏的行约束和列约束"""
-        temp_path = None
-        try:
-            with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_file:
-                tmp_file.write(png_bytes)
-                temp_path = tmp_file.name
-
-            logger.info("开始使用本地识别器分析数织约束")
-            result = nonogram_recognizer.recognize_from_image(temp_path)
-            pos = result.get('pos')
-            game_area = None
-            if pos and len(pos) == 2:
-                x1, y1 = pos[0]
-                x2, y2 = pos[1]
-                game_area = {'startX': x1, 'startY': y1,
-                             'gridWidth': x2 - x1, 'gridHeight': y2 - y1}
-                logger.debug(f"识别到游戏区域: 起点({x1},{y1}), 尺寸({x2-x1}x{y2-y1})")
-
-            data = {'row': result.get('row', '').replace(
-                '\n', '\\n'), 'col': result.get('col', '').replace('\n', '\\n')}
-            if game_area:
-                data['gameArea'] = game_area
-            logger.info(
-                f"本地识别成功: row={data['row'][:30]}..., col={data['col'][:30]}...")
-            return data
+            get_device_lane(device).run_input(get_shell_session(device).run, tap_commands)
+        except ADBError as e:
+            raise Exception(f'点击失败: {e}')
 
-        except Exception as e:
-            raise Exception(f'本地识别失败: {str(e)}')
-        finally:
-            if temp_path and os.path.exists(temp_path):
-                os.remove(temp_path)
+    def send_response(self, code, message=None):
+        metrics.set_status(code)
+        super().send_response(code, message)
 
     def send_json_response(self, data, status_code=200):
         """发送 JSON 响应"""
@@ -332,6 +544,18 @@ class ADBProxyHandler(BaseHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(json.dumps(data, ensure_ascii=False).encode('utf-8'))
 
+    def send_bytes_response(self, data: bytes, content_type: str, status_code=200, headers=None):
+        """发送二进制响应，headers 为附加的响应头"""
+        self.send_response(status_code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Expose-Headers', ', '.join(METADATA_HEADERS))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
     def log_message(self, format_string, *args):
         """重写基类的日志方法，将其重定向到我们的 logger"""
         logger.info("%s - %s" % (self.address_string(), format_string % args))
@@ -342,6 +566,7 @@ class PooledHTTPServer(ThreadingHTTPServer):
 
     def __init__(self, *args, max_workers=Config.MAX_WORKERS, **kwargs):
         self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        configure_lanes(max_workers)
         super().__init__(*args, **kwargs)
 
     def process_request(self, request, client_address):
@@ -351,6 +576,7 @@ class PooledHTTPServer(ThreadingHTTPServer):
     def server_close(self):
         """关闭服务器时等待所有线程完成"""
         self._executor.shutdown(wait=True)
+        shutdown_lanes()
         super().server_close()
 
 
@@ -366,13 +592,22 @@ def main():
     logger.info("📡 支持的 API:")
     logger.info("   GET  /health            - 健康检查")
     logger.info("   GET  /devices           - 获取设备列表")
-    logger.info("   GET  /screenshot        - 获取设备截图")
+    logger.info("   GET  /metrics           - 各阶段耗时与请求计数（Prometheus 文本格式）")
+    logger.info("   GET  /screenshot        - 获取设备截图（?format=png|jpeg|raw 直接返回二进制，"
+                "?roi=x,y,w,h&scale=0.5 裁剪缩放，?format=json 为旧版 base64）")
+    logger.info("   💡 截图类接口支持 ?max_age_ms=N：使用后台截图线程中不超过 N 毫秒的帧")
+    logger.info("   💡 设备相关接口支持 ?device=<serial>（/tap 也可在请求体中指定），未指定时使用唯一在线设备")
     logger.info("   GET  /analyze-nonogram  - 分析数织游戏约束")
     logger.info("   GET  /solve-bugcatcher  - 自动化“田地捉虫”流程")
+    logger.info("   GET  /race-nonogram     - 数织竞速一轮（服务端识别、求解、点击，返回各阶段耗时）")
+    logger.info("   GET  /race-nonogram/stream - 连续竞速，每轮一行 JSON（?rounds=N&interval_ms=M）")
     logger.info("   POST /tap               - 执行点击操作")
     logger.info("   POST /solve-nonogram    - 求解数织谜题（DFS）")
     logger.info("💡 按 Ctrl+C 停止服务器")
 
+    # 预热 adb server 连接池，首个请求无需再建连
+    get_default_client().warm()
+
     try:
         httpd = PooledHTTPServer(server_address, ADBProxyHandler, max_workers=Config.MAX_WORKERS)
         httpd.serve_forever()
@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+"""
+ADB 代理服务器 - asyncio 版本
+与 adb_proxy.ADBProxyHandler 提供相同的路由，但：
+
+- HTTP 连接与 adb 通信全部是非阻塞 I/O，等待中的请求只占一个协程，
+  慢截图不会占满工作线程而拖慢 /tap
+- 识别、求解等 CPU 密集任务放到线程池执行，不阻塞事件循环
+- 点击与线程池版本走同一套抽象：/tap 先占设备的点击名额（device_lane.admit_tap，
+  名额满时短暂排队），点击批次在设备的输入通道上写入其持久 shell 会话（ShellSession），
+  两个代理同时运行时同一设备的点击仍按提交顺序执行；截图互不等待，慢截图不会排在点击前面
+- 截图类请求不占截图名额（device_lane.try_admit）：等待截图只占一个协程，不占工作线程
+
+使用方法:
+    python async_proxy.py                # 监听 8085 端口
+    python async_proxy.py --port 8086
+"""
+
+import argparse
+import asyncio
+import base64
+import contextvars
+import json
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import AsyncIterator, Dict, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlparse
+import logging
+
+import glyph_cache
+import metrics
+import nonogram_race
+import solution_cache
+from adb_client import ADBClient, ADBError, AsyncADBClient, ShellSession, get_shell_session
+from adb_proxy import (SCREENSHOT_FORMAT_JSON, ADBCommand, Config, HttpCode, Status,
+                       analyze_nonogram_constraints, endpoint_label, plan_bugcatcher_taps)
+from bugcatcher_recognizer import recognize_bugs_from_source
+from device_lane import KnownDevices, get_device_lane
+from frame_grabber import get_frame_grabber
+from image_source import encode_png
+from logger_config import setup_logger
+from raw_frame import parse_raw_screencap
+from screenshot_render import (FORMAT_PNG, FORMAT_RAW, METADATA_HEADERS, parse_roi,
+                               parse_scale, render_screenshot)
+
+logger = logging.getLogger(__name__)
+
+
+REQUEST_HEAD_TIMEOUT = 10  # 读取请求头的最长时间（秒）
+# 按设备执行的 GET 路由，device 参数需为已连接的设备
+DEVICE_ROUTES = {'/screenshot', '/analyze-nonogram', '/solve-bugcatcher', '/race-nonogram',
+                 '/race-nonogram/stream'}
+CORS_HEADERS = (
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Allow-Methods', 'GET, POST, OPTIONS'),
+    ('Access-Control-Allow-Headers', 'Content-Type'),
+    ('Access-Control-Expose-Headers', ', '.join(METADATA_HEADERS)),
+)
+
+# (状态码, Content-Type, 响应体, 附加响应头)；响应体为异步迭代器时逐块流式输出
+Response = Tuple[int, str, Union[bytes, AsyncIterator[bytes]], Dict[str, str]]
+
+
+def json_response(data, status_code=HttpCode.OK) -> Response:
+    return status_code, 'application/json', json.dumps(data, ensure_ascii=False).encode('utf-8'), {}
+
+
+def error_response(message, status_code=HttpCode.SERVER_ERROR) -> Response:
+    return json_response({'status': Status.ERROR, 'message': message}, status_code)
+
+
+class AsyncADBProxy:
+    """
+    asyncio ADB 代理
+
+    参数:
+        adb: AsyncADBClient，默认连接本地 adb server
+        cpu_workers: CPU 密集任务线程池大小
+    """
+
+    def __init__(self, adb: Optional[AsyncADBClient] = None, cpu_workers: int = Config.MAX_WORKERS):
+        self._own_adb = adb is not None
+        self.adb = adb or AsyncADBClient()
+        self._cpu = ThreadPoolExecutor(max_workers=cpu_workers, thread_name_prefix='cpu')
+        self._shell_sessions: Dict[Optional[str], ShellSession] = {}
+        self._known_devices = KnownDevices()
+
+    def _shell_session(self, device: Optional[str]) -> ShellSession:
+        """设备的持久 shell 会话：默认 adb server 上与 adb_proxy 共用，指定 adb 时按其地址单独建立"""
+        if not self._own_adb:
+            return get_shell_session(device)
+        session = self._shell_sessions.get(device)
+        if session is None:
+            client = ADBClient(self.adb.host, self.adb.port, timeout=self.adb.timeout)
+            session = self._shell_sessions[device] = ShellSession(client, device)
+        return session
+
+    async def _is_known_device(self, device: Optional[str]) -> bool:
+        """device 参数是否为已连接的设备（见 adb_proxy.is_known_device）"""
+        known = self._known_devices.lookup(device)
+        if known is None:
+            try:
+                self._known_devices.update(await self.adb.devices())
+            except ADBError as e:
+                logger.warning(f"获取设备列表失败，无法校验设备 {device}: {e}")
+                return False
+            known = self._known_devices.lookup(device)
+        return bool(known)
+
+    async def _device_label(self, device: Optional[str]) -> str:
+        return device if await self._is_known_device(device) else metrics.INVALID_DEVICE
+
+    async def _run_cpu(self, fn, *args):
+        # 复制上下文，线程池中记录的阶段指标仍带有当前请求的标签
+        ctx = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self._cpu, ctx.run, fn, *args)
+
+    # ---------------- HTTP 层 ----------------
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理单条连接上的一个请求（与 BaseHTTPRequestHandler 一致，响应后关闭连接）"""
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), REQUEST_HEAD_TIMEOUT)
+            lines = head.decode('latin-1').split('\r\n')
+            method, target, _ = lines[0].split(' ', 2)
+            request_headers = {}
+            for line in lines[1:]:
+                if ':' in line:
+                    key, value = line.split(':', 1)
+                    request_headers[key.strip().lower()] = value.strip()
+            length = int(request_headers.get('content-length') or 0)
+            body = await reader.readexactly(length) if length else b''
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                asyncio.TimeoutError, ValueError, ConnectionError):
+            writer.close()
+            return
+
+        parsed = urlparse(target)
+        device = parse_qs(parsed.query).get('device', [None])[0]
+        # 流式响应体在写出时才执行，请求标签与耗时统计覆盖到响应写完为止
+        with metrics.track_request(endpoint_label(parsed.path), await self._device_label(device)):
+            status_code, content_type, payload, headers = await self.dispatch(method, target, body)
+            metrics.set_status(status_code)
+            logger.info(f"{writer.get_extra_info('peername', ('-',))[0]} - {method} {target} {status_code}")
+            await self._write_response(writer, status_code, content_type, payload, headers,
+                                       f'{method} {target}')
+
+    @staticmethod
+    async def _write_response(writer: asyncio.StreamWriter, status_code: int, content_type: str,
+                              payload, headers: Dict[str, str], request_line: str) -> None:
+        reason = HTTPStatus(status_code).phrase
+        response = [f'HTTP/1.1 {status_code} {reason}']
+        if content_type:
+            response.append(f'Content-Type: {content_type}')
+        streaming = not isinstance(payload, bytes)
+        if not streaming:
+            response.append(f'Content-Length: {len(payload)}')
+        response.extend(f'{k}: {v}' for k, v in CORS_HEADERS)
+        response.extend(f'{k}: {v}' for k, v in headers.items())
+        response.append('Connection: close')
+        head = ('\r\n'.join(response) + '\r\n\r\n').encode('latin-1')
+        try:
+            if streaming:
+                writer.write(head)
+                async for chunk in payload:
+                    writer.write(chunk)
+                    await writer.drain()
+            else:
+                writer.write(head + payload)
+                await writer.drain()
+        except ConnectionError:
+            logger.info(f"客户端已断开: {request_line}")
+        finally:
+            if streaming:
+                await payload.aclose()
+            writer.close()
+
+    async def dispatch(self, method: str, target: str, body: bytes) -> Response:
+        """路由分发，与 ADBProxyHandler 的 do_GET / do_POST 保持一致"""
+        parsed = urlparse(target)
+        route = parsed.path
+        query = parse_qs(parsed.query)
+        device = query.get('device', [None])[0]
+
+        if method == 'OPTIONS':
+            return HttpCode.OK, '', b'', {}
+        if method == 'GET':
+            if route == '/health':
+                return json_response({'status': 'ok', 'message': 'ADB 代理服务器运行中（asyncio）',
+                                      'solution_cache': solution_cache.stats(),
+                                      'glyph_cache': glyph_cache.stats()})
+            if route == '/devices':
+                return await self._handle_get_devices()
+            if route == '/metrics':
+                return HttpCode.OK, metrics.CONTENT_TYPE, metrics.render().encode('utf-8'), {}
+            if route in DEVICE_ROUTES and not await self._is_known_device(device):
+                return error_response(f'未知设备: {device}', HttpCode.BAD_REQUEST)
+            if route == '/screenshot':
+                return await self._handle_get_screenshot(device, query)
+            if route == '/analyze-nonogram':
+                return await self._handle_analyze_nonogram(device, query)
+            if route == '/solve-bugcatcher':
+                return await self._handle_solve_bugcatcher(device, query)
+            if route == '/race-nonogram':
+                return await self._handle_race_nonogram(device, query)
+            if route == '/race-nonogram/stream':
+                return self._handle_race_nonogram_stream(device, query)
+        elif method == 'POST':
+            if route == '/tap':
+                return await self._handle_post_tap(device, body)
+            if route == '/solve-nonogram':
+                return await self._handle_solve_nonogram(body)
+        return error_response('Endpoint not found', HttpCode.NOT_FOUND)
+
+    # ---------------- 截图与点击 ----------------
+
+    async def _capture_raw_bytes(self, device, max_age_ms=None) -> bytes:
+        """截取原始帧；指定 max_age_ms 时使用后台截图器（其等待放到线程池中）"""
+        if max_age_ms is not None:
+            grabber = get_frame_grabber(device)
+            with metrics.timed('capture'):
+                age_ms, raw_bytes = await asyncio.get_running_loop().run_in_executor(
+                    None, grabber.get, max_age_ms, Config.DEFAULT_TIMEOUT)
+            logger.debug(f"使用后台截图帧，帧龄 {age_ms:.0f} ms")
+            return raw_bytes
+        return await self._exec_out(device, ADBCommand.SCREENCAP_RAW)
+
+    async def _exec_out(self, device, command) -> bytes:
+        try:
+            with metrics.timed('capture'):
+                data = await self.adb.exec_out(command, device)
+        except ADBError as e:
+            raise Exception(f'截图失败: {e}')
+        if not data:
+            raise Exception('截图失败: 设备返回空数据')
+        return data
+
+    async def _capture_image_source(self, device, max_age_ms=None):
+        """截图供识别器使用：优先原始帧，像素格式不支持时退回 PNG 字节"""
+        raw_bytes = await self._capture_raw_bytes(device, max_age_ms)
+        try:
+            return parse_raw_screencap(raw_bytes)
+        except ValueError as e:
+            logger.warning(f"原始帧不可用，改用 PNG 截图: {e}")
+            return await self._exec_out(device, ADBCommand.SCREENCAP)
+
+    async def _batch_tap(self, taps, device):
+        """批量执行点击：与 adb_proxy 相同，在设备的输入通道上写入持久 shell 会话，等待放到线程池中"""
+        tap_commands = [f"input tap {x} {y}" for x, y in taps]
+        lane = get_device_lane(device)
+        try:
+            with metrics.timed('tap'):
+                await asyncio.get_running_loop().run_in_executor(
+                    None, lane.run_input, self._shell_session(device).run, tap_commands)
+        except ADBError as e:
+            raise Exception(f'点击失败: {e}')
+
+    # ---------------- 路由处理 ----------------
+
+    async def _handle_get_devices(self) -> Response:
+        try:
+            devices = [{'serial': serial, 'status': status}
+                       for serial, status in await self.adb.devices()]
+            return json_response({'status': Status.OK, 'devices': devices})
+        except Exception as e:
+            logger.error(f"获取设备列表失败: {e}", exc_info=True)
+            return error_response(str(e))
+
+    async def _handle_get_screenshot(self, device, query) -> Response:
+        try:
+            image_format = query.get('format', [FORMAT_PNG])[0]
+            roi = parse_roi(query.get('roi', [None])[0])
+            scale = parse_scale(query.get('scale', [None])[0])
+            max_age_ms = self._query_max_age(query)
+        except ValueError as e:
+            return error_response(str(e), HttpCode.BAD_REQUEST)
+
+        try:
+            if image_format == SCREENSHOT_FORMAT_JSON:
+                if max_age_ms is not None:
+                    frame = parse_raw_screencap(await self._capture_raw_bytes(device, max_age_ms))
+                    png_bytes = await self._run_cpu(lambda: encode_png(frame.to_bgr()))
+                else:
+                    png_bytes = await self._exec_out(device, ADBCommand.SCREENCAP)
+                return json_response({
+                    'status': Status.OK,
+                    'data': base64.b64encode(png_bytes).decode('utf-8'),
+                    'format': 'png',
+                    'size': len(png_bytes)
+                })
+
+            if image_format == FORMAT_RAW:
+                raw_bytes = await self._capture_raw_bytes(device, max_age_ms)
+                try:
+                    source = parse_raw_screencap(raw_bytes)
+                except ValueError as e:
+                    raise Exception(f'原始帧不可用: {e}')
+            else:
+                source = await self._capture_image_source(device, max_age_ms)
+            body, content_type, headers = await self._run_cpu(
+                render_screenshot, source, image_format, roi, scale)
+            if image_format == FORMAT_RAW and roi is None and scale == 1.0:
+                body = raw_bytes
+            return HttpCode.OK, content_type, body, headers
+        except ValueError as e:
+            return error_response(str(e), HttpCode.BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"截图处理异常: {e}", exc_info=True)
+            return error_response(str(e))
+
+    async def _handle_analyze_nonogram(self, device, query) -> Response:
+        try:
+            source = await self._capture_image_source(device, self._query_max_age(query))
+            constraints = await self._run_cpu(analyze_nonogram_constraints, source, device)
+            response_data = {'status': Status.OK, 'row': constraints.get(
+                'row', ''), 'col': constraints.get('col', '')}
+            if 'gameArea' in constraints:
+                response_data['gameArea'] = constraints['gameArea']
+            return json_response(response_data)
+        except Exception as e:
+            logger.error(f"数织分析失败: {str(e)}", exc_info=True)
+            return error_response(str(e))
+
+    async def _handle_solve_bugcatcher(self, device, query) -> Response:
+        try:
+            source = await self._capture_image_source(device, self._query_max_age(query))
+            puzzle_data, _ = await self._run_cpu(
+                lambda: recognize_bugs_from_source(source, output_path=None, debug=False))
+            if not puzzle_data:
+                raise Exception("图像识别返回空数据")
+
+            solution = await self._run_cpu(solution_cache.solve_bugcatcher, puzzle_data)
+            if not solution:
+                raise Exception("谜题求解失败")
+
+            taps = plan_bugcatcher_taps(puzzle_data, solution)
+            if taps:
+                await self._batch_tap(taps, device)
+
+            return json_response({
+                'status': Status.OK,
+                'message': '“田地捉虫”自动化流程执行成功！',
+                'solution_size': len(solution),
+                'taps_performed': len(taps)
+            })
+        except Exception as e:
+            logger.error(f"“田地捉虫”自动化流程失败: {str(e)}", exc_info=True)
+            return error_response(str(e))
+
+    async def _race_round(self, device, area, session=None) -> dict:
+        """在线程池中执行一轮竞速，截图与点击仍走事件循环上的非阻塞 adb 通信"""
+        loop = asyncio.get_running_loop()
+
+        def capture():
+            return asyncio.run_coroutine_threadsafe(self._capture_image_source(device), loop).result()
+
+        def tap(taps):
+            asyncio.run_coroutine_threadsafe(self._batch_tap(taps, device), loop).result()
+
+        return await self._run_cpu(nonogram_race.run_round, capture, tap, area, session)
+
+    async def _handle_race_nonogram(self, device, query) -> Response:
+        try:
+            area = nonogram_race.parse_area(query.get('area', [None])[0])
+            return json_response({'status': Status.OK, **await self._race_round(device, area)})
+        except Exception as e:
+            logger.error(f"数织竞速失败: {e}", exc_info=True)
+            return error_response(str(e))
+
+    def _handle_race_nonogram_stream(self, device, query) -> Response:
+        try:
+            area = nonogram_race.parse_area(query.get('area', [None])[0])
+            rounds = int(query.get('rounds', [0])[0])  # 0 表示不限轮数
+            interval = float(query.get('interval_ms', [0])[0]) / 1000
+        except ValueError as e:
+            return error_response(str(e), HttpCode.BAD_REQUEST)
+
+        async def lines():
+            session = nonogram_race.RaceSession()
+            round_index = 0
+            while not rounds or round_index < rounds:
+                round_index += 1
+                try:
+                    line = {'status': Status.OK, 'round': round_index,
+                            **await self._race_round(device, area, session)}
+                except Exception as e:
+                    logger.error(f"数织竞速第 {round_index} 轮失败: {e}", exc_info=True)
+                    line = {'status': Status.ERROR, 'round': round_index, 'message': str(e)}
+                yield json.dumps(line, ensure_ascii=False).encode('utf-8') + b'\n'
+                if line['status'] == Status.ERROR:
+                    return
+                await asyncio.sleep(interval)
+
+        return HttpCode.OK, 'application/x-ndjson', lines(), {}
+
+    async def _handle_post_tap(self, device, body) -> Response:
+        try:
+            post_data = json.loads(body.decode('utf-8'))
+            device = post_data.get('device') or device
+            if not await self._is_known_device(device):
+                metrics.set_device(metrics.INVALID_DEVICE)
+                return error_response(f'未知设备: {device}', HttpCode.BAD_REQUEST)
+            metrics.set_device(device)
+            taps_coords = [(tap.get('x', 0), tap.get('y', 0))
+                           for tap in post_data.get('taps', [])]
+            if not taps_coords:
+                return json_response({'status': Status.OK, 'total': 0, 'success': 0, 'failed': 0})
+
+            # 点击单独准入（见 adb_proxy._dispatch_tap）：名额满时在线程池中短暂排队
+            lane = get_device_lane(device)
+            if not await asyncio.get_running_loop().run_in_executor(None, lane.admit_tap):
+                logger.warning(f"设备 {device or '默认'} 点击排队超时")
+                return error_response(f"设备 {device or '默认'} 点击繁忙，请稍后重试",
+                                      HttpCode.SERVICE_UNAVAILABLE)
+            try:
+                await self._batch_tap(taps_coords, device)
+            finally:
+                lane.release_tap()
+            return json_response({'status': Status.OK, 'total': len(
+                taps_coords), 'success': len(taps_coords), 'failed': 0})
+        except Exception as e:
+            logger.error(f"点击处理失败: {e}", exc_info=True)
+            return error_response(str(e))
+
+    async def _handle_solve_nonogram(self, body) -> Response:
+        try:
+            post_data = json.loads(body.decode('utf-8'))
+            rows = post_data.get('rows', [])
+            cols = post_data.get('cols', [])
+            if not rows or not cols:
+                return error_response('缺少行列约束')
+
+            result = await self._run_cpu(solution_cache.solve_nonogram, rows, cols)
+            if result is None:
+                return error_response('无解')
+            return json_response({'status': Status.OK, 'grid': result, 'size': len(rows)})
+        except Exception as e:
+            logger.error(f"数织求解失败: {e}", exc_info=True)
+            return error_response(str(e))
+
+    @staticmethod
+    def _query_max_age(query):
+        value = query.get('max_age_ms', [None])[0]
+        return None if value is None else float(value)
+
+    def close(self):
+        self._cpu.shutdown(wait=False)
+        for session in self._shell_sessions.values():
+            session.close()
+
+
+async def start_server(host: str = '', port: int = Config.DEFAULT_PORT,
+                       proxy: Optional[AsyncADBProxy] = None) -> asyncio.AbstractServer:
+    """启动 asyncio 代理并返回 server 对象（供测试与基准复用）"""
+    proxy = proxy or AsyncADBProxy()
+    # 积压队列放宽，大量并发连接时不会在 accept 阶段被拒
+    return await asyncio.start_server(proxy.handle_connection, host or None, port, backlog=1024)
+
+
+async def _serve(port: int):
+    server = await start_server('', port)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ADB 代理服务器（asyncio 版本）')
+    parser.add_argument('--port', type=int, default=Config.DEFAULT_PORT, help='监听端口')
+    parser.add_argument('--debug', action='store_true', help='开启调试模式，显示详细日志')
+    args = parser.parse_args()
+
+    setup_logger(args.debug)
+    logger.info(f"🚀 ADB 代理服务器（asyncio）启动在 http://localhost:{args.port}")
+    logger.info("📡 路由与 adb_proxy.py 相同，💡 按 Ctrl+C 停止服务器")
+
+    try:
+        asyncio.run(_serve(args.port))
+    except KeyboardInterrupt:
+        logger.info("👋 服务器已停止")
+    except OSError as e:
+        logger.error(f"❌ 启动失败: {e}", exc_info=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+批量求解：把题目分块分发到进程池，结果按输入顺序或完成顺序逐个产出
+供 nonogram_solver / bugcatcher_solver 的 solve_many 与 --jsonl 命令行使用
+
+- 题目按 chunksize 分块提交，减少进程间往返；在途块数有上限，输入可以是 stdin 上的无限流
+- 工作进程在整个批次中复用，进程内缓存（如数织候选缓存）跨块保持热状态
+- ordered=False 时按完成顺序产出，慢题不会挡住后面的结果
+- 单题求解函数需定义在模块顶层（进程池通过 pickle 传递），返回可 JSON 序列化的 dict
+"""
+
+import functools
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_CHUNKSIZE = 16
+IN_FLIGHT_PER_WORKER = 2  # 每个工作进程最多排队的块数，限制读入但未求解的题目
+
+
+def _run_chunk(fn: Callable, chunk) -> list:
+    return [(index, fn(item)) for index, item in chunk]
+
+
+def solve_many(fn: Callable[[object], Dict], items: Iterable, workers: Optional[int] = None,
+               chunksize: int = DEFAULT_CHUNKSIZE, ordered: bool = True,
+               initializer: Optional[Callable] = None) -> Iterator[Tuple[int, Dict]]:
+    """
+    批量求解，逐个产出 (输入序号, 结果)
+
+    参数:
+        fn: 单题求解函数
+        items: 题目（可以是生成器，按需读取）
+        workers: 进程数，默认 CPU 核数；1 表示在当前进程中顺序求解
+        chunksize: 每次提交给工作进程的题目数
+        ordered: True 按输入顺序产出，False 按完成顺序产出
+        initializer: 工作进程启动时调用一次（预热缓存等）
+    """
+    workers = workers or os.cpu_count() or 1
+    numbered = enumerate(items)
+    if workers == 1:
+        if initializer:
+            initializer()
+        for index, item in numbered:
+            yield index, fn(item)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer) as pool:
+        pending = set()
+        buffered: Dict[int, Dict] = {}
+        next_index = 0
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < workers * IN_FLIGHT_PER_WORKER:
+                chunk = list(islice(numbered, chunksize))
+                if not chunk:
+                    exhausted = True
+                    break
+                pending.add(pool.submit(_run_chunk, fn, chunk))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for index, result in future.result():
+                    if ordered:
+                        buffered[index] = result
+                    else:
+                        yield index, result
+            while next_index in buffered:
+                yield next_index, buffered.pop(next_index)
+                next_index += 1
+
+
+def _solve_line(fn: Callable[[object], Dict], line: str) -> Dict:
+    """解析一行 JSON 题目并求解；题目中的 id 字段原样带回"""
+    try:
+        puzzle = json.loads(line)
+    except ValueError as e:
+        return {'error': f'JSON 解析失败: {e}'}
+    result = fn(puzzle)
+    if isinstance(puzzle, dict) and 'id' in puzzle:
+        result = {'id': puzzle['id'], **result}
+    return result
+
+
+def run_jsonl(fn: Callable[[object], Dict], path: str, workers: Optional[int] = None,
+              chunksize: int = DEFAULT_CHUNKSIZE, ordered: bool = True,
+              initializer: Optional[Callable] = None, output=None) -> int:
+    """
+    从 JSONL 文件（'-' 表示 stdin）逐行读取题目批量求解，每题向 output 输出一行
+    {"index": 序号, ...结果}，结束时在 stderr 报告吞吐，返回题目数
+    """
+    output = output or sys.stdout
+    source = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    started = time.perf_counter()
+    count = 0
+    try:
+        lines = (line for line in source if line.strip())
+        for index, result in solve_many(functools.partial(_solve_line, fn), lines,
+                                        workers, chunksize, ordered, initializer):
+            output.write(json.dumps({'index': index, **result}, ensure_ascii=False) + '\n')
+            output.flush()
+            count += 1
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    elapsed = time.perf_counter() - started
+    rate = count / elapsed if elapsed > 0 else 0.0
+    print(f"共求解 {count} 题，用时 {elapsed:.2f}s，{rate:.1f} 题/秒", file=sys.stderr)
+    return count
@@ -10,6 +10,8 @@ import bisect
 import logging
 
 from bugcatcher_constants import JSONKeys
+import metrics
+from image_source import load_bgr
 from logger_config import setup_logger
 
 # 初始化日志记录器
@@ -41,7 +43,7 @@ MAX_ASPECT_RATIO = 1.15
 # 颜色采样参数
 SAMPLE_MARGIN = 10  # 距离格子边缘的采样偏移量
 CPU_CORES = os.cpu_count() or 4
-COLOR_SAMPLING_WORKERS = min(CPU_CORES - 1, 8)
+COLOR_SAMPLING_WORKERS = max(1, min(CPU_CORES - 1, 8))  # 单核机器上至少一个线程
 
 # K-means 聚类参数
 N_CLUSTERS_MIN = 3
@@ -98,10 +100,12 @@ def filter_and_sort_cells(contours):
 
 def extract_grid_cells(img_path, debug_dir=None):
     """主函数：从图像中提取所有格子的边界框"""
-    img = cv2.imread(str(img_path))
-    if img is None:
-        raise FileNotFoundError(f"无法读取图像: {img_path}")
+    img = load_bgr(img_path)
+    return extract_grid_cells_from_img(img, debug_dir), img
 
+@metrics.timed('preprocess')
+def extract_grid_cells_from_img(img, debug_dir=None):
+    """从已解码的 BGR 图像中提取所有格子的边界框"""
     grid_mask = extract_grid_lines(img)
     morph_mask = morphology_operations(grid_mask)
     contours = find_cell_contours(morph_mask)
@@ -119,7 +123,7 @@ def extract_grid_cells(img_path, debug_dir=None):
             cv2.rectangle(img_filtered, (x, y), (x + w, y + h), (0, 0, 255), 3)
         cv2.imwrite(str(debug_dir / "04_filtered_cells.png"), img_filtered)
 
-    return cells, img
+    return cells
 
 
 # ============================================================
@@ -181,6 +185,7 @@ def find_optimal_k(data, min_k, max_k):
 
     return best_k if best_k != -1 else min_k
 
+@metrics.timed('cluster')
 def cluster_colors(colors, n_clusters=None):
     """K-means聚类，自动或手动确定聚类数"""
     color_array = np.array(colors)
@@ -252,13 +257,34 @@ def build_color_matrix(cells, labels, unique_x, unique_y):
 # ============================================================
 
 def recognize_bugs(image_path, output_path='result.json', clusters=None, debug=False):
-    """主逻辑封装，用于从其他脚本调用"""
+    """主逻辑封装，用于从其他脚本调用（recognize_bugs_from_source 的路径版包装）"""
     img_path = Path(image_path)
     debug_dir = img_path.parent / "debug_bugcatcher" if debug else None
 
     logger.info(f"开始识别图像: {img_path}")
+    return recognize_bugs_from_source(img_path, output_path, clusters, debug, debug_dir)
 
-    cells, img = extract_grid_cells(img_path, debug_dir)
+def recognize_bugs_from_frame(frame, output_path=None, clusters=None, debug=False):
+    """从 screencap 原始帧识别，跳过 PNG 解码（frame: raw_frame.RawFrame）"""
+    logger.info(f"开始识别原始帧: {frame.width}x{frame.height}")
+    return recognize_bugs_from_source(frame, output_path, clusters, debug)
+
+def recognize_bugs_from_source(source, output_path=None, clusters=None, debug=False, debug_dir=None):
+    """
+    从内存中的图像识别，不经过临时文件
+
+    source 可以是图片路径、编码字节（bytes / memoryview）、BGR ndarray 或原始帧，
+    见 image_source.load_bgr
+    """
+    if debug and debug_dir is None:
+        debug_dir = Path(__file__).parent / "debug_bugcatcher"
+
+    img = load_bgr(source)
+    cells = extract_grid_cells_from_img(img, debug_dir)
+    return _recognize(img, cells, output_path, clusters, debug, debug_dir)
+
+def _recognize(img, cells, output_path, clusters, debug, debug_dir):
+    """识别流程主体：颜色采样、聚类并构建颜色矩阵"""
     logger.debug(f"检测到 {len(cells)} 个有效格子")
 
     colors = sample_all_colors_parallel(img, cells)
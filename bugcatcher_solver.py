@@ -1,8 +1,12 @@
 import json
 import argparse
+import sys
 from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple
 import logging
 
+import batch_solver
+import metrics
 from bugcatcher_constants import JSONKeys
 from logger_config import setup_logger
 
@@ -75,6 +79,7 @@ class BugCatcherSolver:
 
         return False
 
+@metrics.timed('solve')
 def solve_puzzle(puzzle_data):
     """主逻辑封装，接收一个 puzzle_data 字典进行求解"""
     logger.debug("开始求解“田地捉虫”谜题...")
@@ -96,12 +101,42 @@ def solve_puzzle(puzzle_data):
         return solution
     return None
 
+def _solve_record(puzzle_data):
+    """单题入口（进程池中调用）：puzzle_data → {"solution"} 或 {"error"}"""
+    try:
+        return {'solution': solve_puzzle(puzzle_data)}
+    except (KeyError, IndexError, TypeError) as e:
+        return {'error': f'{type(e).__name__}: {e}'}
+
+
+def solve_many(puzzles: Iterable[dict], workers: Optional[int] = None,
+               chunksize: int = batch_solver.DEFAULT_CHUNKSIZE,
+               ordered: bool = True) -> Iterator[Tuple[int, dict]]:
+    """用进程池批量求解，逐个产出 (输入序号, {"solution"} 或 {"error"})，见 batch_solver.solve_many"""
+    return batch_solver.solve_many(_solve_record, puzzles, workers, chunksize, ordered)
+
+
 def main():
     parser = argparse.ArgumentParser(description='田地捉虫 (Star Battle) 求解器')
     parser.add_argument('input_file', nargs='?', default='result.json', help='包含谜题数据的JSON文件路径 (默认: result.json)')
     parser.add_argument('--debug', action='store_true', help='开启调试模式，显示详细日志')
+    parser.add_argument('--jsonl', nargs='?', const='-', metavar='PATH',
+                        help='批量求解 JSONL 题目（每行一个谜题数据），省略 PATH 时读 stdin')
+    parser.add_argument('--workers', type=int, default=None, help='批量求解的进程数，默认 CPU 核数')
+    parser.add_argument('--chunksize', type=int, default=batch_solver.DEFAULT_CHUNKSIZE,
+                        help='每次分给工作进程的题目数')
+    parser.add_argument('--unordered', action='store_true', help='按完成顺序输出（默认按输入顺序）')
     args = parser.parse_args()
 
+    if args.jsonl:
+        # stdout 输出结果，日志改到 stderr，且默认只保留警告以上
+        setup_logger(args.debug, stream=sys.stderr)
+        if not args.debug:
+            logging.getLogger().setLevel(logging.WARNING)
+        batch_solver.run_jsonl(_solve_record, args.jsonl, args.workers, args.chunksize,
+                               not args.unordered)
+        return
+
     setup_logger(args.debug)
 
     puzzle_path = Path(args.input_file)
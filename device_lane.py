@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+按设备划分的执行通道
+多台手机共用代理时，每台设备拥有：
+
+- 截图通道：同一设备上的现场截图与后台截图器（frame_grabber）的抓取按提交顺序逐个执行
+- 输入通道：点击批次单独串行执行（写入设备的持久 shell 会话），不排在慢截图后面
+- 截图类请求的准入名额：超出时立即拒绝（503）。名额按 HTTP 工作线程池大小和设备数计算，
+  所有设备合计最多占用 线程数 - TAP_RESERVED_WORKERS 个线程，慢设备不会占满线程池而饿死其他设备
+- 点击的准入名额：与截图分开计数，名额满时最多排队等待 TAP_ADMIT_TIMEOUT 秒，截图再多也不影响点击
+
+通道（以及截图器、指标标签）按设备序列号创建后不再回收，请求中的 device 参数
+需先经 KnownDevices 校验，只接受 adb devices 列出的设备。
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_POOL_SIZE = 10        # 未调用 configure_lanes 时假定的 HTTP 工作线程数
+TAP_RESERVED_WORKERS = 2      # 工作线程中留给点击与非设备请求的数量，截图类请求合计不会占用
+TAP_SLOTS = 2                 # 单台设备同时执行 / 排队的点击请求数
+TAP_ADMIT_TIMEOUT = 2.0       # 点击名额已满时最多等待的秒数
+KNOWN_DEVICES_REFRESH_SECONDS = 1.0  # 遇到未知序列号时刷新设备列表的最短间隔
+
+_pool_size = DEFAULT_POOL_SIZE
+
+
+def configure_lanes(pool_size: int) -> None:
+    """按 HTTP 工作线程池大小设置截图类请求的名额（服务器启动时调用）"""
+    global _pool_size
+    _pool_size = pool_size
+
+
+def max_active_per_device() -> int:
+    """单台设备可同时占用的截图类请求名额：可用线程平均分给已知设备，至少 1 个"""
+    budget = max(1, _pool_size - TAP_RESERVED_WORKERS)
+    return max(1, budget // max(1, len(_lanes)))
+
+
+class DeviceLane:
+    """
+    单设备执行通道
+
+    参数:
+        serial: 设备序列号，None 表示默认设备
+    """
+
+    def __init__(self, serial: Optional[str]):
+        self.serial = serial
+        self._active = 0
+        self._active_lock = threading.Lock()
+        self._tap_slots = threading.BoundedSemaphore(TAP_SLOTS)
+        name = f'lane-{serial or "default"}'
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._input_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'{name}-input')
+
+    def try_admit(self) -> bool:
+        """尝试占用一个截图类请求名额（不阻塞）"""
+        limit = max_active_per_device()
+        with self._active_lock:
+            if self._active >= limit:
+                return False
+            self._active += 1
+            return True
+
+    def release(self) -> None:
+        with self._active_lock:
+            self._active -= 1
+
+    def admit_tap(self, timeout: float = TAP_ADMIT_TIMEOUT) -> bool:
+        """占用一个点击名额，名额已满时最多等待 timeout 秒"""
+        return self._tap_slots.acquire(timeout=timeout)
+
+    def release_tap(self) -> None:
+        self._tap_slots.release()
+
+    def run(self, fn: Callable, *args, timeout: Optional[float] = None):
+        """在设备的截图通道上执行 fn 并等待结果"""
+        return self._executor.submit(fn, *args).result(timeout)
+
+    def run_input(self, fn: Callable, *args, timeout: Optional[float] = None):
+        """在设备的输入通道上执行 fn（点击批次）并等待结果"""
+        return self._input_executor.submit(fn, *args).result(timeout)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+        self._input_executor.shutdown(wait=False)
+
+
+_lanes: Dict[Optional[str], DeviceLane] = {}
+_lanes_lock = threading.Lock()
+
+
+def get_device_lane(serial: Optional[str] = None) -> DeviceLane:
+    """返回指定设备的执行通道（懒加载）"""
+    with _lanes_lock:
+        lane = _lanes.get(serial)
+        if lane is None:
+            lane = _lanes[serial] = DeviceLane(serial)
+            logger.info(f"已为设备 {serial or '默认'} 创建执行通道")
+        return lane
+
+
+def shutdown_lanes() -> None:
+    """关闭所有设备通道"""
+    with _lanes_lock:
+        for lane in _lanes.values():
+            lane.shutdown()
+        _lanes.clear()
+
+
+class KnownDevices:
+    """
+    已连接设备序列号的缓存，用于校验请求中的 device 参数
+
+    已知序列号直接通过；未知序列号触发一次设备列表刷新（新接入的设备能被接受），
+    刷新最多每 refresh_seconds 秒一次，任意字符串不会让每个请求都查询 adb server
+    """
+
+    def __init__(self, refresh_seconds: float = KNOWN_DEVICES_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._serials: frozenset = frozenset()
+        self._refreshed = float('-inf')
+        self._lock = threading.Lock()
+
+    def lookup(self, serial: Optional[str]) -> Optional[bool]:
+        """None（默认设备）与已知序列号返回 True；未知且刚刷新过返回 False；需要刷新时返回 None"""
+        if serial is None:
+            return True
+        with self._lock:
+            if serial in self._serials:
+                return True
+            if time.monotonic() - self._refreshed < self.refresh_seconds:
+                return False
+            # 占住本轮刷新，并发的其他未知请求直接判为未知
+            self._refreshed = time.monotonic()
+            return None
+
+    def update(self, devices: Iterable[Tuple[str, str]]) -> None:
+        """用 adb devices 的结果 [(serial, status), ...] 更新缓存"""
+        serials = frozenset(serial for serial, _ in devices)
+        with self._lock:
+            self._serials = serials
+            self._refreshed = time.monotonic()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+本地模拟 adb server（用于测试）
+实现 smart-socket 协议的子集：host:devices、host:transport、shell:、exec:，
+以及 exec:sh 交互式会话（逐行读取 stdin）
+
+使用方法:
+    python fake_adb_server.py                       # 监听 127.0.0.1:5038
+    python fake_adb_server.py --port 5037           # 直接冒充默认 adb server
+    python fake_adb_server.py --screencap screen.png
+
+在代码中使用:
+    server = FakeADBServer(screencap=png_bytes)
+    server.start()
+    client = ADBClient(port=server.port)
+    ...
+    server.stop()
+"""
+
+import argparse
+import socketserver
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+
+from logger_config import setup_logger
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_FAKE_PORT = 5038
+DEFAULT_SERIAL = 'emulator-5554'
+
+
+def _encode_block(data: bytes) -> bytes:
+    return f'{len(data):04x}'.encode('ascii') + data
+
+
+def _fail(message: str) -> bytes:
+    return b'FAIL' + _encode_block(message.encode('utf-8'))
+
+
+class _FakeADBHandler(socketserver.BaseRequestHandler):
+    """单条连接的协议处理：先 host 服务，transport 切换后再处理设备服务"""
+
+    def _read_exact(self, size: int) -> Optional[bytes]:
+        buf = bytearray()
+        while len(buf) < size:
+            chunk = self.request.recv(size - len(buf))
+            if not chunk:
+                return None
+            buf += chunk
+        return bytes(buf)
+
+    def _read_request(self) -> Optional[str]:
+        header = self._read_exact(4)
+        if header is None:
+            return None
+        payload = self._read_exact(int(header, 16))
+        if payload is None:
+            return None
+        return payload.decode('utf-8')
+
+    def handle(self):
+        fake: 'FakeADBServer' = self.server.fake
+        serial = None
+        while True:
+            service = self._read_request()
+            if service is None:
+                return
+            fake.requests.append(service)
+
+            if service == 'host:devices':
+                listing = ''.join(f'{s}\t{st}\n' for s, st in fake.devices.items())
+                self.request.sendall(b'OKAY' + _encode_block(listing.encode('utf-8')))
+                return
+            if service == 'host:version':
+                self.request.sendall(b'OKAY' + _encode_block(b'0029'))
+                return
+            if service == 'host:transport-any':
+                online = [s for s, st in fake.devices.items() if st == 'device']
+                if len(online) != 1:
+                    self.request.sendall(_fail('more than one device/emulator'
+                                               if online else 'no devices/emulators found'))
+                    return
+                serial = online[0]
+                self.request.sendall(b'OKAY')
+                continue
+            if service.startswith('host:transport:'):
+                serial = service[len('host:transport:'):]
+                if fake.devices.get(serial) != 'device':
+                    self.request.sendall(_fail(f"device '{serial}' not found"))
+                    return
+                self.request.sendall(b'OKAY')
+                continue
+
+            if serial is None:
+                self.request.sendall(_fail(f'unknown host service: {service}'))
+                return
+
+            kind, _, command = service.partition(':')
+            if kind not in ('shell', 'exec'):
+                self.request.sendall(_fail(f'unsupported service: {service}'))
+                return
+            self.request.sendall(b'OKAY')
+            if kind == 'exec' and command == 'sh':
+                self._interactive_sh(fake, serial)
+                return
+            fake.commands.append((serial, kind, command))
+            self.request.sendall(fake.respond(serial, kind, command))
+            return
+
+    def _interactive_sh(self, fake: 'FakeADBServer', serial: str):
+        """模拟从 stdin 逐行读取命令的 sh：echo 原样回显，其余命令只记录"""
+        buf = b''
+        while True:
+            chunk = self.request.recv(4096)
+            if not chunk:
+                return
+            buf += chunk
+            *lines, buf = buf.split(b'\n')
+            for line in lines:
+                command = line.decode('utf-8').strip()
+                if not command:
+                    continue
+                if command == 'exit':
+                    return
+                if command.startswith('echo '):
+                    self.request.sendall(command[len('echo '):].encode('utf-8') + b'\n')
+                    continue
+                fake.commands.append((serial, 'sh', command))
+                output = fake.respond(serial, 'sh', command)
+                if output:
+                    self.request.sendall(output)
+
+
+class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024  # 基准测试会同时发起大量连接
+
+
+class FakeADBServer:
+    """
+    模拟 adb server
+
+    参数:
+        devices: {serial: status}，默认一台在线设备
+        screencap: `screencap -p` 返回的字节
+        handler: 自定义响应函数 (serial, kind, command) -> bytes，返回 None 时走默认逻辑
+        port: 监听端口，0 表示随机分配
+    """
+
+    def __init__(self, devices: Optional[Dict[str, str]] = None, screencap: bytes = b'',
+                 handler: Optional[Callable[[str, str, str], Optional[bytes]]] = None,
+                 host: str = '127.0.0.1', port: int = 0):
+        self.devices = devices if devices is not None else {DEFAULT_SERIAL: 'device'}
+        self.screencap = screencap
+        self.handler = handler
+        self.requests: List[str] = []
+        self.commands: List[Tuple[str, str, str]] = []
+        self._server = _ThreadingTCPServer((host, port), _FakeADBHandler)
+        self._server.fake = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def respond(self, serial: str, kind: str, command: str) -> bytes:
+        """生成设备服务的输出"""
+        if self.handler:
+            data = self.handler(serial, kind, command)
+            if data is not None:
+                return data
+        if command.startswith('screencap'):
+            return self.screencap
+        return b''
+
+    def start(self) -> 'FakeADBServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟 adb server')
+    parser.add_argument('--port', type=int, default=DEFAULT_FAKE_PORT, help='监听端口')
+    parser.add_argument('--screencap', help='screencap 返回的图片文件')
+    parser.add_argument('--debug', action='store_true', help='开启调试模式，显示详细日志')
+    args = parser.parse_args()
+
+    setup_logger(args.debug)
+
+    screencap = b''
+    if args.screencap:
+        with open(args.screencap, 'rb') as f:
+            screencap = f.read()
+
+    server = FakeADBServer(screencap=screencap, port=args.port)
+    logger.info(f"模拟 adb server 启动在 127.0.0.1:{server.port}")
+    logger.info(f"设置 ANDROID_ADB_SERVER_PORT={server.port} 即可让代理连接到它")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("模拟 adb server 已停止")
+        server._server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+后台截图线程 + 最新帧环形缓冲
+按设备持续抓取 screencap 原始帧，多个请求共享同一批帧，截图耗时不再出现在请求的关键路径上
+
+- 首次 get() 时懒启动抓取线程，连续 IDLE_STOP_SECONDS 无人取帧后自动停止，避免空转占用设备
+- get(max_age_ms) 返回满足新鲜度的最新帧；没有时等待下一帧（开始抓取时间晚于请求到达时间）
+- 帧时间戳记录的是开始抓取的时刻，保证计算出的帧龄不会偏小
+- 每次抓取都提交到设备的截图通道（device_lane），与现场截图排队，同一设备上不会并发 screencap
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+
+from adb_client import get_default_client
+from device_lane import get_device_lane
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_CAPACITY = 3          # 环形缓冲帧数
+IDLE_STOP_SECONDS = 10        # 无人取帧多久后停止抓取
+DEFAULT_WAIT_TIMEOUT = 30     # 等待新帧的最长时间（秒）
+RETRY_BACKOFF_SECONDS = 0.1   # 抓取失败后的退避基数
+SCREENCAP_RAW = 'screencap'
+
+
+class FrameGrabber:
+    """
+    单设备后台截图器
+
+    参数:
+        capture: 无参截图函数，返回帧字节
+        capacity: 环形缓冲帧数
+        idle_stop: 无人取帧多久后停止抓取（秒）
+    """
+
+    def __init__(self, capture: Callable[[], bytes], capacity: int = DEFAULT_CAPACITY,
+                 idle_stop: float = IDLE_STOP_SECONDS):
+        self._capture = capture
+        self.idle_stop = idle_stop
+        self._frames: deque = deque(maxlen=capacity)  # [(开始抓取时刻, 帧字节), ...]
+        self._cond = threading.Condition()
+        self._running = False
+        self._stop_requested = False
+        self._last_used = 0.0
+        self._attempts = 0  # 每次抓取结束（成功或失败）加一，用于唤醒等待者
+        self._error: Optional[Exception] = None
+
+    def _ensure_running(self) -> None:
+        """确保抓取线程在运行（调用方持有 _cond）"""
+        if self._running:
+            return
+        self._running = True
+        self._stop_requested = False
+        threading.Thread(target=self._run, daemon=True, name='frame-grabber').start()
+        logger.info("后台截图线程已启动")
+
+    def _run(self) -> None:
+        failures = 0
+        while True:
+            with self._cond:
+                idle = time.monotonic() - self._last_used > self.idle_stop
+                if self._stop_requested or idle:
+                    self._running = False
+                    self._cond.notify_all()
+                    logger.info("后台截图线程已停止" + ("（空闲）" if idle else ""))
+                    return
+
+            started = time.monotonic()
+            try:
+                data = self._capture()
+                if not data:
+                    raise ValueError('设备返回空数据')
+            except Exception as e:
+                failures += 1
+                with self._cond:
+                    self._error = e
+                    self._attempts += 1
+                    self._cond.notify_all()
+                logger.warning(f"后台截图失败（连续 {failures} 次）: {e}")
+                time.sleep(min(1.0, RETRY_BACKOFF_SECONDS * failures))
+                continue
+
+            failures = 0
+            with self._cond:
+                self._frames.append((started, data))
+                self._error = None
+                self._attempts += 1
+                self._cond.notify_all()
+
+    def get(self, max_age_ms: float = 0, timeout: float = DEFAULT_WAIT_TIMEOUT) -> Tuple[float, bytes]:
+        """
+        返回 (帧龄毫秒, 帧字节)
+
+        最新帧的帧龄不超过 max_age_ms 时直接返回，否则等待请求到达后开始抓取的下一帧。
+
+        Raises:
+            TimeoutError: 超时仍未等到合适的帧
+            Exception: 抓取失败时抛出最近一次的截图异常
+        """
+        requested = time.monotonic()
+        deadline = requested + timeout
+        with self._cond:
+            self._last_used = requested
+            self._ensure_running()
+            while True:
+                if self._frames:
+                    started, data = self._frames[-1]
+                    age_ms = (time.monotonic() - started) * 1000
+                    if age_ms <= max_age_ms or started >= requested:
+                        return age_ms, data
+
+                attempts = self._attempts
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait_for(
+                        lambda: self._attempts != attempts or not self._running, remaining):
+                    raise TimeoutError(f"等待新截图超时 ({timeout}s)")
+                if self._error is not None:
+                    raise Exception(f"截图失败: {self._error}")
+                if not self._running:
+                    self._ensure_running()
+
+    def frames(self) -> List[Tuple[float, bytes]]:
+        """环形缓冲快照：[(开始抓取时刻, 帧字节), ...]，从旧到新"""
+        with self._cond:
+            return list(self._frames)
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stop_requested = True
+
+
+_grabbers: Dict[Optional[str], FrameGrabber] = {}
+_grabbers_lock = threading.Lock()
+
+
+def get_frame_grabber(serial: Optional[str] = None) -> FrameGrabber:
+    """返回指定设备共享的后台截图器（基于默认 adb 客户端，在设备的截图通道上抓取，懒加载）"""
+    with _grabbers_lock:
+        grabber = _grabbers.get(serial)
+        if grabber is None:
+            client = get_default_client()
+            grabber = _grabbers[serial] = FrameGrabber(
+                lambda: get_device_lane(serial).run(client.exec_out, SCREENCAP_RAW, serial))
+        return grabber
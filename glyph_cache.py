@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+约束数字识别结果缓存（按字形内容寻址）
+竞速时每轮都会重新识别同样字体、同样大小的约束数字，同一字形只需识别一次
+
+- 键：二值化（白底黑字）后的加边框字形的哈希，含尺寸与识别配置版本
+  （Tesseract 参数、字形裁剪方式等，由调用方给出），配置变化后旧结果自然失效
+  用精确哈希而不是感知哈希：二值化已去掉颜色与抗锯齿差异，同一画面的同一数字像素完全相同；
+  感知哈希会把 3 / 8、1 / 7 这类相近字形合并，得到错误结果
+- 两级缓存：进程内 LRU + 磁盘 sqlite（复用 solution_cache.SolutionCache，使用独立的 glyphs 表）
+- 一批识别结果在一个事务内写入磁盘
+- 识别结果为空（没有识别出数字）不缓存：多为裁剪或预处理失误，下次重新识别
+- 命中 / 未命中计数通过 /metrics 输出（showpage_glyph_cache_total），每批识别的命中率写入日志
+
+默认只使用内存缓存；设置环境变量 SHOWPAGE_GLYPH_CACHE 为数据库路径时启用磁盘层
+（如 ~/.cache/showpage/glyphs.sqlite3）。
+"""
+
+import hashlib
+import os
+import threading
+from typing import Dict, Optional
+import logging
+
+import numpy as np
+
+import metrics
+from solution_cache import HIT_DISK, HIT_MEMORY, MISS, SolutionCache
+
+logger = logging.getLogger(__name__)
+
+
+MEMORY_CAPACITY = 4096  # 进程内缓存字形数
+DB_PATH_ENV = 'SHOWPAGE_GLYPH_CACHE'  # 磁盘层数据库路径，未设置时只使用内存缓存
+INK_THRESHOLD = 128  # 灰度低于此值视为墨迹
+
+TABLE = 'glyphs'  # 磁盘层表名
+KIND_GLYPH = 'glyph'
+
+GLYPH_REQUESTS = metrics.Counter('showpage_glyph_cache_total', '约束数字识别缓存查询次数', ('result',))
+metrics.register(GLYPH_REQUESTS)
+
+
+def glyph_key(gray: np.ndarray, version: str = '') -> str:
+    """加边框的灰度字形 + 识别配置版本 → 缓存键"""
+    ink = np.packbits(np.asarray(gray) < INK_THRESHOLD)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(version.encode('utf-8'))
+    digest.update(np.array(gray.shape[:2], dtype=np.uint32).tobytes())
+    digest.update(ink.tobytes())
+    return digest.hexdigest()
+
+
+def lookup(key: str) -> Optional[str]:
+    """查询识别结果，未命中返回 None"""
+    level, text = get_default_cache().lookup(KIND_GLYPH, key)
+    GLYPH_REQUESTS.inc(level)
+    return text
+
+
+def store(key: str, text: str) -> None:
+    """写入识别结果，空结果不缓存"""
+    if text:
+        get_default_cache().store(KIND_GLYPH, key, text)
+
+
+def store_many(results: Dict[str, str]) -> None:
+    """写入一批识别结果（键 → 文本），空结果不缓存，磁盘层只提交一次"""
+    get_default_cache().store_many(KIND_GLYPH, [(key, text) for key, text in results.items() if text])
+
+
+_default: Optional[SolutionCache] = None
+_default_lock = threading.Lock()
+
+
+def get_default_cache() -> SolutionCache:
+    """进程内共享的缓存，首次使用时按环境变量打开磁盘层（未设置则只有内存层）"""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = SolutionCache(os.environ.get(DB_PATH_ENV) or None, MEMORY_CAPACITY,
+                                     table=TABLE)
+        return _default
+
+
+def stats() -> dict:
+    """命中 / 未命中计数与命中率"""
+    counts = {level: int(GLYPH_REQUESTS.value(level)) for level in (HIT_MEMORY, HIT_DISK, MISS)}
+    total = sum(counts.values())
+    counts['hit_rate'] = round((total - counts[MISS]) / total, 4) if total else 0.0
+    return counts
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+识别器的图像输入统一入口
+支持内存中的各种来源，不经过临时文件：
+
+- raw_frame.RawFrame：screencap 原始帧，只转换需要的区域
+- bytes / bytearray / memoryview：PNG/JPEG 等编码数据（cv2.imdecode），
+  或 screencap 原始帧字节
+- np.ndarray：已解码的 BGR 图像（H×W×3），或一维 uint8 编码数据
+- str / pathlib.Path：图片文件路径
+"""
+
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+import metrics
+from raw_frame import RawFrame, is_png, parse_raw_screencap
+
+JPEG_SIGNATURE = b'\xff\xd8\xff'
+PNG_FAST_COMPRESSION = 1  # 服务端临时编码时优先速度
+DEFAULT_JPEG_QUALITY = 85
+
+
+def _decode_buffer(data) -> np.ndarray:
+    """解码内存中的图像字节：编码格式走 imdecode，否则按原始帧解析"""
+    view = memoryview(data)
+    if is_png(view) or bytes(view[:3]) == JPEG_SIGNATURE:
+        img = cv2.imdecode(np.frombuffer(view, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError("无法解码图像数据")
+        return img
+    return parse_raw_screencap(view)
+
+
+@metrics.timed('decode')
+def load_bgr(source, width=None, height=None) -> np.ndarray:
+    """
+    把任意支持的图像来源转换为 BGR 图像，并截取左上角 width×height 区域
+
+    参数:
+        source: 见模块说明
+        width / height: 截取区域大小，None 表示不截取
+
+    返回:
+        np.ndarray: BGR 图像（原始帧只转换截取区域；ndarray 输入返回切片视图）
+    """
+    if isinstance(source, (str, Path)):
+        img = cv2.imread(str(source))
+        if img is None:
+            raise FileNotFoundError(f"无法读取图像: {source}")
+    elif isinstance(source, np.ndarray) and source.ndim == 1:
+        img = _decode_buffer(source)
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        img = _decode_buffer(source)
+    else:
+        img = source
+
+    if isinstance(img, RawFrame):
+        w = img.width if width is None else min(img.width, width)
+        h = img.height if height is None else min(img.height, height)
+        return img.to_bgr(0, 0, w, h)
+
+    if not isinstance(img, np.ndarray) or img.ndim != 3 or img.shape[2] != 3:
+        raise TypeError(f"不支持的图像输入: {type(source).__name__}")
+    return img[:height, :width]
+
+
+def encode_png(img: np.ndarray) -> bytes:
+    """把 BGR 图像编码为 PNG 字节（低压缩级别，换取编码速度）"""
+    ok, buf = cv2.imencode('.png', img, [cv2.IMWRITE_PNG_COMPRESSION, PNG_FAST_COMPRESSION])
+    if not ok:
+        raise ValueError("PNG 编码失败")
+    return buf.tobytes()
+
+
+def encode_jpeg(img: np.ndarray, quality: int = DEFAULT_JPEG_QUALITY) -> bytes:
+    """把 BGR 图像编码为 JPEG 字节"""
+    ok, buf = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("JPEG 编码失败")
+    return buf.tobytes()
@@ -1,9 +1,11 @@
 import logging
 import sys
 
-def setup_logger(debug=False):
+def setup_logger(debug=False, stream=None):
     """
     配置全局日志记录器
+
+    stream: 日志输出流，默认 stdout（stdout 输出结果数据时可改为 stderr）
     """
     level = logging.DEBUG if debug else logging.INFO
 
@@ -16,7 +18,7 @@ def setup_logger(debug=False):
         logger.handlers.clear()
 
     # 创建一个流处理器，将日志输出到控制台
-    handler = logging.StreamHandler(sys.stdout)
+    handler = logging.StreamHandler(stream or sys.stdout)
     handler.setLevel(level)
 
     # 创建一个格式化器
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+进程内指标（Prometheus 文本格式），不依赖外部服务
+代理服务器通过 /metrics 输出，可直接被 Prometheus 抓取，也可以用 curl 查看
+
+- 请求：showpage_requests_total / showpage_request_duration_seconds，按 endpoint、device、status 区分
+- 阶段：showpage_stage_duration_seconds / showpage_stage_errors_total，按 stage、endpoint、device 区分
+
+当前请求的 endpoint 与 device 保存在 contextvars 中，识别器、求解器内部用 timed(stage)
+记录阶段耗时时不需要层层传参；在线程池中执行时需用 contextvars.copy_context().run 传递上下文。
+"""
+
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 秒；覆盖从单次点击（毫秒级）到慢设备截图、整轮识别（数秒）的范围
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+NO_ENDPOINT = 'none'      # 不在请求中（命令行调用、后台线程）
+DEFAULT_DEVICE = 'default'
+INVALID_DEVICE = 'invalid'  # 请求指定了未连接的设备（不为任意字符串单独建标签）
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    return '{' + ','.join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + '}'
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """单调递增计数器"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues: str) -> float:
+        with self._lock:
+            return self._values.get(labelvalues, 0)
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labelvalues, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labelnames, labelvalues)} '
+                             f'{_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    """累积分桶直方图"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labelvalues -> [各桶计数..., 总和, 总数]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        with self._lock:
+            series = self._values.get(labelvalues)
+            if series is None:
+                series = self._values[labelvalues] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, *labelvalues: str) -> int:
+        with self._lock:
+            series = self._values.get(labelvalues)
+            return int(series[-1]) if series else 0
+
+    def sum(self, *labelvalues: str) -> float:
+        with self._lock:
+            series = self._values.get(labelvalues)
+            return series[-2] if series else 0.0
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        names = self.labelnames + ('le',)
+        with self._lock:
+            for labelvalues, series in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, series):
+                    labels = _format_labels(names, labelvalues + (_format_value(bound),))
+                    lines.append(f'{self.name}_bucket{labels} {int(count)}')
+                labels = _format_labels(names, labelvalues + ('+Inf',))
+                lines.append(f'{self.name}_bucket{labels} {int(series[-1])}')
+                labels = _format_labels(self.labelnames, labelvalues)
+                lines.append(f'{self.name}_sum{labels} {_format_value(series[-2])}')
+                lines.append(f'{self.name}_count{labels} {int(series[-1])}')
+        return lines
+
+
+REQUESTS = Counter('showpage_requests_total', '处理的请求数', ('endpoint', 'device', 'status'))
+REQUEST_SECONDS = Histogram('showpage_request_duration_seconds', '请求总耗时（秒）',
+                            ('endpoint', 'device'))
+STAGE_SECONDS = Histogram('showpage_stage_duration_seconds', '处理阶段耗时（秒）',
+                          ('stage', 'endpoint', 'device'))
+STAGE_ERRORS = Counter('showpage_stage_errors_total', '处理阶段异常次数',
+                       ('stage', 'endpoint', 'device'))
+
+_registry = [REQUESTS, REQUEST_SECONDS, STAGE_SECONDS, STAGE_ERRORS]
+
+
+def register(metric) -> None:
+    """注册额外的指标，使其出现在 render() 的输出中"""
+    _registry.append(metric)
+
+
+class _RequestLabels:
+    __slots__ = ('endpoint', 'device', 'status')
+
+    def __init__(self, endpoint: str, device: str):
+        self.endpoint = endpoint
+        self.device = device
+        self.status = 0
+
+
+_current: contextvars.ContextVar[Optional[_RequestLabels]] = contextvars.ContextVar(
+    'showpage_request', default=None)
+
+
+def _labels() -> Tuple[str, str]:
+    request = _current.get()
+    if request is None:
+        return NO_ENDPOINT, DEFAULT_DEVICE
+    return request.endpoint, request.device
+
+
+@contextmanager
+def track_request(endpoint: str, device: Optional[str]) -> Iterator[None]:
+    """记录一次请求：设置当前请求标签，退出时记录请求数与总耗时"""
+    request = _RequestLabels(endpoint, device or DEFAULT_DEVICE)
+    token = _current.set(request)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        _current.reset(token)
+        REQUEST_SECONDS.observe(elapsed, request.endpoint, request.device)
+        REQUESTS.inc(request.endpoint, request.device, str(request.status or 'unknown'))
+
+
+def set_status(status: int) -> None:
+    """记录当前请求的响应状态码（只记录第一次）"""
+    request = _current.get()
+    if request is not None and not request.status:
+        request.status = status
+
+
+def set_device(device: Optional[str]) -> None:
+    """请求体中指定设备时更新当前请求的 device 标签"""
+    request = _current.get()
+    if request is not None and device:
+        request.device = device
+
+
+class timed:
+    """
+    记录阶段耗时，可用作上下文管理器或装饰器
+
+        with metrics.timed('capture'):
+            ...
+
+        @metrics.timed('propagate')
+        def _propagate(...):
+            ...
+    """
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self._started = 0.0
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        endpoint, device = _labels()
+        STAGE_SECONDS.observe(time.perf_counter() - self._started, self.stage, endpoint, device)
+        if exc_type is not None:
+            STAGE_ERRORS.inc(self.stage, endpoint, device)
+        return False
+
+    def __call__(self, fn):
+        stage = self.stage
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            # 每次调用使用独立的计时器，并发调用互不干扰
+            with timed(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+def render() -> str:
+    """所有指标的 Prometheus 文本格式"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+数织求解器基准：生成题库，对各传播 / 求解引擎计时，并与保存的基准对比
+
+题库（固定种子，可重复生成，也可写出为 JSONL 供 nonogram_solver --jsonl 使用）：
+- random：随机网格（填充率 0.6）反推约束，尺寸 5–50
+- hard：随机网格（填充率 0.5）中单靠逐线传播解不出、需要搜索的题目，尺寸不超过 HARD_MAX_SIZE
+
+引擎：
+- small / large / vectorized：从空白网格做一次约束传播（_propagate_small / _propagate_large /
+  _propagate_vectorized），small 只适用于 n ≤ SMALL_MAX_SIZE
+- solve：完整求解（传播 + 搜索）
+- solver：增量求解器 Solver 的首次求解
+
+每个 (引擎, 题型, 尺寸) 报告单题耗时的中位数与 p99、逐线分析次数、峰值内存（tracemalloc），
+以及没有完整解出的题数（搜索试探次数用完时 solve / solver 抛出 SearchLimitExceeded，计为未解出）。
+逐线分析缓存在每题开始前清空，分析次数与题目顺序无关（搜索阶段使用自己的缓存，不计入）。
+
+使用方法:
+    python nonogram_benchmark.py
+    python nonogram_benchmark.py --sizes 5,10,15,20 --engines small,large --repeat 5
+    python nonogram_benchmark.py --save-baseline bench.json
+    python nonogram_benchmark.py --baseline bench.json   # 退化时退出码为 1
+    python nonogram_benchmark.py --write-corpus corpus.jsonl
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import logging
+
+import nonogram_solver
+from logger_config import setup_logger
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_SIZES = (5, 10, 15, 20, 25, 30, 40, 50)
+DEFAULT_COUNT = 10        # 每个尺寸的随机题数
+DEFAULT_HARD_COUNT = 5    # 每个尺寸最多收集的难题数
+DEFAULT_REPEAT = 3        # 每题计时次数
+DEFAULT_SEED = 2024
+
+RANDOM_DENSITY = 0.6
+HARD_DENSITY = 0.5        # 填充率 0.5 附近的随机题最容易卡住逐线传播
+HARD_MAX_SIZE = 30        # 更大的难题搜索耗时以秒计，不适合作为常规基准
+HARD_MAX_ATTEMPTS = 200   # 每个尺寸为收集难题最多尝试的随机网格数
+
+TIME_TOLERANCE = 0.25     # 耗时允许的退化比例（计时有噪声）
+COUNT_TOLERANCE = 0.05    # 分析次数、峰值内存允许的退化比例（基本是确定的）
+
+KIND_RANDOM = 'random'
+KIND_HARD = 'hard'
+
+Puzzle = Dict[str, object]  # {'id', 'kind', 'n', 'rows', 'cols'}
+
+
+# ─── 题库 ──────────────────────────────────────────────────────────
+
+
+def _clues(line: List[int]) -> List[int]:
+    clue = []
+    run = 0
+    for v in line:
+        if v:
+            run += 1
+        elif run:
+            clue.append(run)
+            run = 0
+    if run:
+        clue.append(run)
+    return clue
+
+
+def random_puzzle(n: int, density: float, rng: random.Random) -> Tuple[List[List[int]], List[List[int]]]:
+    """随机网格反推出的 (rows, cols)，必定有解"""
+    grid = [[1 if rng.random() < density else 0 for _ in range(n)] for _ in range(n)]
+    rows = [_clues(row) for row in grid]
+    cols = [_clues([grid[r][c] for r in range(n)]) for c in range(n)]
+    return rows, cols
+
+
+def _needs_search(rows: List[List[int]], cols: List[List[int]]) -> bool:
+    n = len(rows)
+    grid = [[-1] * n for _ in range(n)]
+    nonogram_solver._propagate(grid, rows, cols)
+    return any(-1 in row for row in grid)
+
+
+def generate_corpus(sizes: List[int], count: int = DEFAULT_COUNT,
+                    hard_count: int = DEFAULT_HARD_COUNT, seed: int = DEFAULT_SEED) -> List[Puzzle]:
+    """按尺寸生成题库；相同参数总是生成相同的题目"""
+    corpus = []
+    for n in sizes:
+        rng = random.Random(f'{seed}-{KIND_RANDOM}-{n}')
+        for i in range(count):
+            rows, cols = random_puzzle(n, RANDOM_DENSITY, rng)
+            corpus.append({'id': f'{KIND_RANDOM}-{n}-{i}', 'kind': KIND_RANDOM, 'n': n,
+                           'rows': rows, 'cols': cols})
+
+        if n > HARD_MAX_SIZE or hard_count <= 0:
+            continue
+        rng = random.Random(f'{seed}-{KIND_HARD}-{n}')
+        found = 0
+        for _ in range(HARD_MAX_ATTEMPTS):
+            rows, cols = random_puzzle(n, HARD_DENSITY, rng)
+            if not _needs_search(rows, cols):
+                continue
+            corpus.append({'id': f'{KIND_HARD}-{n}-{found}', 'kind': KIND_HARD, 'n': n,
+                           'rows': rows, 'cols': cols})
+            found += 1
+            if found == hard_count:
+                break
+        if found < hard_count:
+            logger.info(f"{n}x{n} 只收集到 {found} 道难题（尝试 {HARD_MAX_ATTEMPTS} 次）")
+    return corpus
+
+
+def write_corpus(corpus: List[Puzzle], path: str) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        for puzzle in corpus:
+            f.write(json.dumps(puzzle, separators=(',', ':')) + '\n')
+
+
+def read_corpus(path: str) -> List[Puzzle]:
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# ─── 引擎 ──────────────────────────────────────────────────────────
+
+
+def _propagation(fn: Callable) -> Callable[[Puzzle], object]:
+    def run(puzzle: Puzzle):
+        n = puzzle['n']
+        grid = [[-1] * n for _ in range(n)]
+        return fn(grid, puzzle['rows'], puzzle['cols'])
+    return run
+
+
+_GAVE_UP = object()  # 搜索试探次数用完，放弃求解
+
+
+def _solve(puzzle: Puzzle):
+    try:
+        return nonogram_solver.solve(puzzle['rows'], puzzle['cols'])
+    except nonogram_solver.SearchLimitExceeded:
+        return _GAVE_UP
+
+
+def _incremental(puzzle: Puzzle):
+    try:
+        return nonogram_solver.Solver(puzzle['rows'], puzzle['cols']).solve()
+    except nonogram_solver.SearchLimitExceeded:
+        return _GAVE_UP
+
+
+# 引擎名 → (单题运行函数, 适用的最大尺寸)
+ENGINES: Dict[str, Tuple[Callable[[Puzzle], object], Optional[int]]] = {
+    'small': (_propagation(nonogram_solver._propagate_small), nonogram_solver.SMALL_MAX_SIZE),
+    'large': (_propagation(nonogram_solver._propagate_large), None),
+    'vectorized': (_propagation(nonogram_solver._propagate_vectorized), None),
+    'solve': (_solve, None),
+    'solver': (_incremental, None),
+}
+
+
+@contextmanager
+def _count_batched_lines(counter: List[int]) -> Iterator[None]:
+    """统计向量化路径整批分析的线数（该路径不经过逐线分析缓存）"""
+    analyze = nonogram_solver._analyze_lines_np
+
+    def counting(cells, *args, **kwargs):
+        counter[0] += cells.shape[0]
+        return analyze(cells, *args, **kwargs)
+
+    nonogram_solver._analyze_lines_np = counting
+    try:
+        yield
+    finally:
+        nonogram_solver._analyze_lines_np = analyze
+
+
+def _unsolved(result) -> bool:
+    """求解引擎的结果是否不完整（放弃搜索或仍有未知格）；传播引擎不计"""
+    if result is _GAVE_UP:
+        return True
+    if not isinstance(result, list):
+        return False
+    return any(-1 in row for row in result)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    """最近秩百分位数"""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))  # ceil
+    return ordered[int(rank) - 1]
+
+
+def measure(run: Callable[[Puzzle], object], puzzles: List[Puzzle], repeat: int) -> dict:
+    """
+    对一组题目计时，返回 {'puzzles', 'median_ms', 'p99_ms', 'lines', 'peak_kb', 'unsolved'}
+
+    先在 tracemalloc 下逐题运行一遍（同时预热候选缓存），记录逐线分析次数与峰值内存；
+    再关闭 tracemalloc 逐题计时 repeat 次，每题取最快一次。
+    """
+    lines = 0
+    peak = 0
+    unsolved = 0
+    batched = [0]
+    with _count_batched_lines(batched):
+        for puzzle in puzzles:
+            nonogram_solver._LINE_MEMO.clear()
+            tracemalloc.start()
+            try:
+                unsolved += _unsolved(run(puzzle))
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+            info = nonogram_solver.line_memo_info()
+            lines += info['hits'] + info['misses']
+    lines += batched[0]
+
+    times = []
+    for puzzle in puzzles:
+        best = float('inf')
+        for _ in range(repeat):
+            nonogram_solver._LINE_MEMO.clear()
+            started = time.perf_counter()
+            run(puzzle)
+            best = min(best, time.perf_counter() - started)
+        times.append(best * 1000)
+
+    return {
+        'puzzles': len(puzzles),
+        'median_ms': round(statistics.median(times), 3),
+        'p99_ms': round(_percentile(times, 99), 3),
+        'lines': lines,
+        'peak_kb': round(peak / 1024, 1),
+        'unsolved': unsolved,
+    }
+
+
+def run_benchmark(corpus: List[Puzzle], engines: List[str], repeat: int = DEFAULT_REPEAT) -> Dict[str, dict]:
+    """按 (引擎, 题型, 尺寸) 分组计时，键为 "引擎/题型/尺寸" """
+    groups: Dict[Tuple[str, int], List[Puzzle]] = {}
+    for puzzle in corpus:
+        groups.setdefault((puzzle['kind'], puzzle['n']), []).append(puzzle)
+
+    results = {}
+    for engine in engines:
+        run, max_size = ENGINES[engine]
+        for (kind, n), puzzles in sorted(groups.items(), key=lambda item: (item[0][1], item[0][0])):
+            if max_size is not None and n > max_size:
+                continue
+            key = f'{engine}/{kind}/{n}'
+            results[key] = measure(run, puzzles, repeat)
+            logger.debug(f"{key}: {results[key]}")
+    return results
+
+
+# ─── 基准对比 ──────────────────────────────────────────────────────
+
+# 绝对差值低于此值不算退化（亚毫秒级的耗时抖动、几 KB 的内存波动）
+_NOISE_FLOOR = {'median_ms': 0.5, 'p99_ms': 1.0, 'lines': 0, 'peak_kb': 16, 'unsolved': 0}
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict],
+            time_tolerance: float = TIME_TOLERANCE,
+            count_tolerance: float = COUNT_TOLERANCE) -> List[str]:
+    """返回退化项的描述；只比较两边都有的分组"""
+    regressions = []
+    checks = (('median_ms', time_tolerance), ('p99_ms', time_tolerance),
+              ('lines', count_tolerance), ('peak_kb', count_tolerance), ('unsolved', 0))
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        for field, tolerance in checks:
+            old, new = base.get(field), result.get(field)
+            if old is None or new is None:
+                continue
+            if new > old * (1 + tolerance) and new - old > _NOISE_FLOOR[field]:
+                regressions.append(f"{key} {field}: {old} → {new}")
+    return regressions
+
+
+def _print_results(results: Dict[str, dict]) -> None:
+    print(f"{'引擎/题型/尺寸':<24} {'题数':>4} {'中位数ms':>10} {'p99ms':>10} {'逐线分析':>10} {'峰值KB':>10} {'未解出':>6}")
+    for key, r in results.items():
+        print(f"{key:<28} {r['puzzles']:>4} {r['median_ms']:>10.3f} {r['p99_ms']:>10.3f} "
+              f"{r['lines']:>10} {r['peak_kb']:>10.1f} {r.get('unsolved', 0):>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='数织求解器基准')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), help='尺寸列表，逗号分隔')
+    parser.add_argument('--engines', default=','.join(ENGINES), help='引擎列表，逗号分隔')
+    parser.add_argument('--count', type=int, default=DEFAULT_COUNT, help='每个尺寸的随机题数')
+    parser.add_argument('--hard', type=int, default=DEFAULT_HARD_COUNT, help='每个尺寸最多收集的难题数')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='每题计时次数（取最快）')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='题库随机种子')
+    parser.add_argument('--corpus', metavar='PATH', help='从 JSONL 读取题库（忽略 --sizes/--count/--hard/--seed）')
+    parser.add_argument('--write-corpus', metavar='PATH', help='把生成的题库写入 JSONL 后退出')
+    parser.add_argument('--baseline', metavar='PATH', help='与保存的基准对比，退化时退出码为 1')
+    parser.add_argument('--save-baseline', metavar='PATH', help='把本次结果保存为基准')
+    parser.add_argument('--tolerance', type=float, default=TIME_TOLERANCE, help='耗时允许的退化比例')
+    parser.add_argument('--debug', action='store_true', help='开启调试模式，显示详细日志')
+    args = parser.parse_args()
+
+    setup_logger(args.debug)
+    if not args.debug:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    engines = [e.strip() for e in args.engines.split(',') if e.strip()]
+    unknown = [e for e in engines if e not in ENGINES]
+    if unknown:
+        parser.error(f"未知引擎: {', '.join(unknown)}（可选 {', '.join(ENGINES)}）")
+
+    if args.corpus:
+        corpus = read_corpus(args.corpus)
+        corpus_meta = {'path': args.corpus, 'puzzles': len(corpus)}
+    else:
+        sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+        corpus = generate_corpus(sizes, args.count, args.hard, args.seed)
+        corpus_meta = {'sizes': sizes, 'count': args.count, 'hard': args.hard, 'seed': args.seed}
+    if args.write_corpus:
+        write_corpus(corpus, args.write_corpus)
+        print(f"已写入 {len(corpus)} 道题: {args.write_corpus}")
+        return
+
+    results = run_benchmark(corpus, engines, args.repeat)
+    _print_results(results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({'corpus': corpus_meta, 'repeat': args.repeat, 'results': results},
+                      f, ensure_ascii=False, indent=2)
+        print(f"基准已保存: {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('corpus') != corpus_meta:
+            print(f"基准题库参数不一致: {baseline.get('corpus')} vs {corpus_meta}", file=sys.stderr)
+            sys.exit(2)
+        regressions = compare(results, baseline['results'], args.tolerance)
+        if regressions:
+            print(f"相对基准退化 {len(regressions)} 项:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            sys.exit(1)
+        print("与基准相比没有退化")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+数织竞速：服务端一轮完成 截图 → 识别 → 求解 → 规划点击 → 点击
+与网页 runSpeedRacingLoop 的一轮等价，但不经过浏览器往返，各阶段耗时单独记录
+
+点击规划与网页 tapFirstRowFilled 一致：先找第一条“有填充格且无未知格”的行，
+没有再找列，只点击这一条线上的填充格。
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+
+import nonogram_recognizer
+import nonogram_solver
+import solution_cache
+
+logger = logging.getLogger(__name__)
+
+
+FILLED = 1
+UNKNOWN = -1
+
+# 游戏区域：{'startX', 'startY', 'gridWidth', 'gridHeight'}，与网页 adbConfig 相同
+GameArea = Dict[str, int]
+
+
+class StageTimer:
+    """按阶段记录耗时（毫秒）"""
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    def finish(self) -> Dict[str, float]:
+        self.timings['total'] = round((time.perf_counter() - self._started) * 1000, 1)
+        return self.timings
+
+
+def parse_constraint_text(text: str) -> List[List[int]]:
+    """
+    解析识别器输出的约束文本（每行一条约束，空格分隔），规则与网页 parseConstraintsText 相同：
+    单独的 0 表示空行，? 或 -1 表示约束未知
+    """
+    clues = []
+    for line in text.strip().split('\n'):
+        tokens = line.split()
+        if tokens == ['0']:
+            clues.append([])
+            continue
+        clues.append([-1 if token == '?' else int(token) for token in tokens])
+    return clues
+
+
+def recognize(source, tracker: Optional[nonogram_recognizer.ClueTracker] = None
+              ) -> Tuple[List[List[int]], List[List[int]], Optional[GameArea]]:
+    """识别约束和游戏区域，返回 (rows, cols, area)；tracker 见 nonogram_recognizer.ClueTracker"""
+    result = nonogram_recognizer.recognize_from_source(source, tracker=tracker)
+    rows = parse_constraint_text(result.get('row', ''))
+    cols = parse_constraint_text(result.get('col', ''))
+    if not rows or not cols:
+        raise Exception('识别返回空约束，无法求解')
+
+    area = None
+    pos = result.get('pos')
+    if pos and len(pos) == 2:
+        (x1, y1), (x2, y2) = pos
+        area = {'startX': x1, 'startY': y1, 'gridWidth': x2 - x1, 'gridHeight': y2 - y1}
+    return rows, cols, area
+
+
+def solve(rows: List[List[int]], cols: List[List[int]]) -> List[List[int]]:
+    grid = solution_cache.solve_nonogram(rows, cols)
+    if grid is None:
+        raise Exception('无解')
+    return grid
+
+
+class RaceSession:
+    """
+    连续竞速的跨轮状态：每轮点击后同一题目会被重新识别，约束通常不变或只有个别 OCR 修正，
+    约束区域未变化时跳过识别，同一尺寸的题目复用增量求解器，只更新变化的约束
+    """
+
+    def __init__(self):
+        self.solver: Optional[nonogram_solver.Solver] = None
+        self.tracker = nonogram_recognizer.ClueTracker()
+
+    def solve(self, rows: List[List[int]], cols: List[List[int]]) -> List[List[int]]:
+        if self.solver is None or self.solver.n != len(rows) or len(rows) != len(cols):
+            self.solver = nonogram_solver.Solver(rows, cols)
+        else:
+            self.solver.update_clues(rows, cols)
+        grid = self.solver.solve()
+        if grid is None:
+            raise Exception('无解')
+        return grid
+
+
+def cell_center(grid: List[List[int]], area: GameArea, row: int, col: int) -> Tuple[int, int]:
+    """格子中心的屏幕坐标（与网页 calculateCellCenter 相同的累积算法）"""
+    x = round(area['startX'] + ((col + 0.5) * area['gridWidth']) / len(grid[0]))
+    y = round(area['startY'] + ((row + 0.5) * area['gridHeight']) / len(grid))
+    return x, y
+
+
+def plan_line_taps(grid: List[List[int]], area: GameArea) -> Tuple[str, List[Tuple[int, int]]]:
+    """
+    找到第一条完全确定且有填充格的行（其次是列），返回 (线的描述, 点击坐标)
+
+    Raises:
+        Exception: 没有符合条件的行或列
+    """
+    n_rows, n_cols = len(grid), len(grid[0])
+    lines = [(f'第{r + 1}行', [(r, c) for c in range(n_cols)]) for r in range(n_rows)]
+    lines += [(f'第{c + 1}列', [(r, c) for r in range(n_rows)]) for c in range(n_cols)]
+    for label, cells in lines:
+        values = [grid[r][c] for r, c in cells]
+        if UNKNOWN in values or FILLED not in values:
+            continue
+        return label, [cell_center(grid, area, r, c) for r, c in cells if grid[r][c] == FILLED]
+    raise Exception('网格中没有完全确定的填充格子行或列')
+
+
+def run_round(capture: Callable[[], object], tap: Callable[[List[Tuple[int, int]]], None],
+              area: Optional[GameArea] = None, session: Optional[RaceSession] = None) -> dict:
+    """
+    执行一轮竞速
+
+    参数:
+        capture: 截图函数，返回识别器可接受的图像来源
+        tap: 批量点击函数
+        area: 游戏区域，None 时使用识别结果
+        session: 连续竞速的跨轮状态，None 时每轮独立求解
+
+    返回:
+        {'size', 'line', 'taps', 'timings': {capture, recognize, solve, plan, tap, total}}
+    """
+    timer = StageTimer()
+    with timer.stage('capture'):
+        source = capture()
+    with timer.stage('recognize'):
+        rows, cols, recognized_area = recognize(source, session.tracker if session else None)
+    area = area or recognized_area
+    if area is None:
+        raise Exception('未识别到游戏区域，请指定 area')
+    with timer.stage('solve'):
+        grid = session.solve(rows, cols) if session else solve(rows, cols)
+    with timer.stage('plan'):
+        label, taps = plan_line_taps(grid, area)
+    with timer.stage('tap'):
+        tap(taps)
+    timings = timer.finish()
+    logger.info(f"竞速一轮完成: {len(rows)}x{len(cols)}，点击{label} {len(taps)} 格，耗时 {timings}")
+    return {'size': len(rows), 'line': label, 'taps': len(taps), 'timings': timings}
+
+
+def parse_area(value: Optional[str]) -> Optional[GameArea]:
+    """解析 "x,y,w,h" 形式的游戏区域；None 表示使用识别结果"""
+    if value is None:
+        return None
+    parts = value.split(',')
+    if len(parts) != 4:
+        raise ValueError(f"area 格式应为 x,y,w,h: {value}")
+    x, y, w, h = (int(p) for p in parts)
+    return {'startX': x, 'startY': y, 'gridWidth': w, 'gridHeight': h}
@@ -15,11 +15,16 @@ from pathlib import Path
 import argparse
 import json
 import pytesseract
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
 from concurrent.futures import ThreadPoolExecutor
 import os
+import hashlib
+import threading
 
 import logging
+import glyph_cache
+import metrics
+from image_source import load_bgr
 from logger_config import setup_logger
 
 logger = logging.getLogger(__name__)
@@ -59,11 +64,58 @@ COL_CONSTRAINT_MIN_X = 1000  # 列约束最小 x 边界
 # OCR 配置
 OCR_CONFIG = '--psm 6 -c tessedit_char_whitelist=0123456789'
 
+# 批量 OCR：未命中缓存的字形拼成一张图，一次 Tesseract 调用按单词框取回结果
+# 稀疏文本模式（--psm 11）不假设排版，各字形之间的空白足够宽，不会被连成一个词
+BATCH_OCR_CONFIG = '--psm 11 -c tessedit_char_whitelist=0123456789'
+BATCH_OCR_MIN_GLYPHS = 2   # 不确定的字形达到此数量才拼图
+BATCH_OCR_COLUMNS = 8      # 拼图每行的字形数
+BATCH_OCR_GAP = 40         # 字形格之间额外的空白（像素），字形本身已有 CROP_MARGIN 白边
+
+# 逐个识别时依次尝试的页面分割模式
+SINGLE_OCR_PSM_MODES = (6, 7, 8, 10)
+
+# 约束数字识别方式：批量 Tesseract / 逐个 Tesseract 兜底 / 都没有识别出
+OCR_METHOD_TESSERACT_BATCH = 'tesseract_batch'
+OCR_METHOD_TESSERACT = 'tesseract'
+OCR_METHOD_EMPTY = 'empty'
+
+DIGIT_OCR = metrics.Counter('showpage_digit_ocr_total', '约束数字识别次数（按识别方式）', ('method',))
+metrics.register(DIGIT_OCR)
+
 
 # ============================================================
 # OCR 预处理函数
 # ============================================================
 
+def _target_mask(crop):
+    """目标颜色（黄绿色数字）掩码"""
+    # 先用 inRange 按各通道 ±阈值 的方框筛出候选像素（uint8 比较，很快），
+    # 再只对候选像素计算与目标颜色的距离平方（避免开方运算），小于阈值的视为目标颜色
+    crop = np.ascontiguousarray(crop)
+    mask = np.zeros(crop.shape[:2], dtype=bool)
+    if mask.size == 0:
+        return mask
+    for color in (TARGET_COLOR1, TARGET_COLOR2):
+        color = color.astype(np.int32)
+        lower = np.clip(color - COLOR_DISTANCE_THRESHOLD, 0, 255).astype(np.uint8)
+        upper = np.clip(color + COLOR_DISTANCE_THRESHOLD, 0, 255).astype(np.uint8)
+        ys, xs = np.nonzero(cv2.inRange(crop, lower, upper))
+        if ys.size == 0:
+            continue
+        diff = crop[ys, xs].astype(np.int32) - color
+        near = np.sum(diff * diff, axis=1) < COLOR_DISTANCE_SQUARED
+        mask[ys[near], xs[near]] = True
+    return mask
+
+
+def _preprocess(crop):
+    # 白底黑字：目标颜色为黑，其他为白
+    result = np.full(crop.shape, 255, dtype=np.uint8)
+    result[_target_mask(crop)] = 0
+    return result
+
+
+@metrics.timed('preprocess')
 def ocr_preprocess(crop):
     """
     OCR 预处理：
@@ -73,33 +125,101 @@ def ocr_preprocess(crop):
     """
     if crop.size == 0:
         return None
+    return _preprocess(crop)
 
-    # 1. 计算每个像素与目标颜色的距离平方（避免开方运算）
-    diff = crop.astype(np.float32) - TARGET_COLOR1.astype(np.float32)
-    distance_squared = np.sum(diff ** 2, axis=2)
-    diff2 = crop.astype(np.float32) - TARGET_COLOR2.astype(np.float32)
-    distance_squared2 = np.sum(diff2 ** 2, axis=2)
 
-    # 2. 距离平方小于阈值的视为目标颜色
-    mask1 = distance_squared < COLOR_DISTANCE_SQUARED
-    mask2 = distance_squared2 < COLOR_DISTANCE_SQUARED
-    mask = mask1 | mask2
+# ============================================================
+# 约束区域定位（先在缩小图上找数字所在区域，只对这些区域做完整处理）
+# ============================================================
 
-    # 3. 创建白底黑字：目标颜色为黑，其他为白
-    result = np.where(mask[:, :, np.newaxis], (0, 0, 0), (255, 255, 255))
-    result = result.astype(np.uint8)
+ROI_SCALE = 4           # 缩小图的采样步长
+ROI_PAD = 16            # 区域外扩（像素），覆盖采样漏掉的边缘
+ROI_MERGE_KERNEL = (5, 5)  # 缩小图上的膨胀核，把同一约束的相邻数字并成一个区域
+ROI_TOP_MARGIN = 100    # GAME_AREA_Y_START 以上保留的高度，跨过该线的轮廓仍能完整检测
+
+
+def _merge_regions(regions):
+    """合并相交的区域 [(x0, y0, x1, y1), ...]，保证同一轮廓不会被两个区域各截一部分"""
+    regions = list(regions)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                a, b = regions[i], regions[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    regions[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    del regions[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return regions
+
+
+def locate_clue_regions(img):
+    """
+    在缩小图（每 ROI_SCALE 个像素取一个）上找目标颜色像素，返回包含约束数字的区域
+    [(x0, y0, x1, y1), ...]（原图坐标）；没有找到时返回 None
+    """
+    small = img[::ROI_SCALE, ::ROI_SCALE]
+    mask = _target_mask(small).astype(np.uint8)
+    mask[:max(0, GAME_AREA_Y_START - ROI_TOP_MARGIN) // ROI_SCALE] = 0
+    if not mask.any():
+        return None
+    mask = cv2.dilate(mask, np.ones(ROI_MERGE_KERNEL, np.uint8))
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
 
-    return result
+    height, width = img.shape[:2]
+    regions = []
+    for i in range(1, count):
+        x, y, w, h = (int(v) * ROI_SCALE for v in stats[i][:4])
+        regions.append((max(0, x - ROI_PAD), max(0, y - ROI_PAD),
+                        min(width, x + w + ROI_PAD), min(height, y + h + ROI_PAD)))
+    return _merge_regions(regions)
+
+
+@metrics.timed('preprocess')
+def preprocess_clue_regions(img, debug_dir=None):
+    """
+    只在约束区域内做颜色预处理和轮廓检测
+
+    返回:
+        (预处理图像, 数字轮廓外接框列表)，区域外为白色；
+        缩小图上没有找到目标颜色时返回 None（调用方退回整图处理）
+    """
+    regions = locate_clue_regions(img)
+    if regions is None:
+        return None
+
+    processed = np.full(img.shape, 255, dtype=np.uint8)
+    boxes = []
+    for x0, y0, x1, y1 in regions:
+        roi = _preprocess(img[y0:y1, x0:x1])
+        processed[y0:y1, x0:x1] = roi
+        boxes.extend((x + x0, y + y0, w, h) for x, y, w, h in _find_digit_boxes(roi))
+    # 与整图 findContours 的顺序一致（自下而上）
+    boxes.sort(key=lambda box: (box[1], box[0]), reverse=True)
+
+    pixels = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in regions)
+    logger.debug(f"约束区域 {len(regions)} 个，处理 {pixels} 像素"
+                 f"（整图 {img.shape[0] * img.shape[1]}），检测到 {len(boxes)} 个轮廓")
+
+    if debug_dir:
+        debug_dir.mkdir(parents=True, exist_ok=True)
+        overlay = img.copy()
+        for x0, y0, x1, y1 in regions:
+            cv2.rectangle(overlay, (x0, y0), (x1 - 1, y1 - 1), (0, 0, 255), 2)
+        cv2.imwrite(str(debug_dir / "00_clue_regions.png"), overlay)
+    return processed, boxes
 
 
 # ============================================================
 # 数字区域检测函数
 # ============================================================
 
-def get_digit_contours_by_black(img, debug_dir=None):
-    """
-    通过黑色描边检测数字区域
-    """
+def _find_digit_boxes(img, debug_dir=None):
+    """预处理图像中黑色（目标颜色）区域的轮廓外接框"""
     # 1. 转灰度并提取极黑区域 (描边阈值)
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
     _, black_mask = cv2.threshold(
@@ -112,21 +232,29 @@ def get_digit_contours_by_black(img, debug_dir=None):
     # 3. 寻找轮廓
     contours, _ = cv2.findContours(
         closed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    logger.debug(f"检测到 {len(contours)} 个轮廓")
 
     if debug_dir:
         debug_dir.mkdir(parents=True, exist_ok=True)
         cv2.imwrite(str(debug_dir / "01_black_mask.png"), black_mask)
         cv2.imwrite(str(debug_dir / "02_closed_mask.png"), closed)
 
+    return [cv2.boundingRect(cnt) for cnt in contours]
+
+
+def _split_digit_boxes(boxes):
+    """
+    过滤轮廓外接框，并按位置分成行约束数字和列约束数字
+
+    返回:
+        (row_digits, col_digits, p1, p2)，见 get_digit_contours_by_black
+    """
     all_digits = []
 
     p1 = [-1, -1]
     p2 = [-1, -1]
 
     # 4. 过滤并分类
-    for cnt in contours:
-        x, y, w, h = cv2.boundingRect(cnt)
+    for x, y, w, h in boxes:
         if y < GAME_AREA_Y_START:
             continue
         if w < 10 or h < 30:
@@ -152,37 +280,136 @@ def get_digit_contours_by_black(img, debug_dir=None):
     return row_digits, col_digits, (p1[0] + 30, p2[1] + 50), (p2[0] + 50, p1[1] + 50)
 
 
+def get_digit_contours_by_black(img, debug_dir=None):
+    """
+    通过黑色描边检测数字区域
+    """
+    boxes = _find_digit_boxes(img, debug_dir)
+    logger.debug(f"检测到 {len(boxes)} 个轮廓")
+    return _split_digit_boxes(boxes)
+
+
 # ============================================================
 # OCR 识别函数
 # ============================================================
 
 # 并行OCR线程数配置
 cpu_cores = os.cpu_count() or 4
-ROW_COL_PARALLEL_WORKERS = min(cpu_cores - 1, 4)
+ROW_COL_PARALLEL_WORKERS = max(1, min(cpu_cores - 1, 4))
 
 
-def _ocr_single_digit(args):
-    """单次OCR任务（用于并行执行）"""
-    x, y, w, h, img = args
+def _glyph_image(img, x, y, w, h):
+    """裁出数字区域，加白色边框并转灰度"""
     crop = img[y:y + h, x:x + w]
     crop = cv2.copyMakeBorder(crop, CROP_MARGIN, CROP_MARGIN, CROP_MARGIN, CROP_MARGIN,
                               cv2.BORDER_CONSTANT, value=(255, 255, 255))
     if len(crop.shape) == 3:
-        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
-    else:
-        gray = crop
-    for psv in [6, 7, 8, 10]:
+        return cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    return crop
+
+
+def _tesseract_glyph(gray):
+    """逐个调用 Tesseract，依次尝试多种页面分割模式"""
+    for psv in SINGLE_OCR_PSM_MODES:
         config = f'--psm {psv} -c tessedit_char_whitelist=0123456789'
         text = pytesseract.image_to_string(gray, config=config)
         if text.strip():
-            return (x, y, text.strip())
-    # cv2.imwrite(f"debug/{x}_{y}.png", crop)
-    return (x, y, "")
+            DIGIT_OCR.inc(OCR_METHOD_TESSERACT)
+            return text.strip()
+    # cv2.imwrite(f"debug/{x}_{y}.png", gray)
+    DIGIT_OCR.inc(OCR_METHOD_EMPTY)
+    return ""
+
+
+def _ocr_single_digit(args):
+    """单次OCR任务（不经过字形缓存）"""
+    x, y, w, h, img = args
+    return (x, y, _tesseract_glyph(_glyph_image(img, x, y, w, h)))
+
+
+def _tile_sheet(glyphs):
+    """
+    把字形按网格拼到一张白底图上
+
+    返回:
+        (拼图, [(x, y, w, h), ...] 每个字形所在的格子)
+    """
+    cell_w = max(g.shape[1] for g in glyphs) + BATCH_OCR_GAP
+    cell_h = max(g.shape[0] for g in glyphs) + BATCH_OCR_GAP
+    columns = min(len(glyphs), BATCH_OCR_COLUMNS)
+    rows = -(-len(glyphs) // columns)
+    sheet = np.full((rows * cell_h, columns * cell_w), 255, dtype=np.uint8)
+    cells = []
+    for i, gray in enumerate(glyphs):
+        x, y = (i % columns) * cell_w, (i // columns) * cell_h
+        h, w = gray.shape[:2]
+        ox, oy = (cell_w - w) // 2, (cell_h - h) // 2
+        sheet[y + oy:y + oy + h, x + ox:x + ox + w] = gray
+        cells.append((x, y, cell_w, cell_h))
+    return sheet, cells
+
+
+def _assign_words(data, cells):
+    """
+    把 image_to_data 的单词框按所在格子归位，返回每个格子的文本（没有单词为 ''）
+    跨越格子边界的单词无法确定归属，丢弃（对应的格子随后逐个重试）
+    """
+    words = [[] for _ in cells]
+    for text, left, top, width, height in zip(data['text'], data['left'], data['top'],
+                                              data['width'], data['height']):
+        text = text.strip()
+        if not text.isdigit():
+            continue
+        for i, (x, y, w, h) in enumerate(cells):
+            if x <= left and left + width <= x + w and y <= top and top + height <= y + h:
+                words[i].append((left, text))
+                break
+    return [''.join(text for _, text in sorted(found)) for found in words]
+
+
+def _batch_tesseract(glyphs):
+    """一次 Tesseract 调用识别多个字形，返回与 glyphs 对应的文本（未识别出为 ''）"""
+    sheet, cells = _tile_sheet(glyphs)
+    data = pytesseract.image_to_data(sheet, config=BATCH_OCR_CONFIG,
+                                     output_type=pytesseract.Output.DICT)
+    texts = _assign_words(data, cells)
+    DIGIT_OCR.inc(OCR_METHOD_TESSERACT_BATCH, amount=sum(1 for t in texts if t))
+    return texts
+
+
+def _recognize_glyphs(glyphs):
+    """
+    识别一批（去重后的）字形：
+    1. 拼图后批量调用一次 Tesseract
+    2. 批量结果为空的字形再逐个调用 Tesseract（多种页面分割模式重试）
+    """
+    texts = [None] * len(glyphs)
+    uncertain = list(range(len(glyphs)))
+
+    if len(uncertain) >= BATCH_OCR_MIN_GLYPHS:
+        for i, text in zip(uncertain, _batch_tesseract([glyphs[i] for i in uncertain])):
+            texts[i] = text or None
+        retry = [i for i in uncertain if texts[i] is None]
+        logger.debug(f"批量 OCR: {len(uncertain)} 个字形，{len(retry)} 个需要逐个重试")
+        uncertain = retry
+
+    if uncertain:
+        # 使用线程池并行执行
+        with ThreadPoolExecutor(max_workers=ROW_COL_PARALLEL_WORKERS) as executor:
+            for i, text in zip(uncertain, executor.map(_tesseract_glyph, [glyphs[i] for i in uncertain])):
+                texts[i] = text
+    return texts
+
+
+def _glyph_cache_version():
+    """识别配置版本：Tesseract 参数与字形裁剪方式，任一变化都使字形缓存中的旧结果失效"""
+    return f'{BATCH_OCR_CONFIG}|{SINGLE_OCR_PSM_MODES}|{CROP_MARGIN}'
 
 
 def _parallel_ocr(digit_regions, img):
     """
-    并行OCR识别多个数字区域
+    OCR识别多个数字区域
+    先按字形查识别缓存（glyph_cache），只有未见过的字形才送去识别（见 _recognize_glyphs）
 
     参数:
         digit_regions: [(x, y, w, h), ...] 数字区域列表
@@ -194,14 +421,25 @@ def _parallel_ocr(digit_regions, img):
     if not digit_regions:
         return []
 
-    # 准备任务数据
-    tasks = [(x, y, w, h, img) for (x, y, w, h) in digit_regions]
+    glyphs = [_glyph_image(img, x, y, w, h) for (x, y, w, h) in digit_regions]
+    version = _glyph_cache_version()
+    keys = [glyph_cache.glyph_key(gray, version) for gray in glyphs]
+    texts = [glyph_cache.lookup(key) for key in keys]
 
-    # 使用线程池并行执行
-    with ThreadPoolExecutor(max_workers=ROW_COL_PARALLEL_WORKERS) as executor:
-        results = list(executor.map(_ocr_single_digit, tasks))
+    # 同一批中相同的字形只识别一次
+    pending = {}
+    for key, gray, text in zip(keys, glyphs, texts):
+        if text is None and key not in pending:
+            pending[key] = gray
 
-    return results
+    if pending:
+        recognized = dict(zip(pending, _recognize_glyphs(list(pending.values()))))
+        glyph_cache.store_many(recognized)
+        texts = [recognized[key] if text is None else text for key, text in zip(keys, texts)]
+
+    logger.debug(f"识别 {len(pending)}/{len(glyphs)} 个字形，其余命中缓存"
+                 f"（累计命中率 {glyph_cache.stats()['hit_rate']:.1%}）")
+    return [(x, y, text) for (x, y, _, _), text in zip(digit_regions, texts)]
 
 
 def _calculate_min_spacing(positions):
@@ -293,6 +531,38 @@ def _pad_to_boundary(constraints, positions, min_spacing, boundary_threshold):
     return constraints
 
 
+def _row_constraint_text(values):
+    """同一行的数字 [[text, x], ...] → 约束文本：按 x 排序，间距小于 MERGE_DISTANCE 的数字合并为多位数"""
+    values.sort(key=lambda x: x[1])
+    merged = []
+    last_x = -1000
+    for t, x in values:
+        if x - last_x < MERGE_DISTANCE:
+            merged[-1] += t
+        else:
+            merged.append(t)
+            last_x = x
+    return " ".join(merged) if merged else "-1"
+
+
+def _col_constraint_text(values):
+    """同一列的数字 [[x, y, text], ...] → 约束文本：按 y 分组，组内按 x 拼成多位数"""
+    values.sort(key=lambda x: x[1])
+    secondary_groups = defaultdict(list)
+    last_position = -1000
+    for x_item, y, text in values:
+        if y - last_position > MERGE_DISTANCE:
+            secondary_groups[y].append([x_item, y, text])
+            last_position = y
+        else:
+            secondary_groups[last_position].append([x_item, y, text])
+    merged = []
+    for y, secondary_values in secondary_groups.items():
+        secondary_values.sort(key=lambda x: x[0])
+        merged.append("".join(item[2] for item in secondary_values))
+    return " ".join(merged) if merged else "-1"
+
+
 def f_row(img, row_digits, col_max_y=None):
     """
     处理行约束数字识别
@@ -318,17 +588,7 @@ def f_row(img, row_digits, col_max_y=None):
     # 提取约束和位置信息用于补全
     constraints_with_pos = []
     for y, values in position_groups.items():
-        values.sort(key=lambda x: x[1])
-        merged = []
-        last_x = -1000
-        for t, x in values:
-            if x - last_x < MERGE_DISTANCE:
-                merged[-1] += t
-            else:
-                merged.append(t)
-                last_x = x
-        constraint_value = " ".join(merged) if merged else "-1"
-        constraints_with_pos.append((y, constraint_value))
+        constraints_with_pos.append((y, _row_constraint_text(values)))
 
     # 计算最小行间距
     y_positions = [pos for pos, _ in constraints_with_pos]
@@ -395,21 +655,7 @@ def f_col(img, col_digits, row_max_x=None):
     # 提取约束和位置信息用于补全
     constraints_with_pos = []
     for x, values in primary_groups.items():
-        values.sort(key=lambda x: x[1])
-        secondary_groups = defaultdict(list)
-        last_position = -1000
-        for x_item, y, text in values:
-            if y - last_position > MERGE_DISTANCE:
-                secondary_groups[y].append([x_item, y, text])
-                last_position = y
-            else:
-                secondary_groups[last_position].append([x_item, y, text])
-        merged = []
-        for y, secondary_values in secondary_groups.items():
-            secondary_values.sort(key=lambda x: x[0])
-            merged.append("".join(item[2] for item in secondary_values))
-        constraint_value = " ".join(merged) if merged else "-1"
-        constraints_with_pos.append((x, constraint_value))
+        constraints_with_pos.append((x, _col_constraint_text(values)))
 
     # 计算最小列间距
     x_positions = [pos for pos, _ in constraints_with_pos]
@@ -455,7 +701,7 @@ def f_col(img, col_digits, row_max_x=None):
 
 def recognize_from_image(img_path, debug=False):
     """
-    从图片识别数织约束
+    从图片文件识别数织约束（recognize_from_source 的路径版包装）
 
     参数:
         img_path: 图片路径或 pathlib.Path 对象
@@ -469,26 +715,59 @@ def recognize_from_image(img_path, debug=False):
         }
     """
     img_path = Path(img_path)
-    img = cv2.imread(str(img_path))
-    if img is None:
-        raise FileNotFoundError(f"无法读取图像: {img_path}")
+    return recognize_from_source(img_path, debug, debug_dir=img_path.parent / "debug")
+
+
+def recognize_from_frame(frame, debug=False):
+    """从 screencap 原始帧识别数织约束（frame: raw_frame.RawFrame）"""
+    return recognize_from_source(frame, debug)
+
 
-    debug_dir = img_path.parent / "debug"
+def recognize_from_source(source, debug=False, debug_dir=None, tracker=None):
+    """
+    从内存中的图像识别数织约束，不经过临时文件
+
+    参数:
+        source: 图片路径、编码字节（bytes / memoryview）、BGR ndarray 或原始帧，
+                见 image_source.load_bgr
+        debug: 是否保存调试图像
+        debug_dir: 调试图像目录，默认为模块目录下的 debug/
+        tracker: 约束区域变化检测状态（ClueTracker，见 get_tracker），为 None 时完整识别
 
-    # img 截取游戏区域 (width=1200, height=1900)
-    img = img[0:GAME_AREA_SIZE[1], 0:GAME_AREA_SIZE[0]]
+    返回:
+        同 recognize_from_image
+    """
+    # img 截取游戏区域 (width=1200, height=2200)，原始帧只转换该区域
+    img = load_bgr(source, *GAME_AREA_SIZE)
 
-    # 把整张图的目标颜色变成黑色，其余变成白色
-    img = ocr_preprocess(img)
+    if debug_dir is None and debug:
+        debug_dir = Path(__file__).parent / "debug"
+    if debug and debug_dir:
+        debug_dir.mkdir(parents=True, exist_ok=True)
+    if tracker is None:
+        return _recognize(img, debug, debug_dir)
+    return tracker.recognize(img, debug, debug_dir)
+
+
+def _recognize(img, debug, debug_dir):
+    """识别流程主体，img 为已裁剪到游戏区域的 BGR 图像"""
+    # 先在缩小图上定位约束区域，只把这些区域的目标颜色变成黑色、其余变成白色并找轮廓；
+    # 缩小图上没有找到目标颜色时退回整图处理
+    located = preprocess_clue_regions(img, debug_dir)
+    if located is not None:
+        img, boxes = located
+        row_digits, col_digits, p1, p2 = _split_digit_boxes(boxes)
+    else:
+        img = ocr_preprocess(img)
+        # 从img中找黑色的数字区域
+        row_digits, col_digits, p1, p2 = get_digit_contours_by_black(
+            img, debug_dir)
 
     if debug and debug_dir:
         cv2.imwrite(str(debug_dir / "03_ocr_preprocess.png"), img)
 
-    # 从img中找黑色的数字区域
     # p1: (row_max_x + 30, col_max_y + 50) - 行约束的x边界, 列约束的y边界
     # p2: (col_max_x + 50, row_max_y + 50) - 列约束的x边界, 行约束的y边界
-    row_digits, col_digits, p1, p2 = get_digit_contours_by_black(
-        img, debug_dir)
 
     # 提取边界坐标用于补全逻辑
     # p1[0] = row_max_x + 30, p1[1] = col_max_y + 50
@@ -498,7 +777,7 @@ def recognize_from_image(img_path, debug=False):
 
     # 并行执行行和列的OCR识别，提升约50%性能
     # 传递坐标信息用于行列补全
-    with ThreadPoolExecutor(max_workers=2) as executor:
+    with metrics.timed('ocr'), ThreadPoolExecutor(max_workers=2) as executor:
         row_future = executor.submit(f_row, img, row_digits, col_max_y)
         col_future = executor.submit(f_col, img, col_digits, row_max_x)
         row, end_pad_rows, min_dy = row_future.result()
@@ -520,6 +799,190 @@ def recognize_from_image(img_path, debug=False):
     }
 
 
+# ============================================================
+# 约束区域变化检测（连续识别同一题目时跳过未变化的约束）
+# ============================================================
+
+CLUE_TRACKER_LIMIT = 16      # 按设备 / 会话保留的变化检测状态数
+CLUE_STRIP_SLACK = 10        # 行约束条带向棋盘方向多留的宽度，覆盖最右侧数字的右边缘
+CLUE_PARTIAL_MAX_RATIO = 0.3  # 变化的条带超过此比例时视为换题，完整识别
+CLUE_TRACKING_ENV = 'SHOWPAGE_CLUE_TRACKING'  # 设为 0 关闭默认的变化检测
+
+CHANGE_UNCHANGED = 'unchanged'
+CHANGE_PARTIAL = 'partial'
+CHANGE_FULL = 'full'
+
+CLUE_CHANGES = metrics.Counter('showpage_clue_change_total', '约束区域变化检测结果', ('result',))
+metrics.register(CLUE_CHANGES)
+
+
+def _clue_strips(result, shape):
+    """
+    按识别结果把约束区域切成条带：每行约束一条横向条带（棋盘左侧），每列约束一条纵向条带（棋盘上方）
+
+    返回:
+        (row_strips, col_strips)，每个条带为 (x0, y0, x1, y1)；游戏区域无效时返回 None
+    """
+    (left, top), (right, bottom) = result['pos']
+    n_rows = len(result['row'].split('\n'))
+    n_cols = len(result['col'].split('\n'))
+    height, width = shape
+    if not (0 < left < min(right, width) and GAME_AREA_Y_START < top < min(bottom, height)):
+        return None
+
+    # 末尾补全的行列可能使游戏区域超出画面，条带按画面裁剪（完全在画面外的条带为空）
+    dy = (bottom - top) / n_rows
+    dx = (right - left) / n_cols
+    row_strips = [(0, min(height, int(round(top + i * dy))), min(width, left + CLUE_STRIP_SLACK),
+                   min(height, int(round(top + (i + 1) * dy)))) for i in range(n_rows)]
+    col_strips = [(min(width, int(round(left + j * dx))), GAME_AREA_Y_START,
+                   min(width, int(round(left + (j + 1) * dx))), top) for j in range(n_cols)]
+    return row_strips, col_strips
+
+
+def _strip_fingerprint(img, strip):
+    """
+    条带内目标颜色掩码的哈希，只反映数字本身，不受背景变化影响
+    使用原分辨率掩码：数字笔画很细，降采样后不同数字可能得到相同的指纹
+    """
+    x0, y0, x1, y1 = strip
+    mask = _target_mask(img[y0:y1, x0:x1])
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.array(mask.shape, dtype=np.uint32).tobytes())
+    digest.update(np.packbits(mask).tobytes())
+    return digest.digest()
+
+
+def _recognize_strip(img, strip, is_row):
+    """
+    只识别一条约束条带，返回该行 / 列的约束文本（没有数字时为 "-1"）
+    检测范围沿条带排列方向外扩半个条带，轮廓按中心点归属，跨条带边界的数字不会被截断
+    """
+    x0, y0, x1, y1 = strip
+    height, width = img.shape[:2]
+    if is_row:
+        half = (y1 - y0) // 2
+        region = (x0, max(0, y0 - half), x1, min(height, y1 + half))
+    else:
+        half = (x1 - x0) // 2
+        region = (max(0, x0 - half), max(0, y0 - ROI_TOP_MARGIN), min(width, x1 + half), y1)
+    rx0, ry0, rx1, ry1 = region
+    roi = _preprocess(img[ry0:ry1, rx0:rx1])
+
+    boxes = []
+    for x, y, w, h in _find_digit_boxes(roi):
+        if y + ry0 < GAME_AREA_Y_START or w < 10 or h < 30:
+            continue
+        cx, cy = x + rx0 + w / 2, y + ry0 + h / 2
+        if x0 <= cx < x1 and y0 <= cy < y1:
+            boxes.append((x, y, w, h))
+
+    digits = [(x + rx0, y + ry0, text) for x, y, text in _parallel_ocr(boxes, roi)]
+    if is_row:
+        return _row_constraint_text([[text, x] for x, _, text in digits])
+    return _col_constraint_text([[x, y, text] for x, y, text in digits])
+
+
+class ClueTracker:
+    """
+    约束区域变化检测：记住上一帧各行 / 各列约束条带的指纹和识别结果
+    竞速时每轮点击只改变棋盘格子，约束区域通常完全不变：
+    - 所有条带指纹都相同：直接返回上次的结果
+    - 只有少数条带变化（如完成的约束变色）：只重新识别这些条带，替换对应的行 / 列约束
+    - 变化的条带过多（换题）、画面尺寸变化或没有上次结果：完整识别
+
+    状态只对应一个画面来源：每个设备 / 会话使用单独的实例
+    （见 get_tracker 与 nonogram_race.RaceSession）
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None  # (画面尺寸, 行条带, 列条带, 行指纹, 列指纹, 识别结果)
+
+    def reset(self):
+        with self._lock:
+            self._state = None
+
+    def recognize(self, img, debug=False, debug_dir=None):
+        """识别 img（已裁剪到游戏区域的 BGR 图像），调试模式总是完整识别"""
+        with self._lock:
+            state = self._state
+        if state is not None and not debug and state[0] == img.shape[:2]:
+            result = self._reuse(img, state)
+            if result is not None:
+                return result
+
+        result = _recognize(img, debug, debug_dir)
+        CLUE_CHANGES.inc(CHANGE_FULL)
+        strips = _clue_strips(result, img.shape[:2])
+        if strips is None:
+            state = None
+        else:
+            row_strips, col_strips = strips
+            state = (img.shape[:2], row_strips, col_strips,
+                     [_strip_fingerprint(img, strip) for strip in row_strips],
+                     [_strip_fingerprint(img, strip) for strip in col_strips], result)
+        with self._lock:
+            self._state = state
+        return result
+
+    def _reuse(self, img, state):
+        """按条带指纹复用上次结果；变化过多时返回 None"""
+        shape, row_strips, col_strips, row_prints, col_prints, result = state
+        with metrics.timed('fingerprint'):
+            new_row_prints = [_strip_fingerprint(img, strip) for strip in row_strips]
+            new_col_prints = [_strip_fingerprint(img, strip) for strip in col_strips]
+        changed_rows = [i for i, (a, b) in enumerate(zip(row_prints, new_row_prints)) if a != b]
+        changed_cols = [j for j, (a, b) in enumerate(zip(col_prints, new_col_prints)) if a != b]
+
+        if not changed_rows and not changed_cols:
+            CLUE_CHANGES.inc(CHANGE_UNCHANGED)
+            logger.debug("约束区域未变化，复用上次识别结果")
+            return dict(result)
+        if len(changed_rows) + len(changed_cols) > CLUE_PARTIAL_MAX_RATIO * (len(row_strips) + len(col_strips)):
+            logger.debug(f"约束区域变化 {len(changed_rows)} 行 {len(changed_cols)} 列，完整识别")
+            return None
+
+        with metrics.timed('ocr'):
+            rows = result['row'].split('\n')
+            cols = result['col'].split('\n')
+            for i in changed_rows:
+                rows[i] = _recognize_strip(img, row_strips[i], True)
+            for j in changed_cols:
+                cols[j] = _recognize_strip(img, col_strips[j], False)
+        result = {**result, 'row': '\n'.join(rows), 'col': '\n'.join(cols)}
+
+        CLUE_CHANGES.inc(CHANGE_PARTIAL)
+        logger.debug(f"约束区域部分变化，只重新识别第 {[i + 1 for i in changed_rows]} 行、"
+                     f"第 {[j + 1 for j in changed_cols]} 列")
+        with self._lock:
+            self._state = (shape, row_strips, col_strips, new_row_prints, new_col_prints, result)
+        return dict(result)
+
+
+_trackers = OrderedDict()  # 设备 → ClueTracker，按最近使用排序
+_trackers_lock = threading.Lock()
+
+
+def get_tracker(device=None):
+    """
+    按设备取变化检测状态（网页 runSpeedRacingLoop 经 /analyze-nonogram 连续识别时使用），
+    最多保留 CLUE_TRACKER_LIMIT 个设备，超出时丢弃最久未用的；
+    环境变量 SHOWPAGE_CLUE_TRACKING=0 时返回 None
+    """
+    if os.environ.get(CLUE_TRACKING_ENV, '1') == '0':
+        return None
+    key = device or ''
+    with _trackers_lock:
+        tracker = _trackers.get(key)
+        if tracker is None:
+            tracker = _trackers[key] = ClueTracker()
+            while len(_trackers) > CLUE_TRACKER_LIMIT:
+                _trackers.popitem(last=False)
+        _trackers.move_to_end(key)
+        return tracker
+
+
 def main():
     setup_logger(debug=True)
     parser = argparse.ArgumentParser(description='数织约束识别器')
@@ -2,49 +2,207 @@
 """
 数织 (Nonogram) 求解器 —— 混合算法（候选法 + 逐线 DP + 约束传播 worklist）
 
-小规模（n ≤ 15）：预计算所有约束的候选位掩码，查表 + 过滤，O(|cands|·n)
-大规模（n > 15）：逐线 DP，O(k·n²)，不受候选数膨胀影响
+小规模（n ≤ 15）：按约束惰性生成候选位掩码（LRU 缓存，可选磁盘表），查表 + 过滤，O(|cands|·n)
+大规模（n > 15）：逐线分析（位集实现的左右边界 DP），每块只需常数次整数位运算
 
 算法：
-  1. 小规模（n≤15）：预计算候选缓存 + while-changed 全量扫描，位运算取交集/并集
-  2. 大规模（n>15）：逐线 DP + worklist 增量传播，不受候选数膨胀影响
+  1. 小规模（n≤15）：候选缓存 + while-changed 全量扫描，位运算取交集/并集
+  2. 大规模（n>15）：位集逐线分析 + worklist 增量传播，不受候选数膨胀影响；
+     n≥20 时改为 NumPy 批量分析：所有脏行一批、所有脏列一批交替，每步对整批线一次计算
+  3. 传播停滞时进入搜索：位掩码状态上试探（probing）排除矛盾取值，再在最受约束的格子上分支，
+     每次猜测后继续传播，回溯按 trail 撤销；按 Luby 序列重启，试探次数有上限（超出时抛出 SearchLimitExceeded）
+  4. 增量求解（Solver）：记录每个结论由哪条线推出，约束修正时只撤销受影响的结论并局部重新传播
 """
 
-from collections import deque
+import json
+import logging
+import mmap
+import os
+import random
+import struct
+import threading
+from array import array
+from collections import OrderedDict, deque
 from itertools import combinations
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
-# ─── 全局候选缓存（小规模预计算）──────────────────────────────────
+import numpy as np
 
-_CANDIDATE_CACHE: Dict[int, Dict[Tuple[int, ...], List[int]]] = {}
-"""_CANDIDATE_CACHE[n][tuple(constraint)] = [bitmask, ...]"""
+import batch_solver
+import metrics
 
+logger = logging.getLogger(__name__)
 
-def _precompute_candidates(n: int) -> None:
-    """预计算 n 维所有可能约束的候选位掩码集，存入全局缓存。"""
-    if n in _CANDIDATE_CACHE:
-        return
+SOLVER_VERSION = 3  # 求解结果的语义变化时递增（solution_cache 的键包含此值，旧结果随之失效）
+
+# ─── 候选缓存（小规模）────────────────────────────────────────────
+#
+# 按约束惰性生成候选位掩码，array('I') 紧凑存储，按候选总数做 LRU 淘汰。
+# 可选的磁盘候选表：某个 n 下所有约束的候选一次写入文件，冷启动的进程内存映射后直接查表，
+# 不必重新枚举；设置环境变量 NONOGRAM_CANDIDATE_DIR 指向表目录即可在首次用到该尺寸时自动加载。
+
+SMALL_MAX_SIZE = 15             # n ≤ 此值走候选法传播
+CANDIDATE_CACHE_LIMIT = 1 << 21  # 内存中最多缓存的候选总数（uint32，约 8MB）
+TABLE_MAX_SIZE = 20             # 磁盘表最大尺寸（表大小为 2^n 个 uint32）
+CANDIDATE_DIR_ENV = 'NONOGRAM_CANDIDATE_DIR'
+
+_TABLE_MAGIC = b'NONOCAND'
+_TABLE_HEADER = struct.Struct('<8sII')  # magic, n, 索引长度
 
-    # 枚举所有 2^n 种填充模式，收集所有不同的约束类型
-    constraints: set = set()
-    for mask in range(1 << n):
-        segs = []
-        cnt = 0
-        for i in range(n):
-            if (mask >> i) & 1:
-                cnt += 1
-            elif cnt > 0:
-                segs.append(cnt)
-                cnt = 0
-        if cnt > 0:
-            segs.append(cnt)
-        constraints.add(tuple(segs) if segs else (0,))
 
-    cache: Dict[Tuple[int, ...], List[int]] = {}
-    for c in constraints:
-        cache[c] = _generate_candidates_for_constraint(list(c), n)
+def _clue_key(constraint: List[int]) -> Tuple[int, ...]:
+    """约束的缓存键：空约束统一为 (0,)"""
+    return tuple(constraint) if constraint else (0,)
 
-    _CANDIDATE_CACHE[n] = cache
+
+def candidate_table_path(directory: str, n: int) -> str:
+    return os.path.join(directory, f'candidates_{n}.bin')
+
+
+class CandidateTable:
+    """
+    磁盘候选表（内存映射，只读）
+
+    文件格式：头部（magic, n, 索引长度） + JSON 索引 {"3 1": [偏移, 个数]}
+    + 对齐到 4 字节后的候选位掩码（本机字节序 uint32）
+    """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.n, index_len = _TABLE_HEADER.unpack_from(self._mmap, 0)
+        if magic != _TABLE_MAGIC:
+            raise ValueError(f"不是候选表文件: {path}")
+        index_end = _TABLE_HEADER.size + index_len
+        self._index = json.loads(self._mmap[_TABLE_HEADER.size:index_end])
+        data_offset = (index_end + 3) // 4 * 4
+        self._data = memoryview(self._mmap)[data_offset:].cast('I')
+
+    def get(self, key: Tuple[int, ...]) -> Sequence[int]:
+        """候选位掩码视图（不复制）；表中没有的约束在该尺寸下无解，返回空"""
+        entry = self._index.get(' '.join(map(str, key)))
+        if entry is None:
+            return array('I')
+        offset, count = entry
+        return self._data[offset:offset + count]
+
+
+def build_candidate_table(n: int, path: str) -> int:
+    """
+    枚举 n 维所有约束的候选，写入磁盘候选表，返回约束数
+
+    Raises:
+        ValueError: n 超出 TABLE_MAX_SIZE
+    """
+    if not 1 <= n <= TABLE_MAX_SIZE:
+        raise ValueError(f"候选表尺寸应在 1..{TABLE_MAX_SIZE} 之间: {n}")
+
+    index = {}
+    data = array('I')
+    for key in _all_clues(n):
+        cands = _generate_candidates_for_constraint(list(key), n)
+        index[' '.join(map(str, key))] = [len(data), len(cands)]
+        data.extend(cands)
+
+    index_bytes = json.dumps(index, separators=(',', ':')).encode()
+    header = _TABLE_HEADER.pack(_TABLE_MAGIC, n, len(index_bytes))
+    padding = b'\0' * (-(len(header) + len(index_bytes)) % 4)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header + index_bytes + padding)
+        data.tofile(f)
+    os.replace(tmp_path, path)
+    return len(index)
+
+
+def _all_clues(n: int):
+    """n 维所有可能的约束（含全空约束 (0,)）"""
+    yield (0,)
+    stack = [((), 0)]  # (已放置的块, 下一块最早的起点)
+    while stack:
+        blocks, start = stack.pop()
+        for block in range(1, n - start + 1):
+            key = blocks + (block,)
+            yield key
+            stack.append((key, start + block + 1))
+
+
+class _CandidateCache:
+    """按 (n, 约束) 惰性生成并缓存候选位掩码；已加载磁盘表的尺寸直接查表"""
+
+    def __init__(self, limit: int = CANDIDATE_CACHE_LIMIT):
+        self.limit = limit
+        self._entries: 'OrderedDict[Tuple[int, Tuple[int, ...]], array]' = OrderedDict()
+        self._size = 0
+        self._tables: Dict[int, Optional[CandidateTable]] = {}
+        self._lock = threading.Lock()
+
+    def preload(self, n: int) -> None:
+        """提前映射该尺寸的磁盘候选表（设置了 NONOGRAM_CANDIDATE_DIR 且文件存在时）"""
+        with self._lock:
+            self._table(n)
+
+    def load_table(self, path: str) -> CandidateTable:
+        table = CandidateTable(path)
+        with self._lock:
+            self._tables[table.n] = table
+        return table
+
+    def _table(self, n: int) -> Optional[CandidateTable]:
+        if n not in self._tables:
+            directory = os.environ.get(CANDIDATE_DIR_ENV)
+            path = candidate_table_path(directory, n) if directory else None
+            table = None
+            if path and os.path.exists(path):
+                try:
+                    table = CandidateTable(path)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"加载候选表失败 {path}: {e}")
+            self._tables[n] = table
+        return self._tables[n]
+
+    def get(self, constraint: List[int], n: int) -> Sequence[int]:
+        key = _clue_key(constraint)
+        with self._lock:
+            table = self._table(n)
+            if table is not None:
+                return table.get(key)
+            cands = self._entries.get((n, key))
+            if cands is not None:
+                self._entries.move_to_end((n, key))
+                return cands
+
+        cands = array('I', _generate_candidates_for_constraint(list(key), n))
+        if len(cands) > self.limit:
+            return cands
+        with self._lock:
+            if (n, key) not in self._entries:
+                self._entries[(n, key)] = cands
+                self._size += len(cands)
+            while self._size > self.limit:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+        return cands
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self._tables.clear()
+
+
+_CANDIDATES = _CandidateCache()
+
+
+def _get_candidates(constraint: List[int], n: int) -> Sequence[int]:
+    """约束的所有候选位掩码（只读，不要修改返回值）"""
+    return _CANDIDATES.get(constraint, n)
+
+
+def load_candidate_table(path: str) -> None:
+    """加载磁盘候选表，该尺寸之后直接查表"""
+    table = _CANDIDATES.load_table(path)
+    logger.info(f"已加载 {table.n}x{table.n} 候选表: {path}")
 
 
 def _generate_candidates_for_constraint(
@@ -79,9 +237,70 @@ def _generate_candidates_for_constraint(
     return cands
 
 
-# 用户常用规模，模块加载时预计算
-for _n in [10, 15]:
-    _precompute_candidates(_n)
+# ─── 逐线分析结果缓存 ──────────────────────────────────────────────
+#
+# 同一题目中的多条线、以及不同题目之间，经常出现约束相同且已知格子相同的线。
+# 结论只取决于 (约束, 已知填充掩码, 已知留空掩码, n)，所以在所有传播路径（候选法、逐线位集、
+# 搜索、增量求解）之间共享一份有界 LRU，值为 (强制填充掩码, 强制留空掩码)，矛盾为 None。
+
+LINE_MEMO_CAPACITY = 1 << 16
+
+_MISSING = object()
+
+
+class _LineMemo:
+    """逐线分析结果的有界 LRU，带命中统计（用于调整容量）"""
+
+    def __init__(self, capacity: int = LINE_MEMO_CAPACITY):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[tuple, Optional[Tuple[int, int]]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, key: tuple, compute) -> Optional[Tuple[int, int]]:
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is not _MISSING:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+        return value
+
+    def info(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'size': len(self._entries),
+                'capacity': self.capacity,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+_LINE_MEMO = _LineMemo()
+
+
+def line_memo_info() -> dict:
+    """逐线分析缓存的命中统计：hits / misses / hit_rate / size / capacity"""
+    return _LINE_MEMO.info()
+
+
+def set_line_memo_capacity(capacity: int) -> None:
+    """调整逐线分析缓存容量（超出的旧条目在下次写入时淘汰）"""
+    _LINE_MEMO.capacity = capacity
 
 
 # ─── 逐线分析 ──────────────────────────────────────────────────────
@@ -91,161 +310,163 @@ def _analyze_line(
     cells: List[int], constraint: List[int]
 ) -> Tuple[Optional[List[int]], Optional[List[int]], bool]:
     """
-    逐线 DP：left/right DP 表 + 前缀和 + 差分数组。
+    逐线分析（位集实现，见 _analyze_line_bits），返回 (强制填充下标, 强制留空下标, 是否无矛盾)。
 
-    仅用于大规模（n > 15）传播，小规模走 _propagate_small（缓存候选法）。
+    结果经由共享的逐线分析缓存（_LINE_MEMO）。
+    用于大规模（n > 15）传播、搜索和增量求解，小规模走 _propagate_small（缓存候选法）。
     """
     # 未知约束 → 无法推导
     if len(constraint) == 1 and constraint[0] == -1:
         return [], [], True
-    return _analyze_line_dp(cells, constraint)
+    n = len(cells)
+    ones = zeros = 0
+    for j, v in enumerate(cells):
+        if v == 1:
+            ones |= 1 << j
+        elif v == 0:
+            zeros |= 1 << j
+    result = _LINE_MEMO.lookup(
+        (_clue_key(constraint), ones, zeros, n),
+        lambda: _analyze_line_bits(ones, zeros, constraint, n),
+    )
+    if result is None:
+        return None, None, False
+    forced_ones, forced_zeros = result
+    return _bit_indices(forced_ones), _bit_indices(forced_zeros), True
 
 
-def _analyze_line_dp(
-    cells: List[int], constraint: List[int]
-) -> Tuple[Optional[List[int]], Optional[List[int]], bool]:
+def _bit_indices(mask: int) -> List[int]:
+    indices = []
+    while mask:
+        low = mask & -mask
+        indices.append(low.bit_length() - 1)
+        mask ^= low
+    return indices
+
+
+def _reverse_bits(x: int, width: int) -> int:
+    return int(format(x, f'0{width}b')[::-1], 2)
+
+
+def _block_starts(not_zero: int, block: int, n: int) -> int:
+    """长度为 block 的块可以放置的起点：起点 s 满足 s..s+block-1 都不是已知空格"""
+    starts = not_zero
+    span = 1
+    while span * 2 <= block:
+        starts &= starts >> span
+        span *= 2
+    if span < block:
+        starts &= starts >> (block - span)
+    return starts & ((1 << (n - block + 1)) - 1)
+
+
+def _smear(starts: int, block: int) -> int:
+    """把每个起点扩展为覆盖 [s, s+block) 的位"""
+    cover = starts
+    span = 1
+    while span * 2 <= block:
+        cover |= cover << span
+        span *= 2
+    if span < block:
+        cover |= cover << (block - span)
+    return cover
+
+
+def _line_boundaries(
+    not_one: int, starts: Dict[int, int], constraint: List[int]
+) -> List[int]:
     """
-    逐线 DP：left/right DP 表 + 前缀和 + 差分数组。
+    left[i] 的第 j 位（j = 0..n）：前 i 个块可以放进前 j 个格子，且其后到第 j 格之间可以为空。
 
-    不受候选数膨胀影响，适合大规模（n > 15）。
+    left 表的每一行压缩成一个整数。
+    边界从 j-1 右移到 j 要求第 j-1 格可以为空，用加法进位一次把种子位延伸过连续的可空格。
     """
-    n = len(cells)
+    extendable = not_one << 1
+    y = extendable | 1
+    cur = (((y + 1) ^ y) & y) | 1
+    left = [cur]
+    for i, block in enumerate(constraint):
+        # 块起点 s：s == 0 只允许第一个块；否则 s-1 格可以为空且前 i 块能放进前 s-1 格
+        cond = (cur << 1) & extendable
+        if i == 0:
+            cond |= 1
+        seeds = (starts[block] & cond) << block
+        y = extendable | seeds
+        cur = (((y + seeds) ^ y) & y) | seeds
+        left.append(cur)
+    return left
+
+
+def _analyze_line_bits(
+    ones: int, zeros: int, constraint: List[int], n: int
+) -> Optional[Tuple[int, int]]:
+    """
+    位集逐线分析：已知填充 / 已知留空用整数位掩码表示（第 j 位对应第 j 格）。
+
+    用位运算算出每个块的左右可行边界集合（left / right，right 由反转后的线求 left 得到），
+    再求每个格子能否为空、能否被某个块覆盖，结论与枚举全部合法放置后取交集相同。
+
+    Returns:
+        (强制填充掩码, 强制留空掩码)；线内矛盾时返回 None
+    """
+    cell_mask = (1 << n) - 1
+    unknown = cell_mask & ~(ones | zeros)
 
     # 全空约束
     if not constraint or constraint == [0]:
-        forced_zeros = []
-        for j in range(n):
-            if cells[j] == 1:
-                return None, None, False
-            if cells[j] == -1:
-                forced_zeros.append(j)
-        return [], forced_zeros, True
+        if ones:
+            return None
+        return 0, unknown
 
+    # 约束总长超出线长（如 OCR 误读出的超长块）：线内矛盾
     k = len(constraint)
+    if sum(constraint) + k - 1 > n:
+        return None
+    not_one = cell_mask & ~ones
+    not_zero = cell_mask & ~zeros
+    starts = {block: _block_starts(not_zero, block, n) for block in set(constraint)}
+    left = _line_boundaries(not_one, starts, constraint)
+    if not (left[k] >> n) & 1:
+        return None
 
-    # 前缀和：O(1) 区间查询
-    zero_pref = [0] * (n + 1)
-    one_pref = [0] * (n + 1)
-    for i in range(n):
-        zero_pref[i + 1] = zero_pref[i] + (1 if cells[i] == 0 else 0)
-        one_pref[i + 1] = one_pref[i] + (1 if cells[i] == 1 else 0)
-
-    def has_zero(lo: int, hi: int) -> bool:
-        return zero_pref[hi] - zero_pref[lo] > 0
-
-    def has_one(lo: int, hi: int) -> bool:
-        return one_pref[hi] - one_pref[lo] > 0
-
-    # left[i][j]: 块 0..i-1 放入 cells[0..j-1]
-    left = [[False] * (n + 1) for _ in range(k + 1)]
-    left[0][0] = True
-    for j in range(1, n + 1):
-        left[0][j] = left[0][j - 1] and cells[j - 1] != 1
-
-    for i in range(1, k + 1):
-        blk = constraint[i - 1]
-        for j in range(1, n + 1):
-            if cells[j - 1] != 1 and left[i][j - 1]:
-                left[i][j] = True
-                continue
-            if j < blk:
-                continue
-            start = j - blk
-            if has_zero(start, j):
-                continue
-            if start > 0 and cells[start - 1] == 1:
-                continue
-            if start == 0:
-                left[i][j] = (i == 1)
-            else:
-                left[i][j] = left[i - 1][start - 1]
-
-    if not left[k][n]:
-        return None, None, False
-
-    # right[i][j]: 块 i..k-1 放入 cells[j..n-1]
-    right = [[False] * (n + 1) for _ in range(k + 1)]
-    right[k][n] = True
-    for j in range(n - 1, -1, -1):
-        right[k][j] = (cells[j] != 1) and right[k][j + 1]
-
-    for i in range(k - 1, -1, -1):
-        blk = constraint[i]
-        for j in range(n - 1, -1, -1):
-            if cells[j] != 1 and right[i][j + 1]:
-                right[i][j] = True
-                continue
-            end = j + blk
-            if end > n:
-                continue
-            if has_zero(j, end):
-                continue
-            if end < n and cells[end] == 1:
-                continue
-            next_j = end + 1 if end < n else n
-            if right[i + 1][next_j]:
-                right[i][j] = True
-
-    # can_be_0
-    can_be_0 = [False] * n
-    for j in range(n):
-        if cells[j] != -1:
-            continue
-        for i in range(k + 1):
-            if left[i][j] and right[i][j + 1]:
-                can_be_0[j] = True
-                break
-
-    # can_be_1：差分数组批量标记
-    diff = [0] * (n + 1)
-    for i in range(k):
-        blk = constraint[i]
-        for start in range(n - blk + 1):
-            end = start + blk
-            if has_zero(start, end):
-                continue
-            if start > 0 and cells[start - 1] == 1:
-                continue
-            if end < n and cells[end] == 1:
-                continue
-            if start == 0:
-                left_ok = (i == 0)
-            else:
-                left_ok = left[i][start - 1]
-            if not left_ok:
-                continue
-            next_j = end + 1 if end < n else n
-            if not right[i + 1][next_j]:
-                continue
-            diff[start] += 1
-            diff[end] -= 1
-
-    can_be_1 = [False] * n
-    cur = 0
-    for j in range(n):
-        cur += diff[j]
-        if cur > 0:
-            can_be_1[j] = True
-
-    # 收集结论
-    forced_ones = []
-    forced_zeros = []
-    for j in range(n):
-        if cells[j] != -1:
-            continue
-        if can_be_1[j] and not can_be_0[j]:
-            forced_ones.append(j)
-        elif can_be_0[j] and not can_be_1[j]:
-            forced_zeros.append(j)
-        elif not can_be_1[j] and not can_be_0[j]:
-            return None, None, False
-
-    return forced_ones, forced_zeros, True
+    # right[i] 的第 j 位：后 k-i 个块可以放进第 j 格及之后
+    not_zero_rev = _reverse_bits(not_zero, n)
+    starts_rev = {block: _block_starts(not_zero_rev, block, n) for block in starts}
+    left_rev = _line_boundaries(_reverse_bits(not_one, n), starts_rev, constraint[::-1])
+    right = [_reverse_bits(left_rev[k - i], n + 1) for i in range(k + 1)]
+
+    # 可以为空：存在 i 使前 i 个块在其左侧、其余块在其右侧
+    can_be_0 = 0
+    for i in range(k + 1):
+        can_be_0 |= left[i] & (right[i] >> 1)
+    can_be_0 &= cell_mask
+
+    # 可以填充：被某个块的某个可行位置覆盖
+    extendable = not_one << 1
+    can_be_1 = 0
+    for i, block in enumerate(constraint):
+        cond_left = (left[i] << 1) & extendable
+        if i == 0:
+            cond_left |= 1
+        # 块后一格可以为空且其余块能放在再往后；块贴右边界时看 right[i+1] 的第 n 位
+        nxt = right[i + 1]
+        cond_right = (nxt >> (block + 1)) & (not_one >> block)
+        if (nxt >> n) & 1:
+            cond_right |= 1 << (n - block)
+        can_be_1 |= _smear(starts[block] & cond_left & cond_right, block)
+
+    if unknown & ~(can_be_0 | can_be_1):
+        return None
+    return can_be_1 & ~can_be_0 & unknown, can_be_0 & ~can_be_1 & unknown
 
 
 # ─── 约束传播 ────────────────────────────────────────────────────
 
+# 从此尺寸起整批向量化分析比逐线位集分析快（每次 NumPy 调用有固定开销，线太短时不划算）
+VECTORIZE_MIN_SIZE = 20
+
 
+@metrics.timed('propagate')
 def _propagate(
     grid: List[List[int]],
     row_constraints: List[List[int]],
@@ -253,13 +474,16 @@ def _propagate(
 ) -> bool:
     """
     约束传播，根据 n 自动选择策略：
-      - n ≤ 15 且缓存已有 → 缓存候选集 + while changed 全量扫描
+      - n ≤ SMALL_MAX_SIZE → 缓存候选集 + while changed 全量扫描
+      - n ≥ VECTORIZE_MIN_SIZE → NumPy 批量逐线分析，整批脏行 / 脏列交替
       - 否则 → 逐线 DP + worklist 增量传播
     """
     n = len(grid)
 
-    if n in _CANDIDATE_CACHE:
+    if n <= SMALL_MAX_SIZE:
         return _propagate_small(grid, row_constraints, col_constraints)
+    elif n >= VECTORIZE_MIN_SIZE:
+        return _propagate_vectorized(grid, row_constraints, col_constraints)
     else:
         return _propagate_large(grid, row_constraints, col_constraints)
 
@@ -269,97 +493,86 @@ def _propagate_small(
     row_constraints: List[List[int]],
     col_constraints: List[List[int]],
 ) -> bool:
-    """小规模：缓存候选集 + while changed 全量扫描。"""
-    n = len(grid)
+    """
+    小规模：缓存候选集 + while changed 全量扫描。
 
-    # 从缓存加载候选集（无需初始过滤，候选是约束的全部合法填充）
-    row_cands = [None] * n
-    col_cands = [None] * n
-    for r in range(n):
-        c = tuple(row_constraints[r]) if row_constraints[r] else (0,)
-        if c == (-1,):
-            row_cands[r] = None
-        else:
-            row_cands[r] = set(_CANDIDATE_CACHE[n][c])
-    for c in range(n):
-        ck = tuple(col_constraints[c]) if col_constraints[c] else (0,)
-        if ck == (-1,):
-            col_cands[c] = None
-        else:
-            col_cands[c] = set(_CANDIDATE_CACHE[n][ck])
-
-    # 高效过滤：只检查一个位置
-    def _filter_row(r: int, c: int, is_filled: bool):
-        cands = row_cands[r]
-        if cands is None:
-            return
-        if is_filled:
-            row_cands[r] = {m for m in cands if (m >> c) & 1}
-        else:
-            row_cands[r] = {m for m in cands if not ((m >> c) & 1)}
-
-    def _filter_col(c: int, r: int, is_filled: bool):
-        cands = col_cands[c]
-        if cands is None:
-            return
-        if is_filled:
-            col_cands[c] = {m for m in cands if (m >> r) & 1}
-        else:
-            col_cands[c] = {m for m in cands if not ((m >> r) & 1)}
+    候选集为 uint32 数组。格子确定时只记入所在线的已知掩码，轮到该线时用一次布尔掩码
+    过滤掉与所有已知格子矛盾的候选，再用 bitwise_and / bitwise_or 归约得到强制格子，
+    一次写回整条线的结论。
+    """
+    n = len(grid)
+    full = (1 << n) - 1
+
+    # 每条线: [候选数组, 约束键, 已知填充掩码, 已知留空掩码, 候选已按哪些格子过滤,
+    #          上次扫描后是否有新的已知格子]
+    # 未知约束（-1）的线无法推导，不参与扫描，但仍会被交叉线填入格子
+    def _line(constraint, cells) -> Optional[list]:
+        key = _clue_key(constraint)
+        if key == (-1,):
+            return None
+        ones = zeros = 0
+        for j, v in enumerate(cells):
+            if v == 1:
+                ones |= 1 << j
+            elif v == 0:
+                zeros |= 1 << j
+        cands = np.frombuffer(_get_candidates(constraint, n), dtype=np.uint32)
+        return [cands, key, ones, zeros, 0, True]
+
+    rows = [_line(row_constraints[r], grid[r]) for r in range(n)]
+    cols = [_line(col_constraints[c], [grid[r][c] for r in range(n)]) for c in range(n)]
+
+    def _forced(line) -> Optional[Tuple[int, int]]:
+        """本线的 (强制填充掩码, 强制留空掩码)，经由逐线分析缓存；矛盾返回 None"""
+        cands, key, ones, zeros, applied, _ = line
+        known = ones | zeros
+
+        def reduce():
+            filtered = cands
+            if known != applied:
+                filtered = cands[(cands & known) == ones]
+                line[0], line[4] = filtered, known
+            if not filtered.size:
+                return None
+            all_ones = int(np.bitwise_and.reduce(filtered))
+            any_one = int(np.bitwise_or.reduce(filtered))
+            unknown = full & ~known
+            return all_ones & unknown, ~any_one & unknown
+
+        return _LINE_MEMO.lookup((key, ones, zeros, n), reduce)
 
     changed = True
     while changed:
         changed = False
-
-        for r in range(n):
-            cands = row_cands[r]
-            if cands is None:
-                continue
-            if not cands:
-                return False
-
-            all_ones = (1 << n) - 1
-            any_one = 0
-            for mask in cands:
-                all_ones &= mask
-                any_one |= mask
-
-            for c in range(n):
-                if grid[r][c] != -1:
+        for lines, crossing, transpose in ((rows, cols, False), (cols, rows, True)):
+            for i, line in enumerate(lines):
+                if line is None or not line[5]:
                     continue
-                if (all_ones >> c) & 1:
-                    grid[r][c] = 1
-                    changed = True
-                    _filter_col(c, r, True)
-                elif not ((any_one >> c) & 1):
-                    grid[r][c] = 0
-                    changed = True
-                    _filter_col(c, r, False)
-
-        for c in range(n):
-            cands = col_cands[c]
-            if cands is None:
-                continue
-            if not cands:
-                return False
-
-            all_ones = (1 << n) - 1
-            any_one = 0
-            for mask in cands:
-                all_ones &= mask
-                any_one |= mask
-
-            for r in range(n):
-                if grid[r][c] != -1:
+                line[5] = False
+                forced = _forced(line)
+                if forced is None:
+                    return False
+                forced_ones, forced_zeros = forced
+                if not (forced_ones | forced_zeros):
                     continue
-                if (all_ones >> r) & 1:
-                    grid[r][c] = 1
-                    changed = True
-                    _filter_row(r, c, True)
-                elif not ((any_one >> r) & 1):
-                    grid[r][c] = 0
-                    changed = True
-                    _filter_row(r, c, False)
+                # 候选都满足本线自己推出的格子，记入已知掩码后无需重新过滤
+                if line[4] == line[2] | line[3]:
+                    line[4] |= forced_ones | forced_zeros
+                line[2] |= forced_ones
+                line[3] |= forced_zeros
+                changed = True
+
+                bit = 1 << i
+                for value, mask in ((1, forced_ones), (0, forced_zeros)):
+                    for j in _bit_indices(mask):
+                        if transpose:
+                            grid[j][i] = value
+                        else:
+                            grid[i][j] = value
+                        other = crossing[j]
+                        if other is not None:
+                            other[2 if value else 3] |= bit
+                            other[5] = True
 
     return True
 
@@ -437,6 +650,490 @@ def _propagate_large(
     return True
 
 
+# ─── 向量化批量传播 ──────────────────────────────────────────────
+#
+# 网格保存为 int8 数组；每轮把所有脏行（再所有脏列）堆成一个 (B, n) 批次，
+# 左右边界 DP 的每一步都对整批线同时执行，一次 NumPy 调用覆盖整批而不是逐线 Python 循环。
+
+
+def _pad_constraints(constraints: List[List[int]]) -> Tuple[np.ndarray, np.ndarray]:
+    """约束填充为 (L, K) 的块长数组和 (L,) 的块数；[] / [0] 视为 0 块"""
+    lines = [[] if not c or list(c) == [0] else list(c) for c in constraints]
+    width = max((len(c) for c in lines), default=0)
+    blocks = np.zeros((len(lines), max(width, 1)), dtype=np.int64)
+    for i, c in enumerate(lines):
+        blocks[i, :len(c)] = c
+    counts = np.array([len(c) for c in lines], dtype=np.int64)
+    return blocks, counts
+
+
+def _reverse_constraints(blocks: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """每条线的实际块逆序（填充位仍在末尾）"""
+    order = counts[:, None] - 1 - np.arange(blocks.shape[1])
+    reversed_blocks = np.take_along_axis(blocks, np.maximum(order, 0), axis=1)
+    return np.where(order >= 0, reversed_blocks, 0)
+
+
+def _last_index_plus1(mask: np.ndarray) -> np.ndarray:
+    """(B, n) → (B, n+1)：第 j 列为 j 之前最后一个为真的位置 + 1，没有则为 0"""
+    batch, n = mask.shape
+    last = np.zeros((batch, n + 1), dtype=np.int32)
+    np.maximum.accumulate(np.where(mask, np.arange(1, n + 1, dtype=np.int32), 0), axis=1,
+                          out=last[:, 1:])
+    return last
+
+
+def _left_tables(cells: np.ndarray, blocks: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    批量 left 表，与 _line_boundaries 中 left 含义相同（位展开为布尔数组）
+
+    与上一层无关的部分（块能否放在某处）对所有块一次算出，逐块循环里只剩取上一层、延伸两步。
+
+    Returns:
+        (left, ends)：left 为 (B, K+1, n+1)，块数不足 K 的线其后各层全为 False；
+        ends 为 (B, K, n+1)，ends[:, i, j] 表示块 i 可以结束于 j 且其左侧可行
+    """
+    batch, n = cells.shape
+    k_max = blocks.shape[1]
+    idx = np.arange(n + 1, dtype=np.int32)
+    not_one = cells != 1
+    last_one = _last_index_plus1(~not_one)
+
+    def extend(seeds: np.ndarray) -> np.ndarray:
+        # 从最近的种子 q 延伸到 j：q..j-1 没有已知填充格（更远的种子也越不过这些格子）
+        nearest = np.maximum.accumulate(np.where(seeds, idx + 1, 0), axis=1)
+        return nearest > last_one
+
+    # 块 i 结束于 j：j 之前连续的非空格不少于块长
+    run = idx - _last_index_plus1(cells == 0)
+    placeable = (run[:, None, :] >= blocks[:, :, None]) & (blocks[:, :, None] > 0)
+
+    # gate 第 s 列（对应下标 s-1）：前 i 块能放进前 s-1 格且第 s-1 格可以为空，即块 i 可以从 s 开始；
+    # 第 0 列只有第 0 层为真（首块从第 0 格开始）
+    gate = np.zeros((batch, k_max + 1, n + 2), dtype=bool)
+    gate_flat = gate.ravel()
+    gate[:, 0, 0] = True
+    start = np.maximum(idx - blocks[:, :, None], 0)
+    prev = ((np.arange(batch) * ((k_max + 1) * (n + 2)))[:, None, None]
+            + (np.arange(k_max) * (n + 2))[None, :, None] + start)
+
+    left = np.empty((batch, k_max + 1, n + 1), dtype=bool)
+    seeds = np.zeros((batch, n + 1), dtype=bool)
+    seeds[:, 0] = True
+    left[:, 0] = extend(seeds)
+    ends = np.empty((batch, k_max, n + 1), dtype=bool)
+    for i in range(k_max):
+        gate[:, i, 1:n + 1] = left[:, i, :n] & not_one
+        end_ok = placeable[:, i] & gate_flat[prev[:, i]]
+        ends[:, i] = end_ok
+        left[:, i + 1] = extend(end_ok)
+    return left, ends
+
+
+def _analyze_lines_np(
+    cells: np.ndarray, blocks: np.ndarray, counts: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    批量逐线分析，结论与 _analyze_line_bits 一致
+
+    Args:
+        cells: (B, n) int8，1 / 0 / -1
+        blocks, counts: 见 _pad_constraints
+
+    Returns:
+        (强制填充 (B, n), 强制留空 (B, n), 是否无矛盾 (B,))
+    """
+    batch, n = cells.shape
+    k_max = int(counts.max()) if batch else 0
+    blocks = blocks[:, :k_max]
+    rows = np.arange(batch)
+    not_one = cells != 1
+    unknown = cells == -1
+
+    # 正向与反向（求 right）的线拼成一批，一次算出
+    both_left, both_ends = _left_tables(
+        np.concatenate([cells, cells[:, ::-1]]),
+        np.concatenate([blocks, _reverse_constraints(blocks, counts)]),
+    )
+    left, left_rev, ends = both_left[:batch], both_left[batch:], both_ends[:batch]
+    # right[i][j] = left_rev[k-i][n-j]；i > k 的层取到的值不影响结论（对应的 left / ends 全为 False）
+    layer = np.maximum(counts[:, None] - np.arange(k_max + 1), 0)
+    right = left_rev[rows[:, None], layer, ::-1]
+
+    ok = left[rows, counts, n]
+
+    # 可以为空：存在 i 使前 i 块在其左、其余块在其右
+    can_be_0 = (left[:, :, :n] & right[:, :, 1:]).any(axis=1)
+
+    # 可以填充：块 i 结束于 j，且 j == n 时 right[i+1][n]，否则 cells[j] 可空且 right[i+1][j+1]
+    nxt = right[:, 1:]
+    valid_end = np.empty_like(ends)
+    valid_end[:, :, :n] = ends[:, :, :n] & not_one[:, None, :] & nxt[:, :, 1:]
+    valid_end[:, :, n] = ends[:, :, n] & nxt[:, :, n]
+    # 格子 p 被块 i 覆盖：p 之后最近的可行结束位置不超过 p + block
+    no_end = n + 1 + int(blocks.max(initial=0))
+    next_end = np.where(valid_end, np.arange(n + 1), no_end)[:, :, ::-1]
+    next_end = np.minimum.accumulate(next_end, axis=2)[:, :, ::-1]
+    covered = next_end[:, :, 1:] <= np.arange(n) + blocks[:, :, None]
+    can_be_1 = covered.any(axis=1)
+
+    ok &= ~(unknown & ~can_be_0 & ~can_be_1).any(axis=1)
+    forced_ones = unknown & can_be_1 & ~can_be_0
+    forced_zeros = unknown & can_be_0 & ~can_be_1
+    return forced_ones, forced_zeros, ok
+
+
+def _propagate_vectorized(
+    grid: List[List[int]],
+    row_constraints: List[List[int]],
+    col_constraints: List[List[int]],
+) -> bool:
+    """向量化批量传播：先整批处理所有脏行，再整批处理所有脏列，直到没有脏线。"""
+    n = len(grid)
+    board = np.array(grid, dtype=np.int8).reshape(n, n)
+
+    # 未知约束 [-1] 的线不参与分析
+    axes = []
+    for constraints in (row_constraints, col_constraints):
+        known = np.array([list(c) != [-1] for c in constraints], dtype=bool)
+        blocks, counts = _pad_constraints([c if k else [] for c, k in zip(constraints, known)])
+        axes.append((known, blocks, counts))
+
+    dirty = [axes[0][0].copy(), axes[1][0].copy()]
+    axis = 0
+    while dirty[0].any() or dirty[1].any():
+        known, blocks, counts = axes[axis]
+        lines = np.flatnonzero(dirty[axis])
+        dirty[axis][:] = False
+        if len(lines):
+            view = board if axis == 0 else board.T
+            cells = view[lines]
+            forced_ones, forced_zeros, ok = _analyze_lines_np(
+                cells, blocks[lines], counts[lines]
+            )
+            if not ok.all():
+                return False
+            forced = forced_ones | forced_zeros
+            if forced.any():
+                cells[forced_ones] = 1
+                cells[forced_zeros] = 0
+                view[lines] = cells
+                # 交叉方向上被改动的线重新变脏；同方向的线本轮已达到逐线不动点
+                dirty[1 - axis] |= forced.any(axis=0) & axes[1 - axis][0]
+        axis = 1 - axis
+
+    for r in range(n):
+        grid[r][:] = board[r].tolist()
+    return True
+
+
+# ─── 搜索 ────────────────────────────────────────────────────────
+
+PROBE_LIMIT = 192             # 每个搜索节点最多试探的格子数（按最受约束排序）
+SEARCH_MEMO_LIMIT = 1 << 16   # 搜索内逐线分析缓存的条目上限，写满时整体清空
+SEARCH_PROBE_BUDGET = 40000   # 每道题最多试探次数，用完即放弃搜索（30x30 约数秒）
+RESTART_BASE = 16             # 重启间隔基数：累计回溯 RESTART_BASE × luby(i) 次后回到根节点
+BRANCH_NOISE = 0.5            # 分支评分的随机扰动幅度，重启后换一种分支顺序
+SEARCH_SEED = 0               # 扰动的随机种子，同一道题的搜索过程与结果可复现
+
+
+def _popcount(x: int) -> int:
+    return bin(x).count('1')
+
+
+def _luby(i: int) -> int:
+    """Luby 序列第 i 项（i 从 1 开始）：1, 1, 2, 1, 1, 2, 4, 1, 1, 2, ..."""
+    k = 1
+    while (1 << k) - 1 < i:
+        k += 1
+    while i != (1 << k) - 1:
+        i -= (1 << (k - 1)) - 1
+        k = 1
+        while (1 << k) - 1 < i:
+            k += 1
+    return 1 << (k - 1)
+
+
+class SearchLimitExceeded(RuntimeError):
+    """搜索试探次数超过 SEARCH_PROBE_BUDGET 仍未解出（不是无解，只是放弃）"""
+
+
+class _SearchEngine:
+    """
+    回溯搜索：在传播停滞的网格上继续求解，找到解时写回传入的 grid。
+
+    - 状态是每条线的已知填充 / 已知留空位掩码（下标 0..n-1 为行，n..2n-1 为列），
+      逐线分析用 _analyze_line_bits
+    - trail 记录每次修改前的 (线, 已知填充, 已知留空)，回溯时弹出到标记点并恢复，不复制状态
+    - 节点内先做矛盾试探：某格取值 v 传播后矛盾，则该格只能取 1-v；
+      两种取值传播后都得到的结论同样必然成立
+    - 试探没有新结论时，选“增益”最大的格子分支（两种取值传播后确定的格子数取较小者），
+      优先尝试增益大的取值；评分带少量随机扰动
+    - 按 Luby 序列重启：累计回溯一定次数后回到根节点，换一种分支顺序重新搜索，
+      避免在早期的错误分支下耗尽时间
+    - 试探总数超过 SEARCH_PROBE_BUDGET 时放弃，抛出 SearchLimitExceeded
+    """
+
+    def __init__(
+        self,
+        grid: List[List[int]],
+        row_constraints: List[List[int]],
+        col_constraints: List[List[int]],
+    ):
+        n = self.n = len(grid)
+        self.grid = grid
+        self.clues = [list(c) for c in row_constraints] + [list(c) for c in col_constraints]
+        self.ones = [0] * (2 * n)
+        self.zeros = [0] * (2 * n)
+        for r in range(n):
+            for c in range(n):
+                if grid[r][c] == 1:
+                    self.ones[r] |= 1 << c
+                    self.ones[n + c] |= 1 << r
+                elif grid[r][c] == 0:
+                    self.zeros[r] |= 1 << c
+                    self.zeros[n + c] |= 1 << r
+        self.trail: List[Tuple[int, int, int]] = []
+        self.probes = 0
+        self.branches = 0
+        self.restarts = 0
+        self._rng = random.Random(SEARCH_SEED)
+        # 试探会反复回到相同的线状态：按 (线, 已知填充, 已知留空) 缓存逐线分析结果，
+        # 写满 SEARCH_MEMO_LIMIT 条后清空重来，内存有界
+        self._line_memo: Dict[Tuple[int, int, int], Optional[Tuple[int, int]]] = {}
+
+    # ── 赋值与回滚 ──
+
+    def _set(self, line: int, ones: int, zeros: int) -> None:
+        self.trail.append((line, self.ones[line], self.zeros[line]))
+        self.ones[line] = ones
+        self.zeros[line] = zeros
+
+    def _undo(self, mark: int) -> None:
+        trail, ones, zeros = self.trail, self.ones, self.zeros
+        while len(trail) > mark:
+            line, ones[line], zeros[line] = trail.pop()
+
+    # ── 传播 ──
+
+    def _analyze(self, line: int) -> Optional[Tuple[int, int]]:
+        key = (line, self.ones[line], self.zeros[line])
+        result = self._line_memo.get(key, _MISSING)
+        if result is _MISSING:
+            if len(self._line_memo) >= SEARCH_MEMO_LIMIT:
+                self._line_memo.clear()
+            result = self._line_memo[key] = _analyze_line_bits(key[1], key[2], self.clues[line], self.n)
+        return result
+
+    def _propagate(self, lines: Iterable[int]) -> bool:
+        """从给定的线开始 worklist 传播，返回是否无矛盾（矛盾时由调用方回滚到标记点）"""
+        n, ones, zeros = self.n, self.ones, self.zeros
+        q = deque(lines)
+        queued = set(q)
+        while q:
+            line = q.popleft()
+            queued.discard(line)
+            result = self._analyze(line)
+            if result is None:
+                return False
+            forced_ones, forced_zeros = result
+            if not (forced_ones | forced_zeros):
+                continue
+            self._set(line, ones[line] | forced_ones, zeros[line] | forced_zeros)
+            # 行的第 j 格在第 j 列上，列的第 i 格在第 i 行上
+            base = n if line < n else 0
+            bit = 1 << (line if line < n else line - n)
+            forced = forced_ones | forced_zeros
+            while forced:
+                low = forced & -forced
+                forced ^= low
+                cross = base + low.bit_length() - 1
+                if low & forced_ones:
+                    self._set(cross, ones[cross] | bit, zeros[cross])
+                else:
+                    self._set(cross, ones[cross], zeros[cross] | bit)
+                if cross not in queued:
+                    queued.add(cross)
+                    q.append(cross)
+        return True
+
+    def _assign(self, r: int, c: int, v: int) -> bool:
+        """赋值并传播，返回是否无矛盾"""
+        n = self.n
+        if v:
+            self._set(r, self.ones[r] | 1 << c, self.zeros[r])
+            self._set(n + c, self.ones[n + c] | 1 << r, self.zeros[n + c])
+        else:
+            self._set(r, self.ones[r], self.zeros[r] | 1 << c)
+            self._set(n + c, self.ones[n + c], self.zeros[n + c] | 1 << r)
+        return self._propagate((r, n + c))
+
+    # ── 试探与分支选择 ──
+
+    def _try(self, r: int, c: int, v: int) -> Optional[Tuple[int, Dict[int, Tuple[int, int]]]]:
+        """
+        试探 (r, c) = v，随后回滚到试探前
+
+        Returns:
+            (新确定的格子数, {变化的行: (已知填充, 已知留空)})；矛盾返回 None
+        """
+        self.probes += 1
+        if self.probes > SEARCH_PROBE_BUDGET:
+            raise SearchLimitExceeded(
+                f"{self.n}x{self.n} 搜索试探 {SEARCH_PROBE_BUDGET} 次仍未解出"
+                f"（分支 {self.branches} 次，重启 {self.restarts} 次）")
+        mark = len(self.trail)
+        if not self._assign(r, c, v):
+            self._undo(mark)
+            return None
+        n, ones, zeros = self.n, self.ones, self.zeros
+        # trail 中每行最早的记录就是试探前的状态
+        before = {}
+        for line, old_ones, old_zeros in self.trail[mark:]:
+            if line < n and line not in before:
+                before[line] = old_ones | old_zeros
+        rows = {line: (ones[line], zeros[line]) for line in before}
+        gain = sum(_popcount(ones[line] | zeros[line]) - _popcount(known)
+                   for line, known in before.items())
+        self._undo(mark)
+        return gain, rows
+
+    def _candidates(self) -> List[Tuple[int, int]]:
+        """未知格按所在行列剩余未知数排序（越少越受约束），取前 PROBE_LIMIT 个"""
+        n, ones, zeros = self.n, self.ones, self.zeros
+        unknown = [n - _popcount(ones[line] | zeros[line]) for line in range(2 * n)]
+        full = (1 << n) - 1
+        cells = []
+        for r in range(n):
+            if not unknown[r]:
+                continue
+            free = full & ~(ones[r] | zeros[r])
+            while free:
+                low = free & -free
+                free ^= low
+                c = low.bit_length() - 1
+                cells.append((unknown[r] + unknown[n + c], r, c))
+        cells.sort()
+        return [(r, c) for _, r, c in cells[:PROBE_LIMIT]]
+
+    def _merge(self, rows1: Dict[int, Tuple[int, int]], rows0: Dict[int, Tuple[int, int]]) -> Optional[bool]:
+        """把两种取值都推出的结论并入当前状态并传播；没有新结论返回 False，矛盾返回 None"""
+        n, ones, zeros = self.n, self.ones, self.zeros
+        touched = set()
+        for r in rows1.keys() & rows0.keys():
+            (ones1, zeros1), (ones0, zeros0) = rows1[r], rows0[r]
+            new_ones = ones1 & ones0 & ~ones[r]
+            new_zeros = zeros1 & zeros0 & ~zeros[r]
+            if not (new_ones | new_zeros):
+                continue
+            touched.add(r)
+            self._set(r, ones[r] | new_ones, zeros[r] | new_zeros)
+            forced = new_ones | new_zeros
+            while forced:
+                low = forced & -forced
+                forced ^= low
+                col = n + low.bit_length() - 1
+                if low & new_ones:
+                    self._set(col, ones[col] | 1 << r, zeros[col])
+                else:
+                    self._set(col, ones[col], zeros[col] | 1 << r)
+                touched.add(col)
+        if not touched:
+            return False
+        return True if self._propagate(touched) else None
+
+    def _probe(self) -> Optional[Tuple[int, int, int]]:
+        """
+        试探候选格，把会导致矛盾的取值排除（赋相反值并传播），直到没有新结论。
+
+        Returns:
+            (r, c, 优先取值) 作为分支点；网格已填满时返回 (-1, -1, -1)；出现矛盾返回 None
+        """
+        while True:
+            candidates = self._candidates()
+            if not candidates:
+                return -1, -1, -1
+
+            best = None
+            best_score = -1.0
+            progressed = False
+            for r, c in candidates:
+                if (self.ones[r] | self.zeros[r]) >> c & 1:
+                    continue  # 本轮前面的试探已经确定了它
+                probe1 = self._try(r, c, 1)
+                probe0 = self._try(r, c, 0)
+                if probe1 is None and probe0 is None:
+                    return None
+                if probe1 is None or probe0 is None:
+                    # 一个取值矛盾，另一个就是必然结论
+                    if not self._assign(r, c, 0 if probe1 is None else 1):
+                        return None
+                    progressed = True
+                    continue
+                merged = self._merge(probe1[1], probe0[1])
+                if merged is None:
+                    return None
+                if merged:
+                    progressed = True
+                    continue
+                gain1, gain0 = probe1[0], probe0[0]
+                score = min(gain1, gain0) * (1 + BRANCH_NOISE * self._rng.random())
+                if score > best_score:
+                    best_score = score
+                    best = (r, c, 1 if gain1 >= gain0 else 0)
+
+            if not progressed:
+                return best
+
+    def search(self) -> bool:
+        """
+        深度优先搜索（显式栈，带重启），找到一个完整解返回 True，网格写回该解；无解返回 False
+
+        Raises:
+            SearchLimitExceeded: 试探次数用完（网格保持不变）
+        """
+        # 栈元素：(分支前 trail 标记, r, c, 尚未尝试的取值列表)
+        stack: List[Tuple[int, int, int, List[int]]] = []
+        run = 1
+        failures = 0
+        while True:
+            if stack and failures >= RESTART_BASE * _luby(run):
+                self._undo(stack[0][0])
+                stack.clear()
+                run += 1
+                failures = 0
+                self.restarts += 1
+
+            choice = self._probe()
+            if choice is not None:
+                r, c, v = choice
+                if r < 0:
+                    break
+                self.branches += 1
+                stack.append((len(self.trail), r, c, [1 - v]))
+                if self._assign(r, c, v):
+                    continue
+
+            # 回溯到还有取值未尝试的分支点
+            failures += 1
+            while stack:
+                mark, r, c, remaining = stack[-1]
+                self._undo(mark)
+                if not remaining:
+                    stack.pop()
+                    continue
+                if self._assign(r, c, remaining.pop()):
+                    break
+            else:
+                return False
+
+        for r, row in enumerate(self.grid):
+            ones, zeros = self.ones[r], self.zeros[r]
+            for c in range(self.n):
+                row[c] = 1 if ones >> c & 1 else 0 if zeros >> c & 1 else -1
+        return True
+
+
 # ─── 公开接口 ────────────────────────────────────────────────────
 
 
@@ -454,9 +1151,11 @@ def solve(
     Returns:
         二维数组，1 = 填充，0 = 空，若多解则返回第一个找到的解。
         若题目无解则返回 None。
+        存在未知约束时只做传播，无法确定的格子保留 -1（不猜测）。
 
     Raises:
         ValueError: 行数和列数不一致。
+        SearchLimitExceeded: 搜索试探次数超过 SEARCH_PROBE_BUDGET 仍未解出。
 
     Example:
         >>> solve([[3], [1, 1], [3]], [[3], [1, 1], [3]])
@@ -473,23 +1172,381 @@ def solve(
     if not _propagate(grid, rows, cols):
         return None
 
+    # 快速路径：传播已经解出，或有未知约束（猜测的结果不可信）
+    if all(-1 not in row for row in grid) or any(
+        list(c) == [-1] for c in rows + cols
+    ):
+        return grid
+
+    if not _search(grid, rows, cols):
+        return None
     return grid
 
 
+@metrics.timed('search')
+def _search(
+    grid: List[List[int]],
+    row_constraints: List[List[int]],
+    col_constraints: List[List[int]],
+) -> bool:
+    engine = _SearchEngine(grid, row_constraints, col_constraints)
+    try:
+        return engine.search()
+    except SearchLimitExceeded as e:
+        logger.warning(str(e))
+        raise
+
+
+def _line_runs(line: List[int]) -> List[int]:
+    """线上连续填充段的长度"""
+    runs = []
+    count = 0
+    for v in line:
+        if v == 1:
+            count += 1
+        elif count:
+            runs.append(count)
+            count = 0
+    if count:
+        runs.append(count)
+    return runs
+
+
+def _line_runs_of(constraint: List[int]) -> List[int]:
+    """约束对应的段长列表：[] / [0] 都表示空线"""
+    return [] if constraint == [0] else list(constraint)
+
+
+class Solver:
+    """
+    增量求解器：保存约束、传播结论和每个结论的来源，约束或已知格子变化时只重新传播受影响的线。
+
+    网格只保存传播结论（以及 set_cells 给定的格子），不保存搜索中的猜测；
+    每个推出的格子记录推出它的线和推出顺序。某条线的约束改变时，撤销这条线推出的格子，
+    以及（递归地）在它们之后、由经过它们的线推出的格子，再只从变化的线重新传播。
+
+        solver = Solver(rows, cols)
+        grid = solver.solve()
+        solver.update_clue('row', 3, [2, 1])   # OCR 修正一条约束
+        grid = solver.solve()
+    """
+
+    GIVEN = 'given'  # 来源：set_cells 给定
+
+    def __init__(self, rows: List[List[int]], cols: List[List[int]]):
+        n = len(rows)
+        if n != len(cols):
+            raise ValueError(f"行数 ({n}) 和列数 ({len(cols)}) 必须相等")
+        self.n = n
+        self.rows = [list(c) for c in rows]
+        self.cols = [list(c) for c in cols]
+        self.grid = [[-1] * n for _ in range(n)]
+        self._givens: Dict[Tuple[int, int], int] = {}
+        # 每个已知格子的来源（GIVEN 或推出它的线）与推出顺序
+        self._reason: List[List[Optional[object]]] = [[None] * n for _ in range(n)]
+        self._order = [[0] * n for _ in range(n)]
+        self._step = 0
+        # 上次分析时线的状态，相同则跳过
+        self._fingerprints: Dict[Tuple[str, int], Tuple[int, ...]] = {}
+        # 传播因矛盾中止时尚未到达不动点的线，下次更新时一并重新分析
+        self._pending: set = set()
+        self._solution: Optional[List[List[int]]] = None
+        self._solved = False
+        # 最近一次找到的完整解：约束改错又改回时直接复用，免去搜索
+        self._last_solution: Optional[List[List[int]]] = None
+        self.consistent = self._rebuild()
+
+    # ── 公开操作 ──
+
+    def update_clue(self, axis: str, idx: int, clue: List[int]) -> bool:
+        """
+        修改一条约束并增量传播，返回是否无矛盾
+
+        Raises:
+            ValueError: axis 不是 'row' / 'col'
+        """
+        clues = self._clues(axis)
+        clue = list(clue)
+        if clues[idx] == clue:
+            return self.consistent
+        clues[idx] = clue
+        self._invalidate()
+
+        key = (axis, idx)
+        seeds = [(r, c) for r, c in self._line_coords(axis, idx) if self._reason[r][c] == key]
+        dirty = self._retract(seeds)
+        dirty.add(key)
+        self._fingerprints.pop(key, None)
+        return self._propagate_lines(dirty)
+
+    def update_clues(self, rows: List[List[int]], cols: List[List[int]]) -> bool:
+        """
+        逐条比较，只更新变化的约束
+
+        Raises:
+            ValueError: 尺寸与当前题目不同
+        """
+        if len(rows) != self.n or len(cols) != self.n:
+            raise ValueError(f"尺寸不一致: {len(rows)}x{len(cols)}，当前为 {self.n}x{self.n}")
+        for axis, clues in (('row', rows), ('col', cols)):
+            for idx, clue in enumerate(clues):
+                if list(clue) != self._clues(axis)[idx]:
+                    self.update_clue(axis, idx, clue)
+        return self.consistent
+
+    def set_cells(self, cells: Iterable[Tuple[int, int, int]]) -> bool:
+        """
+        给定格子取值 (r, c, v)，v = -1 表示取消给定；增量传播，返回是否无矛盾
+        """
+        changed = False
+        seeds = []
+        assigned = []
+        for r, c, v in cells:
+            if v == -1:
+                if self._givens.pop((r, c), None) is not None:
+                    seeds.append((r, c))
+                    changed = True
+                continue
+            if self._givens.get((r, c)) == v:
+                continue
+            self._givens[(r, c)] = v
+            changed = True
+            if self.grid[r][c] == v:
+                self._reason[r][c] = self.GIVEN  # 已推出的格子改为给定，不再随来源撤销
+            else:
+                if self.grid[r][c] != -1:
+                    seeds.append((r, c))
+                assigned.append((r, c, v))
+        if not changed:
+            return self.consistent
+        self._invalidate()
+
+        dirty = self._retract(seeds)
+        for r, c, v in assigned:
+            self._assign(r, c, v, self.GIVEN)
+            dirty.update((('row', r), ('col', c)))
+        return self._propagate_lines(dirty)
+
+    def solve(self) -> Optional[List[List[int]]]:
+        """
+        当前约束下的解（格式同模块级 solve），无变化时直接返回上次结果
+
+        Raises:
+            SearchLimitExceeded: 搜索试探次数用完（不记为已求解，下次调用会重新搜索）
+        """
+        if self._solved:
+            return self._copy(self._solution)
+        self._solution = None
+        if self.consistent:
+            grid = self._copy(self.grid)
+            if all(-1 not in row for row in grid) or any(
+                c == [-1] for c in self.rows + self.cols
+            ):
+                self._solution = grid
+            elif self._fits(self._last_solution):
+                self._solution = self._copy(self._last_solution)
+            elif _search(grid, self.rows, self.cols):
+                self._solution = grid
+        self._solved = True
+        if self._solution is not None and -1 not in sum(self._solution, []):
+            self._last_solution = self._copy(self._solution)
+        return self._copy(self._solution)
+
+    # ── 内部 ──
+
+    def _clues(self, axis: str) -> List[List[int]]:
+        if axis == 'row':
+            return self.rows
+        if axis == 'col':
+            return self.cols
+        raise ValueError(f"axis 应为 'row' 或 'col': {axis}")
+
+    def _line_coords(self, axis: str, idx: int) -> List[Tuple[int, int]]:
+        if axis == 'row':
+            return [(idx, j) for j in range(self.n)]
+        return [(i, idx) for i in range(self.n)]
+
+    @staticmethod
+    def _copy(grid: Optional[List[List[int]]]) -> Optional[List[List[int]]]:
+        return [row[:] for row in grid] if grid is not None else None
+
+    def _fits(self, solution: Optional[List[List[int]]]) -> bool:
+        """完整解是否与当前网格一致并满足所有约束"""
+        if solution is None:
+            return False
+        n = self.n
+        if any(v != -1 and v != solution[r][c]
+               for r in range(n) for c, v in enumerate(self.grid[r])):
+            return False
+        return all(
+            _line_runs(solution[i]) == _line_runs_of(self.rows[i])
+            and _line_runs([solution[r][i] for r in range(n)]) == _line_runs_of(self.cols[i])
+            for i in range(n)
+        )
+
+    def _invalidate(self) -> None:
+        self._solved = False
+        self._solution = None
+
+    def _assign(self, r: int, c: int, v: int, reason) -> None:
+        self._step += 1
+        self.grid[r][c] = v
+        self._reason[r][c] = reason
+        self._order[r][c] = self._step
+
+    def _rebuild(self) -> bool:
+        """从给定格子出发全量传播"""
+        n = self.n
+        self.grid = [[-1] * n for _ in range(n)]
+        self._reason = [[None] * n for _ in range(n)]
+        self._fingerprints.clear()
+        for (r, c), v in self._givens.items():
+            self._assign(r, c, v, self.GIVEN)
+        lines = [('row', r) for r in range(n)] + [('col', c) for c in range(n)]
+        return self._propagate_lines(lines)
+
+    def _retract(self, seeds: List[Tuple[int, int]]) -> set:
+        """
+        撤销 seeds 及依赖它们的推出结论，返回需要重新分析的线
+
+        线 L 在第 t 步推出的格子只依赖 L 上早于 t 的已知格子，
+        所以撤销格子 z 时，经过 z 的线在 z 之后推出的格子也要撤销。
+        """
+        grid, reason, order = self.grid, self._reason, self._order
+        dirty = set()
+        stack = list(seeds)
+        while stack:
+            r, c = stack.pop()
+            if grid[r][c] == -1:
+                continue
+            step = order[r][c]
+            grid[r][c] = -1
+            reason[r][c] = None
+            for key in (('row', r), ('col', c)):
+                dirty.add(key)
+                self._fingerprints.pop(key, None)
+                for i, j in self._line_coords(*key):
+                    if reason[i][j] == key and order[i][j] > step:
+                        stack.append((i, j))
+        return dirty
+
+    def _propagate_lines(self, lines) -> bool:
+        """
+        从给定的线（以及上次中止时未完成的线）开始 worklist 传播，结果记入 self.consistent
+
+        已知格子都是当前约束的推论，矛盾时保留它们并记下未完成的线，
+        之后修正约束只需撤销相关结论，不必从头传播。
+        """
+        with metrics.timed('propagate'):
+            self.consistent = self._worklist(set(lines) | self._pending)
+        return self.consistent
+
+    def _worklist(self, lines) -> bool:
+        grid = self.grid
+        # 按固定顺序处理（集合的遍历顺序随字符串哈希种子变化），传播过程可复现
+        q = deque(sorted(lines))
+        queued = set(q)
+        self._pending = set()
+        while q:
+            key = q.popleft()
+            queued.discard(key)
+            axis, idx = key
+            coords = self._line_coords(axis, idx)
+            cells = tuple(grid[r][c] for r, c in coords)
+            if self._fingerprints.get(key) == cells:
+                continue
+            forced_ones, forced_zeros, ok = _analyze_line(list(cells), self._clues(axis)[idx])
+            if not ok:
+                self._pending = queued | {key}
+                return False
+            for v, forced in ((1, forced_ones), (0, forced_zeros)):
+                for j in forced:
+                    r, c = coords[j]
+                    self._assign(r, c, v, key)
+                    cross = ('col', c) if axis == 'row' else ('row', r)
+                    if cross not in queued:
+                        queued.add(cross)
+                        q.append(cross)
+            self._fingerprints[key] = tuple(grid[r][c] for r, c in coords)
+        return True
+
+
+# ─── 批量求解 ────────────────────────────────────────────────────
+
+
+def _solve_record(puzzle: dict) -> dict:
+    """单题入口（进程池中调用）：{"rows", "cols"} → {"grid"} 或 {"error"}"""
+    try:
+        return {'grid': solve(puzzle['rows'], puzzle['cols'])}
+    except (KeyError, TypeError, ValueError, SearchLimitExceeded) as e:
+        return {'error': f'{type(e).__name__}: {e}'}
+
+
+def _init_worker() -> None:
+    """工作进程预热：映射可用的磁盘候选表；内存候选缓存在进程复用期间保持"""
+    for n in range(1, SMALL_MAX_SIZE + 1):
+        _CANDIDATES.preload(n)
+
+
+def solve_many(
+    puzzles: Iterable[dict],
+    workers: Optional[int] = None,
+    chunksize: int = batch_solver.DEFAULT_CHUNKSIZE,
+    ordered: bool = True,
+) -> Iterator[Tuple[int, dict]]:
+    """
+    用进程池批量求解 {"rows", "cols"} 题目，逐个产出 (输入序号, {"grid"} 或 {"error"})
+
+    见 batch_solver.solve_many；ordered=False 时按完成顺序产出。
+    """
+    return batch_solver.solve_many(_solve_record, puzzles, workers, chunksize, ordered,
+                                   initializer=_init_worker)
+
+
 # ─── 命令行入口（用于测试）──────────────────────────────────────
 
 
 def main():
     """命令行测试入口"""
+    import argparse
     import sys
-    import json
+
+    parser = argparse.ArgumentParser(description='数织求解器')
+    parser.add_argument('input', nargs='?', help='JSON 题目文件 {"rows": [...], "cols": [...]}')
+    parser.add_argument('--build-tables', metavar='DIR',
+                        help=f'生成磁盘候选表到目录（之后设置 {CANDIDATE_DIR_ENV}=DIR 使用）')
+    # 只有 n ≤ SMALL_MAX_SIZE 的题目走候选法，默认只生成会用到的表
+    default_sizes = ','.join(str(n) for n in (5, 10, 15, 20) if n <= SMALL_MAX_SIZE)
+    parser.add_argument('--sizes', default=default_sizes,
+                        help=f'生成候选表的尺寸，逗号分隔，最大 {TABLE_MAX_SIZE}'
+                             f'（传播只使用 n ≤ {SMALL_MAX_SIZE} 的表）')
+    parser.add_argument('--jsonl', nargs='?', const='-', metavar='PATH',
+                        help='批量求解 JSONL 题目（每行 {"rows", "cols"}），省略 PATH 时读 stdin')
+    parser.add_argument('--workers', type=int, default=None, help='批量求解的进程数，默认 CPU 核数')
+    parser.add_argument('--chunksize', type=int, default=batch_solver.DEFAULT_CHUNKSIZE,
+                        help='每次分给工作进程的题目数')
+    parser.add_argument('--unordered', action='store_true', help='按完成顺序输出（默认按输入顺序）')
+    args = parser.parse_args()
+
+    if args.jsonl:
+        batch_solver.run_jsonl(_solve_record, args.jsonl, args.workers, args.chunksize,
+                               not args.unordered, initializer=_init_worker)
+        return
+
+    if args.build_tables:
+        os.makedirs(args.build_tables, exist_ok=True)
+        for n in map(int, args.sizes.split(',')):
+            path = candidate_table_path(args.build_tables, n)
+            count = build_candidate_table(n, path)
+            print(f"{n}x{n}: {count} 种约束 → {path}")
+        return
 
     rows = [[3], [1, 1], [3]]
     cols = [[3], [1, 1], [3]]
 
-    if len(sys.argv) > 1:
+    if args.input:
         try:
-            with open(sys.argv[1]) as f:
+            with open(args.input) as f:
                 data = json.load(f)
                 rows = data.get("rows", rows)
                 cols = data.get("cols", cols)
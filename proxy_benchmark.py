@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+代理服务器基准：线程池版本（adb_proxy.py） vs asyncio 版本（async_proxy.py）
+
+在本地模拟 adb server 上运行，screencap 人为延迟以模拟慢设备。
+同时发起大量 /screenshot?format=raw 请求，并在其间穿插 /tap，统计：
+
+- 截图请求的吞吐、成功数与被拒（503）数
+- /tap 的延迟（慢截图是否饿死点击）
+
+使用方法:
+    python proxy_benchmark.py
+    python proxy_benchmark.py --screenshots 500 --screencap-delay 0.5 --taps 20
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import struct
+import threading
+import time
+from typing import List, Optional, Tuple
+import logging
+
+from fake_adb_server import FakeADBServer
+from logger_config import setup_logger
+
+logger = logging.getLogger(__name__)
+
+
+FRAME_SIZE = (108, 240)  # 模拟帧尺寸（宽, 高），只用于构造响应数据
+
+
+def _make_raw_frame(width: int, height: int) -> bytes:
+    return struct.pack('<4I', width, height, 1, 0) + bytes(width * height * 4)
+
+
+async def _http_request(port: int, method: str, path: str, body: bytes = b'') -> Tuple[int, float]:
+    """发送单个 HTTP 请求，返回 (状态码, 耗时秒)"""
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    request = (f'{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+               f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n'
+               'Connection: close\r\n\r\n').encode('latin-1') + body
+    writer.write(request)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    status = int(response.split(b' ', 2)[1]) if response else 0
+    return status, time.perf_counter() - started
+
+
+async def _run_load(port: int, screenshots: int, taps: int, tap_interval: float) -> dict:
+    """并发截图的同时按固定间隔发送点击"""
+    async def screenshot():
+        try:
+            return await _http_request(port, 'GET', '/screenshot?format=raw')
+        except OSError:
+            return 0, 0.0
+
+    async def tap_loop() -> List[Tuple[int, float]]:
+        results = []
+        body = b'{"taps": [{"x": 10, "y": 20}]}'
+        for _ in range(taps):
+            await asyncio.sleep(tap_interval)
+            try:
+                results.append(await _http_request(port, 'POST', '/tap', body))
+            except OSError:
+                results.append((0, 0.0))
+        return results
+
+    started = time.perf_counter()
+    tap_task = asyncio.ensure_future(tap_loop())
+    shots = await asyncio.gather(*(screenshot() for _ in range(screenshots)))
+    tap_results = await tap_task
+    elapsed = time.perf_counter() - started
+
+    tap_ok = [t for status, t in tap_results if status == 200]
+    return {
+        'elapsed': elapsed,
+        'shots_ok': sum(1 for status, _ in shots if status == 200),
+        'shots_rejected': sum(1 for status, _ in shots if status == 503),
+        'shots_failed': sum(1 for status, _ in shots if status not in (200, 503)),
+        'taps_ok': len(tap_ok),
+        'taps_failed': len(tap_results) - len(tap_ok),
+        'tap_p50_ms': statistics.median(tap_ok) * 1000 if tap_ok else None,
+        'tap_max_ms': max(tap_ok) * 1000 if tap_ok else None,
+    }
+
+
+def _bench_threaded(args) -> dict:
+    from adb_proxy import ADBProxyHandler, Config, PooledHTTPServer
+
+    httpd = PooledHTTPServer(('127.0.0.1', 0), ADBProxyHandler, max_workers=Config.MAX_WORKERS)
+    # 线程池版本的 accept 积压队列默认只有 5，放宽后对比的才是处理能力而不是连接被拒
+    httpd.socket.listen(1024)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    try:
+        return asyncio.run(_run_load(httpd.server_address[1], args.screenshots,
+                                     args.taps, args.tap_interval))
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def _bench_async(args) -> dict:
+    from async_proxy import AsyncADBProxy, start_server
+
+    async def run():
+        proxy = AsyncADBProxy()
+        server = await start_server('127.0.0.1', 0, proxy)
+        try:
+            port = server.sockets[0].getsockname()[1]
+            return await _run_load(port, args.screenshots, args.taps, args.tap_interval)
+        finally:
+            server.close()
+            await server.wait_closed()
+            proxy.close()
+
+    return asyncio.run(run())
+
+
+def _format_ms(value: Optional[float]) -> str:
+    """没有成功的点击时没有延迟可报，显示 n/a"""
+    return f'{value:7.1f}ms' if value is not None else f'{"n/a":>9}'
+
+
+def _print_result(name: str, result: dict) -> None:
+    print(f"{name:<10} 用时 {result['elapsed']:6.2f}s | "
+          f"截图 成功 {result['shots_ok']:4d} 拒绝 {result['shots_rejected']:4d} "
+          f"失败 {result['shots_failed']:4d} | "
+          f"点击 成功 {result['taps_ok']:3d} 失败 {result['taps_failed']:3d} "
+          f"p50 {_format_ms(result['tap_p50_ms'])} max {_format_ms(result['tap_max_ms'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='线程池代理与 asyncio 代理的基准对比')
+    parser.add_argument('--screenshots', type=int, default=200, help='并发截图请求数')
+    parser.add_argument('--screencap-delay', type=float, default=0.3, help='模拟 screencap 耗时（秒）')
+    parser.add_argument('--taps', type=int, default=10, help='截图期间发送的点击请求数')
+    parser.add_argument('--tap-interval', type=float, default=0.05, help='点击请求间隔（秒）')
+    parser.add_argument('--debug', action='store_true', help='开启调试模式，显示详细日志')
+    args = parser.parse_args()
+
+    setup_logger(args.debug)
+    if not args.debug:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    frame = _make_raw_frame(*FRAME_SIZE)
+
+    def handler(serial, kind, command):
+        if command.startswith('screencap'):
+            time.sleep(args.screencap_delay)
+            return frame
+        return None
+
+    with FakeADBServer(handler=handler) as fake:
+        # 代理模块在导入时读取 adb server 端口，必须先设置环境变量
+        os.environ['ANDROID_ADB_SERVER_PORT'] = str(fake.port)
+        print(f"{args.screenshots} 个并发截图（每个 {args.screencap_delay}s），"
+              f"期间 {args.taps} 次点击")
+        _print_result('threaded', _bench_threaded(args))
+        _print_result('asyncio', _bench_async(args))
+
+
+if __name__ == '__main__':
+    main()
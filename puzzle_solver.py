@@ -1,30 +1,29 @@
 #!/usr/bin/env python3
 """
 拼图暴力求解器 - Python 版本
-直接调用 ADB 命令，无需 HTTP 代理，性能最优
+直接通过 adb server socket 调用 ADB，无需 HTTP 代理，性能最优
 
 优化特性：
-- 动态线程池：根据 CPU 核心数自动调整（4-16 线程）
-- 批量 ADB 命令执行：将多个操作合并到单个 shell 脚本中
-- 优化延迟时间：减少不必要的等待
+- 原始帧截图：screencap 不做 PNG 编码，颜色过滤直接读取像素视图
+- 持久 shell 会话：操作逐点写入同一个远端 sh，省去每批次的会话建立
+- 流水线执行：执行窗口内无需等待上一批完成
 """
 
-import subprocess
-import time
-import os
-from io import BytesIO
-from PIL import Image
+from collections import deque
+import numpy as np
 from typing import List, Tuple, Optional
 from enum import Enum
-from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 import logging
+from adb_client import ADBError, get_default_client, get_shell_session
+from raw_frame import RawFrame, parse_raw_screencap
 from logger_config import setup_logger
 
 logger = logging.getLogger(__name__)
 
 # 目标颜色（RGB），允许误差 10
 TARGET_COLOR = (36, 138, 114)
+TARGET_COLOR_ARRAY = np.array(TARGET_COLOR, dtype=np.int16)
 COLOR_TOLERANCE = 10
 
 # 拖动和点击的坐标
@@ -38,8 +37,6 @@ class PuzzleSolver:
         self.current_round = 0
         self.all_points = self._generate_points()
         self.filtered_points: List[Tuple[int, int]] = self.all_points[:]
-        # 动态设置线程池大小：CPU 核心数，最少 4，最多 16
-        self.thread_pool_size = max(4, min(16, os.cpu_count() or 1))
 
     def _generate_points(self) -> List[Tuple[int, int]]:
         """从 HTML 中移植的点位生成逻辑"""
@@ -53,46 +50,35 @@ class PuzzleSolver:
                 points.append((x, y))
         return points
 
-    def get_screenshot(self) -> Optional[Image.Image]:
-        """获取设备截图"""
+    def get_screenshot(self) -> Optional[RawFrame]:
+        """获取设备截图（原始帧，跳过设备端 PNG 编码与本地解码）"""
         try:
-            result = subprocess.run(
-                ['adb', 'exec-out', 'screencap', '-p'],
-                capture_output=True,
-                timeout=10
-            )
-
-            if result.returncode != 0:
-                logger.error(f'截图获取失败: {result.stderr.decode()}')
-                return None
+            raw_bytes = get_default_client().exec_out('screencap')
 
-            if not result.stdout:
+            if not raw_bytes:
                 logger.error('截图数据为空')
                 return None
 
-            # 直接从字节流创建图片
-            image = Image.open(BytesIO(result.stdout))
-            logger.debug(f'✓ 截图获取成功，尺寸: {image.size}')
-            return image
+            # 像素数据直接以 NumPy 视图引用原始字节
+            frame = parse_raw_screencap(raw_bytes)
+            logger.debug(f'✓ 截图获取成功，尺寸: {(frame.width, frame.height)}')
+            return frame
 
-        except subprocess.TimeoutExpired:
-            logger.error('截图请求超时')
+        except ADBError as e:
+            logger.error(f'截图获取失败: {e}')
             return None
         except Exception as e:
             logger.error(f'截图处理异常: {e}', exc_info=True)
             return None
 
-    def get_pixel_color(self, image: Image.Image, x: int, y: int) -> Tuple[int, int, int]:
+    def get_pixel_color(self, frame: RawFrame, x: int, y: int) -> Tuple[int, int, int]:
         """获取指定坐标的像素颜色
 
         注意：_generate_points 生成的坐标是固定的且在安全范围内，
         因此直接访问而不进行越界检查是安全的。
         """
-        pixel = image.getpixel((x, y))
-        if isinstance(pixel, tuple):
-            return pixel[:3]
-        else:
-            return (pixel, pixel, pixel)
+        r, g, b = frame.rgb[y, x]
+        return (int(r), int(g), int(b))
 
     def color_matches(self, color: Tuple[int, int, int]) -> bool:
         """检查颜色是否匹配目标颜色"""
@@ -103,49 +89,33 @@ class PuzzleSolver:
         )
         return diff <= COLOR_TOLERANCE
 
-    def _check_single_point(self, pixels, point: Tuple[int, int]) -> Optional[Tuple[int, int]]:
-        """检查单个点位是否匹配目标颜色（线程安全版本）"""
-        x, y = point
-        try:
-            # 从像素数据数组中获取颜色
-            color = pixels[x, y]
-            if self.color_matches(color):
-                return point
-            return None
-        except Exception:
-            return None
+    def _match_points(self, rgb: np.ndarray, points: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """一次花式索引取出所有点位颜色，向量化比较目标颜色"""
+        if not points:
+            return []
+        coords = np.array(points)
+        colors = rgb[coords[:, 1], coords[:, 0]].astype(np.int16)
+        diff = np.abs(colors - TARGET_COLOR_ARRAY).sum(axis=1)
+        return [p for p, ok in zip(points, diff <= COLOR_TOLERANCE) if ok]
 
-    def filter_points_by_color(self, image: Image.Image, candidate_points: Optional[List[Tuple[int, int]]] = None) -> List[Tuple[int, int]]:
-        """根据颜色过滤点位（并行处理以提高性能）
+    def filter_points_by_color(self, frame: RawFrame, candidate_points: Optional[List[Tuple[int, int]]] = None) -> List[Tuple[int, int]]:
+        """根据颜色过滤点位（直接读取原始帧像素视图，向量化比较）
 
         Args:
-            image: 截图图像
+            frame: 原始截图帧
             candidate_points: 候选点列表，如果为 None 则使用 self.all_points
         """
         # 使用候选点（如果提供），否则使用全部点位
         points_to_check = candidate_points if candidate_points is not None else self.all_points
         logger.info(f'开始进行颜色过滤...')
 
-        # 加载图片数据到内存并获取线程安全的像素访问器
-        pixels = image.load()
-
-        with ThreadPoolExecutor(max_workers=self.thread_pool_size) as executor:
-            results = list(executor.map(
-                lambda p: self._check_single_point(pixels, p),
-                points_to_check
-            ))
-
-        filtered = [r for r in results if r is not None]
+        rgb = frame.rgb
+        filtered = self._match_points(rgb, points_to_check)
 
         # 如果过滤前后数量相同，说明候选点没有匹配的点，用全部点进行过滤
         # 如果过滤后没有任何点剩下，可能漏掉了有效点，用全部点进行过滤
         if (len(filtered) == len(points_to_check) and len(filtered) != len(self.all_points)) or len(filtered) == 0:
-            with ThreadPoolExecutor(max_workers=self.thread_pool_size) as executor:
-                all_results = list(executor.map(
-                    lambda p: self._check_single_point(pixels, p),
-                    self.all_points
-                ))
-            all_filtered = [r for r in all_results if r is not None]
+            all_filtered = self._match_points(rgb, self.all_points)
 
             if len(all_filtered) == len(points_to_check):
                 logger.warning(f'全部点过滤仍无效，直接返回全部')
@@ -173,54 +143,38 @@ class PuzzleSolver:
         ]
 
     def solve_round(self) -> bool:
-        """执行一轮求解（批量执行 ADB 命令以提升性能）"""
+        """执行一轮求解（逐点写入持久 shell 会话，边规划边执行）"""
         if not self.filtered_points:
             logger.error('没有可处理的点位')
             return False
 
         logger.info(f'🚀 开始第 {self.current_round + 1} 轮求解')
+        session = get_shell_session()
 
         # 使用进度条显示处理进度
         with tqdm(total=len(self.filtered_points),
                   desc=f'  轮次 {self.current_round + 1}',
                   unit='点', leave=True) as pbar:
 
-            # 分批执行，避免单次 shell 脚本过大
-            batch_size = 20  # 每批处理 20 个点
-            for i in range(0, len(self.filtered_points), batch_size):
-                batch_end = min(i + batch_size, len(self.filtered_points))
-                batch_points = self.filtered_points[i:batch_end]
-
-                # 构建批量命令
-                batch_commands = []
-                for x, y in batch_points:
-                    batch_commands.extend(self._build_swipe_commands(x, y))
-
-                shell_script = '\n'.join(batch_commands)
-
-                try:
-                    result = subprocess.run(
-                        ['adb', 'shell', shell_script],
-                        capture_output=True,
-                        timeout=30
-                    )
-
-                    if result.returncode != 0:
-                        logger.error('批量操作失败')
-                        return False
-
-                except subprocess.TimeoutExpired:
-                    logger.error('批量操作超时')
-                    return False
-                except Exception as e:
-                    logger.error(f'批量操作异常: {e}', exc_info=True)
-                    return False
-
-                # 更新进度条
-                pbar.update(len(batch_points))
-
-                # 批次间极短延迟
-                time.sleep(0.02)
+            # 每个点一个批次，执行窗口满时 submit 自动阻塞，无需批次间延迟
+            pending = deque()
+            try:
+                for x, y in self.filtered_points:
+                    pending.append(session.submit(self._build_swipe_commands(x, y)))
+                    while pending and session.done(pending[0]):
+                        session.wait(pending.popleft())
+                        pbar.update(1)
+
+                while pending:
+                    session.wait(pending.popleft())
+                    pbar.update(1)
+
+            except ADBError as e:
+                logger.error(f'批量操作失败: {e}')
+                return False
+            except Exception as e:
+                logger.error(f'批量操作异常: {e}', exc_info=True)
+                return False
 
         self.current_round += 1
         logger.info(f'第 {self.current_round} 轮求解完成')
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+screencap 原始帧解析
+`screencap`（不带 -p）直接输出帧缓冲：头部 + 像素数据，省去设备端 PNG 编码
+和本地 PNG 解码
+
+头部格式（小端 uint32）：
+- Android 8 及以下：width, height, format                （12 字节）
+- Android 9 及以上：width, height, format, colorspace    （16 字节）
+"""
+
+import struct
+from typing import Union
+
+import numpy as np
+
+
+# 像素格式（android PixelFormat）与每像素字节数
+PIXEL_FORMAT_RGBA_8888 = 1
+PIXEL_FORMAT_RGBX_8888 = 2
+PIXEL_FORMAT_RGB_888 = 3
+PIXEL_FORMAT_BGRA_8888 = 5
+
+BYTES_PER_PIXEL = {
+    PIXEL_FORMAT_RGBA_8888: 4,
+    PIXEL_FORMAT_RGBX_8888: 4,
+    PIXEL_FORMAT_RGB_888: 3,
+    PIXEL_FORMAT_BGRA_8888: 4,
+}
+
+HEADER_SIZES = (12, 16)
+COLORSPACE_UNKNOWN = 0
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+class RawFrame:
+    """
+    一帧原始截图
+
+    属性:
+        width / height / format: 头部信息
+        pixels: (height, width, channels) uint8 视图，直接引用原始缓冲区，不复制
+    """
+
+    def __init__(self, width: int, height: int, pixel_format: int, pixels: np.ndarray):
+        self.width = width
+        self.height = height
+        self.format = pixel_format
+        self.pixels = pixels
+
+    @property
+    def rgb(self) -> np.ndarray:
+        """RGB 通道视图（不复制）"""
+        if self.format == PIXEL_FORMAT_BGRA_8888:
+            return self.pixels[:, :, 2::-1]
+        return self.pixels[:, :, :3]
+
+    def to_bgr(self, x: int = 0, y: int = 0, w: int = None, h: int = None) -> np.ndarray:
+        """裁剪后转换为 OpenCV 使用的连续 BGR 图像（只转换裁剪区域）"""
+        w = self.width - x if w is None else w
+        h = self.height - y if h is None else h
+        region = self.pixels[y:y + h, x:x + w]
+        if self.format == PIXEL_FORMAT_BGRA_8888:
+            return np.ascontiguousarray(region[:, :, :3])
+        return np.ascontiguousarray(region[:, :, 2::-1])
+
+    def region(self, x: int, y: int, w: int, h: int) -> 'RawFrame':
+        """裁剪区域（像素仍是原始缓冲区的视图，超出画面的部分被截掉）"""
+        pixels = self.pixels[y:y + h, x:x + w]
+        return RawFrame(pixels.shape[1], pixels.shape[0], self.format, pixels)
+
+    def to_bytes(self) -> bytes:
+        """序列化为 screencap 原始帧格式（16 字节头部），可再用 parse_raw_screencap 解析"""
+        header = struct.pack('<4I', self.width, self.height, self.format, COLORSPACE_UNKNOWN)
+        return header + np.ascontiguousarray(self.pixels).tobytes()
+
+
+def is_png(data: Union[bytes, bytearray, memoryview]) -> bool:
+    return bytes(data[:8]) == PNG_SIGNATURE
+
+
+def parse_raw_screencap(data: Union[bytes, bytearray, memoryview]) -> RawFrame:
+    """
+    解析 `screencap` 原始输出，像素部分以零拷贝 NumPy 视图返回
+
+    Raises:
+        ValueError: 数据长度与头部不符或像素格式不支持
+    """
+    if len(data) < HEADER_SIZES[0]:
+        raise ValueError(f'原始截图数据过短: {len(data)} 字节')
+    width, height, pixel_format = struct.unpack_from('<III', data, 0)
+    bpp = BYTES_PER_PIXEL.get(pixel_format)
+    if bpp is None:
+        raise ValueError(f'不支持的像素格式: {pixel_format}')
+
+    payload_size = width * height * bpp
+    header_size = len(data) - payload_size
+    if header_size not in HEADER_SIZES:
+        raise ValueError(
+            f'原始截图长度不匹配: {len(data)} 字节, {width}x{height} 格式 {pixel_format}')
+
+    pixels = np.frombuffer(data, dtype=np.uint8, count=payload_size, offset=header_size)
+    return RawFrame(width, height, pixel_format, pixels.reshape(height, width, bpp))
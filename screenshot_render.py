@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+截图响应渲染
+把截图按请求裁剪、缩放并编码为二进制响应，供 /screenshot 直接返回：
+
+- format: png / jpeg / raw（screencap 原始帧格式，16 字节头部 + 像素）
+- roi: x,y,w,h，屏幕坐标系下的裁剪区域，超出画面部分被截掉
+- scale: (0, 1] 的缩放比例，在裁剪后应用
+
+响应头附带原始屏幕尺寸与实际裁剪区域，网页据此把显示坐标换算回屏幕坐标。
+"""
+
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+import metrics
+from image_source import encode_jpeg, encode_png, load_bgr
+from raw_frame import RawFrame
+
+FORMAT_PNG = 'png'
+FORMAT_JPEG = 'jpeg'
+FORMAT_RAW = 'raw'
+
+CONTENT_TYPES = {
+    FORMAT_PNG: 'image/png',
+    FORMAT_JPEG: 'image/jpeg',
+    FORMAT_RAW: 'application/octet-stream',
+}
+
+# 供网页读取的响应头（跨域时需要在 Access-Control-Expose-Headers 中声明）
+METADATA_HEADERS = ('X-Screen-Width', 'X-Screen-Height', 'X-Roi', 'X-Scale')
+
+
+def parse_roi(value: Optional[str]) -> Optional[Tuple[int, int, int, int]]:
+    """解析 "x,y,w,h"；None 表示不裁剪
+
+    Raises:
+        ValueError: 格式错误或宽高非正
+    """
+    if value is None:
+        return None
+    parts = value.split(',')
+    if len(parts) != 4:
+        raise ValueError(f"roi 格式应为 x,y,w,h: {value}")
+    x, y, w, h = (int(p) for p in parts)
+    if x < 0 or y < 0 or w <= 0 or h <= 0:
+        raise ValueError(f"roi 超出范围: {value}")
+    return x, y, w, h
+
+
+def parse_scale(value: Optional[str]) -> float:
+    """解析缩放比例；None 表示不缩放
+
+    Raises:
+        ValueError: 不在 (0, 1] 范围内
+    """
+    if value is None:
+        return 1.0
+    scale = float(value)
+    if not 0 < scale <= 1:
+        raise ValueError(f"scale 应在 (0, 1] 范围内: {value}")
+    return scale
+
+
+def _resize(pixels: np.ndarray, scale: float) -> np.ndarray:
+    if scale == 1.0:
+        return pixels
+    h, w = pixels.shape[:2]
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    return cv2.resize(pixels, size, interpolation=cv2.INTER_AREA)
+
+
+@metrics.timed('encode')
+def render_screenshot(source, image_format: str = FORMAT_PNG,
+                      roi: Optional[Tuple[int, int, int, int]] = None,
+                      scale: float = 1.0) -> Tuple[bytes, str, Dict[str, str]]:
+    """
+    裁剪、缩放并编码截图
+
+    参数:
+        source: RawFrame，或 PNG/JPEG 编码字节（raw 格式只接受 RawFrame）
+        image_format: png / jpeg / raw
+        roi: 裁剪区域 (x, y, w, h)，None 表示整屏
+        scale: 缩放比例
+
+    返回:
+        (响应体, Content-Type, 元数据响应头)
+
+    Raises:
+        ValueError: 格式不支持
+    """
+    if image_format not in CONTENT_TYPES:
+        raise ValueError(f"不支持的截图格式: {image_format}")
+
+    if isinstance(source, RawFrame):
+        screen_w, screen_h = source.width, source.height
+    else:
+        source = load_bgr(source)
+        screen_h, screen_w = source.shape[:2]
+    x, y, w, h = roi or (0, 0, screen_w, screen_h)
+    w, h = max(0, min(w, screen_w - x)), max(0, min(h, screen_h - y))
+    if w == 0 or h == 0:
+        raise ValueError(f"roi 不在画面内: 屏幕 {screen_w}x{screen_h}")
+
+    if image_format == FORMAT_RAW:
+        if not isinstance(source, RawFrame):
+            raise ValueError("raw 格式需要原始帧截图")
+        region = source.region(x, y, w, h)
+        pixels = _resize(region.pixels, scale)
+        body = RawFrame(pixels.shape[1], pixels.shape[0], source.format, pixels).to_bytes()
+    else:
+        if isinstance(source, RawFrame):
+            img = source.to_bgr(x, y, w, h)
+        else:
+            img = source[y:y + h, x:x + w]
+        img = _resize(img, scale)
+        body = encode_png(img) if image_format == FORMAT_PNG else encode_jpeg(img)
+
+    headers = {
+        'X-Screen-Width': str(screen_w),
+        'X-Screen-Height': str(screen_h),
+        'X-Roi': f'{x},{y},{w},{h}',
+        'X-Scale': f'{scale:g}',
+    }
+    return body, CONTENT_TYPES[image_format], headers
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+求解结果缓存（按题目内容寻址）
+游戏会反复出现相同的题目，相同的数织约束 / 田地捉虫颜色矩阵只需求解一次
+
+- 键：题目规范化后的 SHA-256
+  - 数织：(rows, cols)，[] 与 [0] 都视为空线；含求解器版本（nonogram_solver.SOLVER_VERSION），
+    求解器升级后旧结果自然失效
+  - 田地捉虫：color_matrix，颜色编号按首次出现顺序重新编号（编号本身不影响解）
+- 两级缓存：进程内 LRU + 磁盘 sqlite（跨进程、重启后仍有效）
+- 只缓存完整的解：无解（None，多为约束识别错误）与含未知格（-1）的部分结果不缓存，
+  一次误读或一次搜索超限不会让这道题的结果永久错误
+- 命中 / 未命中计数通过 /metrics 输出（showpage_solution_cache_total）
+
+磁盘缓存路径默认为 ~/.cache/showpage/solutions.sqlite3，
+可用环境变量 SHOWPAGE_SOLUTION_CACHE 指定，设为空字符串则只使用内存缓存。
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterable, List, Optional, Tuple
+import logging
+
+import metrics
+import nonogram_solver
+from bugcatcher_constants import JSONKeys
+from bugcatcher_solver import solve_puzzle
+
+logger = logging.getLogger(__name__)
+
+
+MEMORY_CAPACITY = 512  # 进程内缓存条目数
+DB_PATH_ENV = 'SHOWPAGE_SOLUTION_CACHE'
+DEFAULT_DB_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'showpage', 'solutions.sqlite3')
+
+DEFAULT_TABLE = 'solutions'  # 磁盘层表名
+
+KIND_NONOGRAM = 'nonogram'
+KIND_BUGCATCHER = 'bugcatcher'
+
+# 命中层级
+HIT_MEMORY = 'hit_memory'
+HIT_DISK = 'hit_disk'
+MISS = 'miss'
+
+CACHE_REQUESTS = metrics.Counter('showpage_solution_cache_total', '求解结果缓存查询次数',
+                                 ('solver', 'result'))
+metrics.register(CACHE_REQUESTS)
+
+
+def _digest(payload) -> str:
+    text = json.dumps(payload, separators=(',', ':'), sort_keys=True)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def nonogram_key(rows: List[List[int]], cols: List[List[int]]) -> str:
+    def normalize(clues):
+        return [[] if list(c) in ([], [0]) else [int(v) for v in c] for c in clues]
+    return _digest({'rows': normalize(rows), 'cols': normalize(cols),
+                    'solver': nonogram_solver.SOLVER_VERSION})
+
+
+def bugcatcher_key(color_matrix: List[List[int]]) -> str:
+    labels = {}
+    canonical = [[labels.setdefault(color, len(labels)) for color in row] for row in color_matrix]
+    return _digest(canonical)
+
+
+class SolutionCache:
+    """
+    两级求解结果缓存，线程安全（代理的线程池 / asyncio 执行器会并发访问）
+
+    值以 JSON 文本保存，取出时重新解码，调用方拿到的总是独立副本。
+    磁盘层出错时记录警告并退化为只用内存层。
+    """
+
+    def __init__(self, db_path: Optional[str] = None, capacity: int = MEMORY_CAPACITY,
+                 table: str = DEFAULT_TABLE):
+        if not table.isidentifier():
+            raise ValueError(f"无效的缓存表名: {table!r}")
+        self.capacity = capacity
+        self.table = table
+        self._memory: 'OrderedDict[Tuple[str, str], str]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute(f'CREATE TABLE IF NOT EXISTS {table} ('
+                                 'kind TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, '
+                                 'PRIMARY KEY (kind, key))')
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"求解缓存数据库不可用，只使用内存缓存: {db_path}: {e}")
+                self._db = None
+
+    def lookup(self, kind: str, key: str) -> Tuple[str, object]:
+        """返回 (命中层级, 结果)；未命中时结果为 None"""
+        with self._lock:
+            text = self._memory.get((kind, key))
+            if text is not None:
+                self._memory.move_to_end((kind, key))
+                return HIT_MEMORY, json.loads(text)
+            if self._db is None:
+                return MISS, None
+            try:
+                row = self._db.execute(f'SELECT value FROM {self.table} WHERE kind = ? AND key = ?',
+                                       (kind, key)).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"读取求解缓存失败: {e}")
+                return MISS, None
+            if row is None:
+                return MISS, None
+            self._remember(kind, key, row[0])
+            return HIT_DISK, json.loads(row[0])
+
+    def store(self, kind: str, key: str, value) -> None:
+        self.store_many(kind, [(key, value)])
+
+    def store_many(self, kind: str, items: Iterable[Tuple[str, object]]) -> None:
+        """写入多条结果，磁盘层在一个事务内提交"""
+        rows = [(kind, key, json.dumps(value, separators=(',', ':'))) for key, value in items]
+        if not rows:
+            return
+        with self._lock:
+            for _, key, text in rows:
+                self._remember(kind, key, text)
+            if self._db is None:
+                return
+            try:
+                with self._db:
+                    self._db.executemany(f'INSERT OR REPLACE INTO {self.table} (kind, key, value) '
+                                         'VALUES (?, ?, ?)', rows)
+            except sqlite3.Error as e:
+                logger.warning(f"写入求解缓存失败: {e}")
+
+    def _remember(self, kind: str, key: str, text: str) -> None:
+        self._memory[(kind, key)] = text
+        self._memory.move_to_end((kind, key))
+        while len(self._memory) > self.capacity:
+            self._memory.popitem(last=False)
+
+    def get_or_solve(self, kind: str, key: str, solve: Callable[[], object],
+                     cacheable: Callable[[object], bool] = lambda value: value is not None):
+        """先查缓存，未命中时求解；cacheable(结果) 为真时才写入缓存"""
+        level, value = self.lookup(kind, key)
+        CACHE_REQUESTS.inc(kind, level)
+        if level != MISS:
+            logger.debug(f"求解缓存命中（{level}）: {kind} {key[:12]}")
+            return value
+        value = solve()
+        if cacheable(value):
+            self.store(kind, key, value)
+        return value
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+_default: Optional[SolutionCache] = None
+_default_lock = threading.Lock()
+
+
+def get_default_cache() -> SolutionCache:
+    """进程内共享的缓存，首次使用时按环境变量打开磁盘层"""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = SolutionCache(os.environ.get(DB_PATH_ENV, DEFAULT_DB_PATH))
+        return _default
+
+
+def _complete_grid(grid) -> bool:
+    return grid is not None and all(-1 not in row for row in grid)
+
+
+def solve_nonogram(rows: List[List[int]], cols: List[List[int]]) -> Optional[List[List[int]]]:
+    """带缓存的 nonogram_solver.solve，只缓存完整的解"""
+    return get_default_cache().get_or_solve(
+        KIND_NONOGRAM, nonogram_key(rows, cols), lambda: nonogram_solver.solve(rows, cols),
+        _complete_grid)
+
+
+def solve_bugcatcher(puzzle_data: dict) -> Optional[List[Tuple[int, int]]]:
+    """带缓存的 bugcatcher_solver.solve_puzzle，返回 [(行, 列), ...]"""
+    solution = get_default_cache().get_or_solve(
+        KIND_BUGCATCHER, bugcatcher_key(puzzle_data[JSONKeys.COLOR_MATRIX]),
+        lambda: solve_puzzle(puzzle_data))
+    return [tuple(pos) for pos in solution] if solution else None
+
+
+def stats() -> dict:
+    """各求解器的命中 / 未命中计数"""
+    return {kind: {level: int(CACHE_REQUESTS.value(kind, level))
+                   for level in (HIT_MEMORY, HIT_DISK, MISS)}
+            for kind in (KIND_NONOGRAM, KIND_BUGCATCHER)}
@@ -0,0 +1,63 @@
+import socket
+import time
+
+import pytest
+
+from adb_client import ADBClient, ADBError
+from fake_adb_server import DEFAULT_SERIAL, FakeADBServer
+
+
+@pytest.fixture
+def fake():
+    def handler(serial, kind, command):
+        if command == 'echo hi':
+            return f'hi from {serial}\n'.encode('utf-8')
+        return None
+
+    with FakeADBServer(devices={DEFAULT_SERIAL: 'device', 'emulator-5556': 'offline'},
+                       screencap=b'\x89PNG frame', handler=handler) as server:
+        yield server
+
+
+@pytest.fixture
+def client(fake):
+    client = ADBClient(port=fake.port, timeout=5, pool_size=2)
+    yield client
+    client.close()
+
+
+def test_services(fake, client):
+    assert client.devices() == [(DEFAULT_SERIAL, 'device'), ('emulator-5556', 'offline')]
+    assert client.shell('echo hi') == f'hi from {DEFAULT_SERIAL}\n'.encode('utf-8')
+    assert client.exec_out('screencap -p', DEFAULT_SERIAL) == b'\x89PNG frame'
+    assert fake.requests[-2:] == [f'host:transport:{DEFAULT_SERIAL}', 'exec:screencap -p']
+    with pytest.raises(ADBError, match='not found'):
+        client.exec_out('screencap -p', 'emulator-5556')
+
+
+def test_requests_use_warmed_connections(fake, client, monkeypatch):
+    client.warm()
+    assert len(client._pool) == client.pool_size
+    warmed = {sock for sock, _ in client._pool}
+
+    connects = []
+    connect = client._connect
+    monkeypatch.setattr(client, '_connect', lambda: connects.append(1) or connect())
+    monkeypatch.setattr(client, '_warm_in_background', lambda: None)
+    for _ in range(client.pool_size):
+        assert client.shell('echo hi')
+    assert not connects and not client._pool
+    assert all(sock.fileno() == -1 for sock in warmed)  # 每条连接只承载一个服务，用完即关闭
+
+    assert client.shell('echo hi')
+    assert len(connects) == 1
+
+
+def test_dead_pooled_connection_is_discarded(client):
+    local, peer = socket.socketpair()
+    peer.close()  # 对端关闭后闲置连接变为可读
+    client._pool.append((local, time.monotonic()))
+    sock = client._acquire()
+    sock.close()
+    assert sock is not local
+    assert local.fileno() == -1
@@ -0,0 +1,78 @@
+import asyncio
+import json
+
+import device_lane
+import metrics
+from adb_client import AsyncADBClient
+from async_proxy import AsyncADBProxy
+from fake_adb_server import DEFAULT_SERIAL, FakeADBServer
+
+STREAM = '/race-nonogram/stream'
+
+
+def _request(proxy, target, method='GET', body=b''):
+    async def run():
+        server = await asyncio.start_server(proxy.handle_connection, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(f'{method} {target} HTTP/1.1\r\nHost: test\r\n'
+                         f'Content-Length: {len(body)}\r\n\r\n'.encode('latin-1') + body)
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+            return response
+        finally:
+            server.close()
+            await server.wait_closed()
+    return asyncio.run(run())
+
+
+def test_stream_body_is_tracked_until_finished():
+    # 流式响应体在 dispatch 返回之后才执行，阶段指标与请求耗时仍应记在该请求上
+    proxy = AsyncADBProxy()
+    seen = []
+
+    async def lines():
+        seen.append(metrics._labels())
+        with metrics.timed('race'):
+            await asyncio.sleep(0.05)
+        yield b'{"status": "ok"}\n'
+
+    async def dispatch(method, target, body):
+        return 200, 'application/x-ndjson', lines(), {}
+
+    proxy.dispatch = dispatch
+    stage_before = metrics.STAGE_SECONDS.count('race', STREAM, metrics.DEFAULT_DEVICE)
+    seconds_before = metrics.REQUEST_SECONDS.sum(STREAM, metrics.DEFAULT_DEVICE)
+
+    response = _request(proxy, STREAM)
+
+    assert response.endswith(b'{"status": "ok"}\n')
+    assert seen == [(STREAM, metrics.DEFAULT_DEVICE)]
+    assert metrics.STAGE_SECONDS.count('race', STREAM, metrics.DEFAULT_DEVICE) == stage_before + 1
+    assert metrics.REQUEST_SECONDS.sum(STREAM, metrics.DEFAULT_DEVICE) - seconds_before >= 0.05
+
+
+def test_taps_go_through_shell_session_and_tap_admission(monkeypatch):
+    with FakeADBServer() as fake:
+        proxy = AsyncADBProxy(AsyncADBClient(port=fake.port))
+        body = json.dumps({'taps': [{'x': 10, 'y': 20}, {'x': 30, 'y': 40}]}).encode('utf-8')
+        try:
+            response = _request(proxy, '/tap', 'POST', body)
+            assert response.startswith(b'HTTP/1.1 200')
+            # 写入持久 exec:sh 会话，而不是一次性的 shell: 脚本
+            assert fake.commands == [(DEFAULT_SERIAL, 'sh', 'input tap 10 20'),
+                                     (DEFAULT_SERIAL, 'sh', 'input tap 30 40')]
+
+            lane = device_lane.get_device_lane(None)
+            for _ in range(device_lane.TAP_SLOTS):
+                assert lane.admit_tap(timeout=0)
+            admit_tap = lane.admit_tap
+            monkeypatch.setattr(lane, 'admit_tap', lambda: admit_tap(timeout=0.01))
+            response = _request(proxy, '/tap', 'POST', body)
+            assert response.startswith(b'HTTP/1.1 503')
+            assert len(fake.commands) == 2
+        finally:
+            proxy.close()
+            device_lane.shutdown_lanes()
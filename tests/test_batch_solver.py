@@ -0,0 +1,72 @@
+import io
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import batch_solver
+import nonogram_solver
+
+REPO = Path(__file__).resolve().parent.parent
+
+PUZZLES = [
+    {'id': 'plus', 'rows': [[1], [3], [1]], 'cols': [[1], [3], [1]]},
+    {'id': 'ring', 'rows': [[3], [1, 1], [3]], 'cols': [[3], [1, 1], [3]]},
+    {'id': 'none', 'rows': [[3], [3], [3]], 'cols': [[1], [1], [1]]},
+    {'id': 'bad', 'rows': [[1]]},
+    {'id': 'empty', 'rows': [[], []], 'cols': [[0], [0]]},
+] * 4
+
+
+def _sleep(seconds):
+    time.sleep(seconds)
+    return {'slept': seconds}
+
+
+def _expected(puzzle):
+    return nonogram_solver._solve_record(puzzle)
+
+
+def test_solve_many_keeps_input_order():
+    results = list(nonogram_solver.solve_many(PUZZLES, workers=2, chunksize=3))
+    assert [index for index, _ in results] == list(range(len(PUZZLES)))
+    assert [result for _, result in results] == [_expected(p) for p in PUZZLES]
+    assert results[2][1] == {'grid': None}
+    assert 'KeyError' in results[3][1]['error']
+
+
+def test_unordered_does_not_wait_for_slow_items():
+    results = list(batch_solver.solve_many(_sleep, [0.5, 0, 0, 0], workers=2, chunksize=1,
+                                           ordered=False))
+    assert sorted(index for index, _ in results) == [0, 1, 2, 3]
+    assert results[-1] == (0, {'slept': 0.5})
+
+
+def test_run_jsonl_numbers_lines_and_keeps_ids(tmp_path):
+    path = tmp_path / 'puzzles.jsonl'
+    lines = [json.dumps(p) for p in PUZZLES[:5]]
+    path.write_text('\n'.join(lines[:2] + ['', '{broken'] + lines[2:]) + '\n', encoding='utf-8')
+    output = io.StringIO()
+
+    count = batch_solver.run_jsonl(nonogram_solver._solve_record, str(path), workers=1,
+                                   output=output)
+
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert count == len(records) == 6  # 空行跳过，格式错误的行输出 error
+    assert [r['index'] for r in records] == list(range(6))
+    assert [r.get('id') for r in records] == ['plus', 'ring', None, 'none', 'bad', 'empty']
+    assert 'JSON' in records[2]['error']
+    assert records[1]['grid'] == [[1, 1, 1], [1, 0, 1], [1, 1, 1]]
+
+
+def test_jsonl_cli_output_order(tmp_path):
+    path = tmp_path / 'puzzles.jsonl'
+    path.write_text(''.join(json.dumps(p) + '\n' for p in PUZZLES), encoding='utf-8')
+    proc = subprocess.run([sys.executable, 'nonogram_solver.py', '--jsonl', str(path),
+                           '--workers', '2', '--chunksize', '2'],
+                          cwd=REPO, capture_output=True, text=True, timeout=60, check=True)
+    records = [json.loads(line) for line in proc.stdout.splitlines()]
+    assert [r['index'] for r in records] == list(range(len(PUZZLES)))
+    assert [r['id'] for r in records] == [p['id'] for p in PUZZLES]
+    assert f'共求解 {len(PUZZLES)} 题' in proc.stderr
@@ -0,0 +1,76 @@
+import random
+from collections import defaultdict
+
+import pytest
+
+import nonogram_benchmark
+import nonogram_solver
+from nonogram_solver import CandidateTable, _CandidateCache, build_candidate_table, candidate_table_path
+
+
+def _brute_force(n):
+    """枚举 2^n 个位掩码，按其约束分组"""
+    groups = defaultdict(list)
+    for mask in range(1 << n):
+        clue = nonogram_benchmark._clues([mask >> j & 1 for j in range(n)]) or [0]
+        groups[tuple(clue)].append(mask)
+    return groups
+
+
+@pytest.mark.parametrize('n', [1, 6, 9])
+def test_table_round_trip_through_mmap(n, tmp_path):
+    path = candidate_table_path(str(tmp_path), n)
+    expected = _brute_force(n)
+    assert build_candidate_table(n, path) == len(expected)
+
+    table = CandidateTable(path)
+    assert table.n == n
+    for key, masks in expected.items():
+        cands = table.get(key)
+        assert isinstance(cands, memoryview)  # 直接引用映射的文件，不复制
+        assert sorted(cands) == masks
+    assert len(table.get((n + 1,))) == 0
+
+
+def test_table_rejects_bad_input(tmp_path):
+    with pytest.raises(ValueError):
+        build_candidate_table(nonogram_solver.TABLE_MAX_SIZE + 1, str(tmp_path / 'big.bin'))
+    other = tmp_path / 'other.bin'
+    other.write_bytes(b'x' * 64)
+    with pytest.raises(ValueError):
+        CandidateTable(str(other))
+
+
+def test_cache_loads_table_from_env(tmp_path, monkeypatch):
+    build_candidate_table(7, candidate_table_path(str(tmp_path), 7))
+    monkeypatch.setenv(nonogram_solver.CANDIDATE_DIR_ENV, str(tmp_path))
+    cache = _CandidateCache()
+    assert isinstance(cache.get([2, 1], 7), memoryview)
+    # 没有表的尺寸照常惰性生成
+    assert list(cache.get([2, 1], 5)) == sorted(_brute_force(5)[(2, 1)])
+
+
+def test_cache_evicts_by_candidate_count():
+    cache = _CandidateCache(limit=20)
+    for clue in ([1], [2], [3]):  # n=10 时分别有 10、9、8 个候选
+        cache.get(clue, 10)
+    assert [key for _, key in cache._entries] == [(2,), (3,)]
+    assert cache._size == 17
+
+
+def test_propagation_with_table_matches_lazy(tmp_path, monkeypatch):
+    n = 10
+    build_candidate_table(n, candidate_table_path(str(tmp_path), n))
+    rows, cols = nonogram_benchmark.random_puzzle(n, nonogram_benchmark.HARD_DENSITY,
+                                                  random.Random('table'))
+    expected = [[-1] * n for _ in range(n)]
+    nonogram_solver._LINE_MEMO.clear()
+    assert nonogram_solver._propagate_small(expected, rows, cols)
+
+    monkeypatch.setenv(nonogram_solver.CANDIDATE_DIR_ENV, str(tmp_path))
+    monkeypatch.setattr(nonogram_solver, '_CANDIDATES', _CandidateCache())
+    grid = [[-1] * n for _ in range(n)]
+    nonogram_solver._LINE_MEMO.clear()
+    assert nonogram_solver._propagate_small(grid, rows, cols)
+    assert grid == expected
+    assert nonogram_solver._CANDIDATES._tables[n] is not None
@@ -0,0 +1,35 @@
+import numpy as np
+
+import nonogram_recognizer
+
+
+def test_strip_fingerprint_sees_thin_strokes():
+    img = np.zeros((80, 120, 3), dtype=np.uint8)
+    img[20:60, 30:34] = nonogram_recognizer.TARGET_COLOR1
+    strip = (0, 0, 120, 80)
+    before = nonogram_recognizer._strip_fingerprint(img, strip)
+    # 1 像素宽的笔画，且不落在步长 4 的采样点上
+    img[21:59, 41] = nonogram_recognizer.TARGET_COLOR1
+    assert nonogram_recognizer._strip_fingerprint(img, strip) != before
+
+
+def test_target_mask_matches_color_distance():
+    rng = np.random.default_rng(0)
+    colors = np.concatenate([nonogram_recognizer.TARGET_COLOR1, nonogram_recognizer.TARGET_COLOR2])
+    crop = np.clip(rng.choice(colors.reshape(2, 3), size=(40, 50)).astype(int)
+                   + rng.integers(-25, 26, size=(40, 50, 3)), 0, 255).astype(np.uint8)
+    expected = np.zeros((40, 50), dtype=bool)
+    for color in (nonogram_recognizer.TARGET_COLOR1, nonogram_recognizer.TARGET_COLOR2):
+        diff = crop.astype(int) - color.astype(int)
+        expected |= np.sum(diff * diff, axis=2) < nonogram_recognizer.COLOR_DISTANCE_SQUARED
+    assert np.array_equal(nonogram_recognizer._target_mask(crop), expected)
+    assert nonogram_recognizer._target_mask(crop[:0]).shape == (0, 50)
+
+
+def test_get_tracker_per_device(monkeypatch):
+    monkeypatch.delenv(nonogram_recognizer.CLUE_TRACKING_ENV, raising=False)
+    first = nonogram_recognizer.get_tracker('emulator-5554')
+    assert nonogram_recognizer.get_tracker('emulator-5554') is first
+    assert nonogram_recognizer.get_tracker('emulator-5556') is not first
+    monkeypatch.setenv(nonogram_recognizer.CLUE_TRACKING_ENV, '0')
+    assert nonogram_recognizer.get_tracker('emulator-5554') is None
@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+import device_lane
+import frame_grabber
+
+
+@pytest.fixture(autouse=True)
+def lanes():
+    device_lane.shutdown_lanes()
+    yield
+    device_lane.shutdown_lanes()
+    device_lane.configure_lanes(device_lane.DEFAULT_POOL_SIZE)
+
+
+def test_capture_slots_sized_from_pool():
+    device_lane.configure_lanes(10)
+    first = device_lane.get_device_lane('a')
+    assert device_lane.max_active_per_device() == 10 - device_lane.TAP_RESERVED_WORKERS
+
+    lanes = [first] + [device_lane.get_device_lane(serial) for serial in ('b', 'c')]
+    limit = device_lane.max_active_per_device()
+    assert limit * len(lanes) <= 10 - device_lane.TAP_RESERVED_WORKERS
+    for lane in lanes:
+        assert all(lane.try_admit() for _ in range(limit))
+        assert not lane.try_admit()
+    lanes[0].release()
+    assert lanes[0].try_admit()
+
+
+def test_taps_admitted_when_capture_slots_are_full():
+    lane = device_lane.get_device_lane('a')
+    while lane.try_admit():
+        pass
+    assert lane.admit_tap(timeout=0)
+    lane.release_tap()
+
+
+def test_tap_waits_for_a_slot():
+    lane = device_lane.get_device_lane('a')
+    for _ in range(device_lane.TAP_SLOTS):
+        assert lane.admit_tap(timeout=0)
+    assert not lane.admit_tap(timeout=0.01)
+
+    threading.Timer(0.05, lane.release_tap).start()
+    started = time.monotonic()
+    assert lane.admit_tap(timeout=2)
+    assert time.monotonic() - started >= 0.04
+
+
+def test_input_channel_does_not_wait_for_captures():
+    lane = device_lane.get_device_lane('a')
+    gate = threading.Event()
+    capture = threading.Thread(target=lane.run, args=(gate.wait, 5))
+    capture.start()
+    try:
+        assert lane.run_input(lambda: 'tapped', timeout=1) == 'tapped'
+    finally:
+        gate.set()
+        capture.join()
+
+
+def test_frame_grabber_captures_on_capture_channel(monkeypatch):
+    threads = []
+
+    class Client:
+        def exec_out(self, command, serial):
+            threads.append(threading.current_thread().name)
+            return b'frame'
+
+    monkeypatch.setattr(frame_grabber, 'get_default_client', lambda: Client())
+    monkeypatch.setattr(frame_grabber, '_grabbers', {})
+    grabber = frame_grabber.get_frame_grabber('a')
+    try:
+        assert grabber.get(0, timeout=5)[1] == b'frame'
+    finally:
+        grabber.stop()
+    assert threads[0].startswith('lane-a')
+    assert not threads[0].startswith('lane-a-input')
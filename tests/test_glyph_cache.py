@@ -0,0 +1,60 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+import glyph_cache
+from solution_cache import HIT_DISK, SolutionCache
+
+
+def test_glyph_key_depends_on_version():
+    gray = np.full((40, 30), 255, dtype=np.uint8)
+    gray[10:30, 12:18] = 0
+    assert glyph_cache.glyph_key(gray, 'model-a') == glyph_cache.glyph_key(gray.copy(), 'model-a')
+    assert glyph_cache.glyph_key(gray, 'model-a') != glyph_cache.glyph_key(gray, 'model-b')
+
+
+def test_store_many_uses_own_table(tmp_path):
+    path = str(tmp_path / 'glyphs.sqlite3')
+    cache = SolutionCache(path, table=glyph_cache.TABLE)
+    cache.store_many(glyph_cache.KIND_GLYPH, [('a', '3'), ('b', '')])
+    cache.close()
+
+    reopened = SolutionCache(path, table=glyph_cache.TABLE)
+    assert reopened.lookup(glyph_cache.KIND_GLYPH, 'a') == (HIT_DISK, '3')
+    assert reopened.lookup(glyph_cache.KIND_GLYPH, 'b') == (HIT_DISK, '')
+    reopened.close()
+
+    with sqlite3.connect(path) as db:
+        tables = {name for name, in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert tables == {glyph_cache.TABLE}
+
+
+@pytest.fixture
+def default_cache(monkeypatch):
+    monkeypatch.setattr(glyph_cache, '_default', None)
+    yield
+    if glyph_cache._default is not None:
+        glyph_cache._default.close()
+
+
+def test_disk_tier_is_opt_in(default_cache, monkeypatch, tmp_path):
+    monkeypatch.delenv(glyph_cache.DB_PATH_ENV, raising=False)
+    monkeypatch.setenv('HOME', str(tmp_path))
+    glyph_cache.store('a', '3')
+    assert glyph_cache.lookup('a') == '3'
+    assert glyph_cache.get_default_cache()._db is None
+    assert not list(tmp_path.iterdir())
+
+
+def test_empty_results_are_not_stored(default_cache, monkeypatch, tmp_path):
+    path = str(tmp_path / 'glyphs.sqlite3')
+    monkeypatch.setenv(glyph_cache.DB_PATH_ENV, path)
+    glyph_cache.store_many({'a': '3', 'b': ''})
+    glyph_cache.store('c', '')
+    assert glyph_cache.lookup('b') is None
+    assert glyph_cache.lookup('c') is None
+
+    with sqlite3.connect(path) as db:
+        keys = [key for key, in db.execute(f'SELECT key FROM {glyph_cache.TABLE}')]
+    assert keys == ['a']
@@ -0,0 +1,76 @@
+import cv2
+import numpy as np
+import pytest
+
+import bugcatcher_recognizer
+from bugcatcher_constants import JSONKeys
+from image_source import encode_jpeg, encode_png, load_bgr
+from raw_frame import PIXEL_FORMAT_RGBA_8888, RawFrame, parse_raw_screencap
+
+CELL = 80
+LINE = 6
+TOP = 900
+# 每行一种区域颜色（BGR）
+REGION_COLORS = [(40, 200, 60), (200, 60, 40), (60, 60, 220), (210, 210, 210)]
+
+
+def _bugcatcher_screen(n=4):
+    """合成“田地捉虫”截图：n×n 格，网格线为 GRID_LINE_COLOR，每行涂一种区域颜色"""
+    size = n * CELL + LINE
+    img = np.full((TOP + size + 100, size + 40, 3), 255, dtype=np.uint8)
+    grid = img[TOP:TOP + size, 20:20 + size]
+    grid[:] = bugcatcher_recognizer.GRID_LINE_COLOR
+    for r in range(n):
+        for c in range(n):
+            y, x = r * CELL + LINE, c * CELL + LINE
+            grid[y:y + CELL - LINE, x:x + CELL - LINE] = REGION_COLORS[r]
+    return img
+
+
+def _raw_bytes(img):
+    rgba = np.dstack([img[:, :, ::-1], np.full(img.shape[:2], 255, dtype=np.uint8)])
+    return RawFrame(img.shape[1], img.shape[0], PIXEL_FORMAT_RGBA_8888, rgba).to_bytes()
+
+
+@pytest.fixture(scope='module')
+def screen():
+    return _bugcatcher_screen()
+
+
+def test_load_bgr_sources_agree(screen, tmp_path):
+    path = tmp_path / 'screen.png'
+    cv2.imwrite(str(path), screen)
+    png = encode_png(screen)
+    raw = _raw_bytes(screen)
+
+    for source in (path, str(path), png, bytearray(png), memoryview(png),
+                   np.frombuffer(png, dtype=np.uint8), raw, memoryview(raw),
+                   parse_raw_screencap(raw), screen):
+        assert np.array_equal(load_bgr(source), screen), type(source).__name__
+
+    # 原始帧只转换截取区域
+    assert np.array_equal(load_bgr(parse_raw_screencap(raw), 30, 20), screen[:20, :30])
+    jpeg = load_bgr(encode_jpeg(screen))
+    assert jpeg.shape == screen.shape
+    assert np.abs(jpeg.astype(int) - screen).mean() < 3
+
+
+@pytest.mark.parametrize('data', [b'\x89PNG\r\n\x1a\n broken', np.zeros((4, 4), dtype=np.uint8), 42])
+def test_load_bgr_rejects_bad_input(data):
+    with pytest.raises((ValueError, TypeError)):
+        load_bgr(data)
+
+
+def test_bugcatcher_recognizes_in_memory_sources(screen, tmp_path):
+    path = tmp_path / 'screen.png'
+    cv2.imwrite(str(path), screen)
+    expected, _ = bugcatcher_recognizer.recognize_bugs(str(path), output_path=None, clusters=4)
+    assert expected[JSONKeys.GRID_INFO][JSONKeys.ROWS] == 4
+    matrix = expected[JSONKeys.COLOR_MATRIX]
+    assert all(len(set(row)) == 1 for row in matrix)
+    assert len({row[0] for row in matrix}) == 4
+
+    for source in (encode_png(screen), memoryview(_raw_bytes(screen)), screen):
+        result, _ = bugcatcher_recognizer.recognize_bugs_from_source(source, clusters=4)
+        assert result[JSONKeys.COLOR_MATRIX] == matrix
+        assert result[JSONKeys.CELLS] == expected[JSONKeys.CELLS]
@@ -0,0 +1,46 @@
+import nonogram_benchmark
+import nonogram_solver
+from nonogram_benchmark import generate_corpus, read_corpus, write_corpus
+
+
+def test_corpus_is_deterministic(tmp_path):
+    corpus = generate_corpus([5, 20], count=3, hard_count=2, seed=7)
+    assert generate_corpus([5, 20], count=3, hard_count=2, seed=7) == corpus
+    assert generate_corpus([5, 20], count=3, hard_count=2, seed=8) != corpus
+    # 每个尺寸单独播种：增减其他尺寸不影响该尺寸的题目
+    assert generate_corpus([20], count=3, hard_count=2, seed=7) == [p for p in corpus if p['n'] == 20]
+
+    path = str(tmp_path / 'corpus.jsonl')
+    write_corpus(corpus, path)
+    assert read_corpus(path) == corpus
+    assert len({p['id'] for p in corpus}) == len(corpus)
+
+
+def test_corpus_contents():
+    corpus = generate_corpus([10, 20, 40], count=2, hard_count=2, seed=7)
+    for puzzle in corpus:
+        rows, cols = puzzle['rows'], puzzle['cols']
+        assert len(rows) == len(cols) == puzzle['n']
+        grid = nonogram_solver.solve(rows, cols)
+        assert [nonogram_benchmark._clues(row) for row in grid] == rows
+        if puzzle['kind'] == nonogram_benchmark.KIND_HARD:
+            assert nonogram_benchmark._needs_search(rows, cols)
+    assert not [p for p in corpus if p['kind'] == nonogram_benchmark.KIND_HARD and p['n'] == 40]
+
+
+def test_line_counts_are_reproducible():
+    corpus = generate_corpus([10, 20], count=1, hard_count=0, seed=7)
+    first = nonogram_benchmark.run_benchmark(corpus, ['small', 'vectorized', 'solve'], repeat=1)
+    second = nonogram_benchmark.run_benchmark(corpus, ['small', 'vectorized', 'solve'], repeat=1)
+    assert {key: r['lines'] for key, r in first.items()} == {key: r['lines'] for key, r in second.items()}
+    assert all(r['unsolved'] == 0 for r in first.values())
+
+
+def test_compare_flags_only_real_regressions():
+    base = {'solve/hard/20': {'median_ms': 10.0, 'p99_ms': 20.0, 'lines': 100, 'peak_kb': 50.0,
+                              'unsolved': 0}}
+    same = {'solve/hard/20': dict(base['solve/hard/20'], median_ms=10.3, peak_kb=60.0)}
+    assert nonogram_benchmark.compare(same, base) == []
+    worse = {'solve/hard/20': dict(base['solve/hard/20'], lines=106, unsolved=1)}
+    assert len(nonogram_benchmark.compare(worse, base)) == 2
+    assert nonogram_benchmark.compare({'solve/hard/25': worse['solve/hard/20']}, base) == []
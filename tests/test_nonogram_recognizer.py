@@ -0,0 +1,202 @@
+import cv2
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+
+import glyph_cache
+import nonogram_recognizer
+
+FONT_PATH = '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf'
+FONT_SIZE = 44
+BACKGROUND = (40, 60, 90)
+FILL = (252, 254, 83)  # TARGET_COLOR1（RGB）
+
+ROWS = [[3], [1, 1], [5], [2, 2], [1]]
+COLS = [[2], [1, 2], [3], [1, 1], [4]]
+EXPECTED = {'row': '3\n1 1\n5\n2 2\n1', 'col': '2\n1 2\n3\n1 1\n4'}
+
+BOARD_X, BOARD_Y = 300, 1000  # 棋盘左上角
+CELL = (1200 - 350) // len(ROWS)
+
+TEMPLATE_SIZE = (24, 32)
+
+
+def _font():
+    try:
+        return ImageFont.truetype(FONT_PATH, FONT_SIZE)
+    except OSError:
+        pytest.skip('缺少 DejaVu 字体')
+
+
+def _draw_digit(draw, xy, text, font):
+    draw.text(xy, text, font=font, fill=FILL, stroke_width=3, stroke_fill=(0, 0, 0))
+
+
+def _screen():
+    """合成数织截图（BGR）：列约束在棋盘上方，行约束在棋盘左侧，数字为黄色填充 + 黑色描边"""
+    font = _font()
+    image = Image.new('RGB', (1200, 2400), BACKGROUND)
+    draw = ImageDraw.Draw(image)
+    for c, clue in enumerate(COLS):
+        for k, v in enumerate(reversed(clue)):
+            _draw_digit(draw, (BOARD_X + c * CELL + 8, BOARD_Y - 70 - k * 60), str(v), font)
+    for r, clue in enumerate(ROWS):
+        for k, v in enumerate(reversed(clue)):
+            _draw_digit(draw, (BOARD_X - 60 - k * 40, BOARD_Y + r * CELL + 8), str(v), font)
+    return cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2BGR)
+
+
+def _normalize(binary):
+    """黑色像素的外接框缩放到固定尺寸，用于与模板比较"""
+    ys, xs = np.nonzero(binary)
+    crop = binary[ys.min():ys.max() + 1, xs.min():xs.max() + 1].astype(np.float32)
+    return cv2.resize(crop, TEMPLATE_SIZE, interpolation=cv2.INTER_AREA)
+
+
+class FakeTesseract:
+    """
+    代替 pytesseract：按连通域切出数字，与同一字体渲染的模板比较
+    记录每次调用，dropped 中的数字在批量识别时不返回（模拟 Tesseract 漏字）
+    """
+
+    Output = type('Output', (), {'DICT': 'dict'})
+
+    def __init__(self, dropped=()):
+        self.dropped = set(dropped)
+        self.batch_calls = []
+        self.single_calls = []
+        font = _font()
+        self.templates = {}
+        for digit in '0123456789':
+            image = Image.new('RGB', (80, 80), BACKGROUND)
+            _draw_digit(ImageDraw.Draw(image), (10, 10), digit, font)
+            bgr = cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2BGR)
+            self.templates[digit] = _normalize(nonogram_recognizer._target_mask(bgr))
+
+    def _words(self, gray):
+        count, _, stats, _ = cv2.connectedComponentsWithStats((gray < 128).astype(np.uint8))
+        words = []
+        for i in range(1, count):
+            x, y, w, h, area = (int(v) for v in stats[i])
+            if area < 20:
+                continue
+            shape = _normalize(gray[y:y + h, x:x + w] < 128)
+            text = min(self.templates, key=lambda d: np.abs(self.templates[d] - shape).sum())
+            words.append((text, x, y, w, h))
+        return words
+
+    def image_to_data(self, sheet, config, output_type):
+        self.batch_calls.append(sheet.shape)
+        words = [word for word in self._words(sheet) if word[0] not in self.dropped]
+        return {key: [word[i] for word in words]
+                for i, key in enumerate(('text', 'left', 'top', 'width', 'height'))}
+
+    def image_to_string(self, gray, config):
+        self.single_calls.append(config)
+        return ''.join(text for text, *_ in sorted(self._words(gray), key=lambda word: word[1]))
+
+
+@pytest.fixture
+def tesseract(monkeypatch):
+    # 字形缓存只用内存层，且每个测试从空缓存开始
+    monkeypatch.delenv(glyph_cache.DB_PATH_ENV, raising=False)
+    monkeypatch.setattr(glyph_cache, '_default', None)
+
+    def install(**kwargs):
+        fake = FakeTesseract(**kwargs)
+        monkeypatch.setattr(nonogram_recognizer, 'pytesseract', fake)
+        return fake
+    return install
+
+
+@pytest.fixture(scope='module')
+def screen():
+    return _screen()
+
+
+def _column_digits(screen):
+    img, boxes = nonogram_recognizer.preprocess_clue_regions(screen[:2200])
+    _, col_digits, _, _ = nonogram_recognizer._split_digit_boxes(boxes)
+    return img, col_digits
+
+
+def _column_texts(ocr):
+    """列约束数字按（所在列, y）排序后的序列"""
+    return [text for _, _, text in sorted(ocr, key=lambda d: ((d[0] - BOARD_X) // CELL, d[1]))]
+
+
+COLUMN_TEXTS = [str(v) for clue in COLS for v in clue]
+
+
+def test_recognizes_synthesized_screen(tesseract, screen):
+    fake = tesseract()
+    result = nonogram_recognizer.recognize_from_source(screen)
+    assert {key: result[key] for key in ('row', 'col')} == EXPECTED
+    assert fake.batch_calls
+
+
+def test_tiled_batch_reads_every_glyph_in_one_call(tesseract, screen):
+    fake = tesseract()
+    img, col_digits = _column_digits(screen)
+    assert _column_texts(nonogram_recognizer._parallel_ocr(col_digits, img)) == COLUMN_TEXTS
+    # 相同的字形只识别一次：4 种数字拼成一张图，一次批量调用，不需要逐个重试
+    assert len(fake.batch_calls) == 1
+    assert fake.single_calls == []
+
+
+def test_glyphs_missed_by_batch_are_retried_singly(tesseract, screen):
+    fake = tesseract(dropped={'4'})
+    img, col_digits = _column_digits(screen)
+    assert _column_texts(nonogram_recognizer._parallel_ocr(col_digits, img)) == COLUMN_TEXTS
+    assert len(fake.batch_calls) == 1
+    # 只有批量结果中漏掉的字形逐个识别
+    assert len(fake.single_calls) == 1
+
+
+def test_tile_sheet_cells_map_words_back():
+    glyphs = [np.full((h, w), 255, dtype=np.uint8) for w, h in ((30, 50), (40, 60), (20, 40))] * 4
+    sheet, cells = nonogram_recognizer._tile_sheet(glyphs)
+    columns = nonogram_recognizer.BATCH_OCR_COLUMNS
+    assert len(cells) == len(glyphs)
+    assert sheet.shape == (2 * cells[0][3], columns * cells[0][2])
+
+    x, y, w, h = cells[9]
+    data = {'text': ['7', '1', ' ', '4'],
+            'left': [x + 5, x + 20, x + 1, cells[0][2] - 5],
+            'top': [y + 5, y + 5, y + 1, 5],
+            'width': [10, 10, 3, 10],
+            'height': [30, 30, 3, 30]}
+    texts = nonogram_recognizer._assign_words(data, cells)
+    # 同一格的单词按 x 拼接；跨越格子边界的单词丢弃
+    assert texts[9] == '71'
+    assert texts.count('') == len(cells) - 1
+
+
+def test_clue_regions_cover_full_frame_contours(screen):
+    img = screen[:2200]
+    regions = nonogram_recognizer.locate_clue_regions(img)
+    full = nonogram_recognizer._split_digit_boxes(
+        nonogram_recognizer._find_digit_boxes(nonogram_recognizer.ocr_preprocess(img)))
+    for x, y, w, h in full[0] + full[1]:
+        assert any(x0 <= x and y0 <= y and x + w <= x1 and y + h <= y1
+                   for x0, y0, x1, y1 in regions)
+    # 只处理数字附近的区域
+    pixels = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in regions)
+    assert pixels < img.shape[0] * img.shape[1] // 10
+
+    # 与整图处理得到相同的数字框
+    _, boxes = nonogram_recognizer.preprocess_clue_regions(img)
+    assert nonogram_recognizer._split_digit_boxes(boxes) == full
+
+
+def test_roi_and_full_frame_recognition_agree(tesseract, screen, monkeypatch):
+    tesseract()
+    roi = nonogram_recognizer.recognize_from_source(screen)
+    monkeypatch.setattr(nonogram_recognizer, 'preprocess_clue_regions', lambda img, debug_dir=None: None)
+    assert nonogram_recognizer.recognize_from_source(screen) == roi
+
+
+def test_no_clue_regions_on_blank_frame():
+    blank = np.zeros((2200, 1200, 3), dtype=np.uint8)
+    assert nonogram_recognizer.locate_clue_regions(blank) is None
+    assert nonogram_recognizer.preprocess_clue_regions(blank) is None
@@ -0,0 +1,383 @@
+import random
+
+import numpy as np
+import pytest
+
+import nonogram_benchmark
+import nonogram_solver
+
+
+@pytest.mark.parametrize('n', [3, 5, 15, 16, 19, 20, 25])
+def test_oversize_clue_has_no_solution(n):
+    # OCR 误读出的超长块（如 16x16 上的 [18]）视为无解，不能抛异常
+    rows = [[n + 2]] + [[1]] * (n - 1)
+    cols = [[1]] * n
+    assert nonogram_solver.solve(rows, cols) is None
+    assert nonogram_solver.Solver(rows, cols).solve() is None
+
+
+def test_oversize_clue_sum_has_no_solution():
+    # 单个块不超长，但块长之和加间隔超出线长
+    assert nonogram_solver._analyze_line_bits(0, 0, [3, 3], 6) is None
+    assert nonogram_solver._analyze_line_bits(0, 0, [3, 2], 6) is not None
+
+
+def test_update_clue_with_oversize_clue():
+    solver = nonogram_solver.Solver([[1], [1], [1]], [[1], [1], [1]])
+    solver.update_clue('row', 0, [7])
+    assert solver.solve() is None
+
+
+def _hard_puzzle(n, seed):
+    rng = random.Random(seed)
+    while True:
+        rows, cols = nonogram_benchmark.random_puzzle(n, nonogram_benchmark.HARD_DENSITY, rng)
+        if nonogram_benchmark._needs_search(rows, cols):
+            return rows, cols
+
+
+def _clues_of(grid):
+    n = len(grid)
+    return ([nonogram_benchmark._clues(row) for row in grid],
+            [nonogram_benchmark._clues([grid[r][c] for r in range(n)]) for c in range(n)])
+
+
+def test_search_solves_hard_puzzle(monkeypatch):
+    # 搜索内的逐线分析缓存写满时清空，不影响结果
+    monkeypatch.setattr(nonogram_solver, 'SEARCH_MEMO_LIMIT', 64)
+    rows, cols = _hard_puzzle(20, 'search-20')
+    grid = nonogram_solver.solve(rows, cols)
+    assert _clues_of(grid) == (rows, cols)
+
+
+def test_search_budget_raises(monkeypatch):
+    rows, cols = _hard_puzzle(20, 'search-20')
+    monkeypatch.setattr(nonogram_solver, 'SEARCH_PROBE_BUDGET', 1)
+    with pytest.raises(nonogram_solver.SearchLimitExceeded):
+        nonogram_solver.solve(rows, cols)
+    assert 'SearchLimitExceeded' in nonogram_solver._solve_record({'rows': rows, 'cols': cols})['error']
+
+    solver = nonogram_solver.Solver(rows, cols)
+    with pytest.raises(nonogram_solver.SearchLimitExceeded):
+        solver.solve()
+    # 放弃不记为已求解：放宽预算后重新搜索
+    monkeypatch.setattr(nonogram_solver, 'SEARCH_PROBE_BUDGET', 40000)
+    assert _clues_of(solver.solve()) == (rows, cols)
+
+
+def _mask(cells):
+    return sum(1 << j for j, v in enumerate(cells) if v)
+
+
+def _random_line(rng, n):
+    """随机解反推的约束与部分已知的线；约五分之一带一个与解相反的已知格"""
+    solution = [int(rng.random() < 0.55) for _ in range(n)]
+    cells = [v if rng.random() < 0.3 else -1 for v in solution]
+    if rng.random() < 0.2:
+        j = rng.randrange(n)
+        cells[j] = 1 - solution[j]
+    return cells, nonogram_benchmark._clues(solution)
+
+
+def _analyze_line_dp(cells, constraint):
+    """
+    逐线 DP 参考实现（left/right DP 表 + 前缀和 + 差分数组），用于核对位集实现的结论
+
+    返回 (强制填充的下标, 强制留空的下标, 是否无矛盾)
+    """
+    n = len(cells)
+
+    # 全空约束
+    if not constraint or constraint == [0]:
+        forced_zeros = []
+        for j in range(n):
+            if cells[j] == 1:
+                return None, None, False
+            if cells[j] == -1:
+                forced_zeros.append(j)
+        return [], forced_zeros, True
+
+    k = len(constraint)
+
+    # 前缀和：O(1) 区间查询
+    zero_pref = [0] * (n + 1)
+    for i in range(n):
+        zero_pref[i + 1] = zero_pref[i] + (1 if cells[i] == 0 else 0)
+
+    def has_zero(lo, hi):
+        return zero_pref[hi] - zero_pref[lo] > 0
+
+    # left[i][j]: 块 0..i-1 放入 cells[0..j-1]
+    left = [[False] * (n + 1) for _ in range(k + 1)]
+    left[0][0] = True
+    for j in range(1, n + 1):
+        left[0][j] = left[0][j - 1] and cells[j - 1] != 1
+
+    for i in range(1, k + 1):
+        blk = constraint[i - 1]
+        for j in range(1, n + 1):
+            if cells[j - 1] != 1 and left[i][j - 1]:
+                left[i][j] = True
+                continue
+            if j < blk:
+                continue
+            start = j - blk
+            if has_zero(start, j):
+                continue
+            if start > 0 and cells[start - 1] == 1:
+                continue
+            if start == 0:
+                left[i][j] = (i == 1)
+            else:
+                left[i][j] = left[i - 1][start - 1]
+
+    if not left[k][n]:
+        return None, None, False
+
+    # right[i][j]: 块 i..k-1 放入 cells[j..n-1]
+    right = [[False] * (n + 1) for _ in range(k + 1)]
+    right[k][n] = True
+    for j in range(n - 1, -1, -1):
+        right[k][j] = (cells[j] != 1) and right[k][j + 1]
+
+    for i in range(k - 1, -1, -1):
+        blk = constraint[i]
+        for j in range(n - 1, -1, -1):
+            if cells[j] != 1 and right[i][j + 1]:
+                right[i][j] = True
+                continue
+            end = j + blk
+            if end > n:
+                continue
+            if has_zero(j, end):
+                continue
+            if end < n and cells[end] == 1:
+                continue
+            next_j = end + 1 if end < n else n
+            if right[i + 1][next_j]:
+                right[i][j] = True
+
+    # can_be_0
+    can_be_0 = [False] * n
+    for j in range(n):
+        if cells[j] != -1:
+            continue
+        for i in range(k + 1):
+            if left[i][j] and right[i][j + 1]:
+                can_be_0[j] = True
+                break
+
+    # can_be_1：差分数组批量标记
+    diff = [0] * (n + 1)
+    for i in range(k):
+        blk = constraint[i]
+        for start in range(n - blk + 1):
+            end = start + blk
+            if has_zero(start, end):
+                continue
+            if start > 0 and cells[start - 1] == 1:
+                continue
+            if end < n and cells[end] == 1:
+                continue
+            if start == 0:
+                left_ok = (i == 0)
+            else:
+                left_ok = left[i][start - 1]
+            if not left_ok:
+                continue
+            next_j = end + 1 if end < n else n
+            if not right[i + 1][next_j]:
+                continue
+            diff[start] += 1
+            diff[end] -= 1
+
+    can_be_1 = [False] * n
+    cur = 0
+    for j in range(n):
+        cur += diff[j]
+        if cur > 0:
+            can_be_1[j] = True
+
+    # 收集结论
+    forced_ones = []
+    forced_zeros = []
+    for j in range(n):
+        if cells[j] != -1:
+            continue
+        if can_be_1[j] and not can_be_0[j]:
+            forced_ones.append(j)
+        elif can_be_0[j] and not can_be_1[j]:
+            forced_zeros.append(j)
+        elif not can_be_1[j] and not can_be_0[j]:
+            return None, None, False
+
+    return forced_ones, forced_zeros, True
+
+
+@pytest.mark.parametrize('n', [1, 2, 5, 16, 30])
+def test_bitset_analysis_matches_dp(n):
+    rng = random.Random(f'bitset-{n}')
+    for _ in range(500):
+        cells, constraint = _random_line(rng, n)
+        forced_ones, forced_zeros, ok = _analyze_line_dp(cells, constraint)
+        result = nonogram_solver._analyze_line_bits(
+            _mask(v == 1 for v in cells), _mask(v == 0 for v in cells), constraint, n)
+        assert (result is not None) == ok, (cells, constraint)
+        if ok:
+            assert result == (sum(1 << j for j in forced_ones), sum(1 << j for j in forced_zeros)), \
+                (cells, constraint)
+
+
+@pytest.mark.parametrize('n', [1, 5, 16, 25, 30])
+def test_vectorized_analysis_matches_scalar(n):
+    rng = random.Random(f'vectorized-{n}')
+    lines = [_random_line(rng, n) for _ in range(300)]
+    blocks, counts = nonogram_solver._pad_constraints([constraint for _, constraint in lines])
+    forced_ones, forced_zeros, ok = nonogram_solver._analyze_lines_np(
+        np.array([cells for cells, _ in lines], dtype=np.int8), blocks, counts)
+
+    for i, (cells, constraint) in enumerate(lines):
+        expected = nonogram_solver._analyze_line_bits(
+            _mask(v == 1 for v in cells), _mask(v == 0 for v in cells), constraint, n)
+        assert ok[i] == (expected is not None), (cells, constraint)
+        if expected is not None:
+            assert (_mask(forced_ones[i]), _mask(forced_zeros[i])) == expected, (cells, constraint)
+
+
+def _random_instance(rng, n):
+    """随机题目与部分已知的初始网格，部分题目改坏一行约束或一个已知格"""
+    solution = [[int(rng.random() < nonogram_benchmark.HARD_DENSITY) for _ in range(n)] for _ in range(n)]
+    rows, cols = _clues_of(solution)
+    grid = [[v if rng.random() < 0.1 else -1 for v in row] for row in solution]
+    if rng.random() < 0.2:
+        rows[rng.randrange(n)] = _random_line(rng, n)[1]
+    if rng.random() < 0.2:
+        r, c = rng.randrange(n), rng.randrange(n)
+        grid[r][c] = 1 - solution[r][c]
+    return grid, rows, cols
+
+
+def _propagated(propagate, grid, rows, cols):
+    nonogram_solver._LINE_MEMO.clear()  # 各路径共用逐线分析缓存，不能互相提供结论
+    grid = [row[:] for row in grid]
+    return propagate(grid, rows, cols), grid
+
+
+@pytest.mark.parametrize('n', [16, 20, 25])
+def test_vectorized_propagation_matches_scalar(n):
+    _check_propagation(nonogram_solver._propagate_vectorized, n)
+
+
+@pytest.mark.parametrize('n', [1, 5, 10, 15])
+def test_candidate_propagation_matches_scalar(n):
+    # 候选以 uint32 数组过滤、按位归约
+    _check_propagation(nonogram_solver._propagate_small, n)
+
+
+def _check_propagation(propagate, n):
+    """与逐线位集传播（_propagate_large）得到相同的不动点，矛盾的判断也一致"""
+    rng = random.Random(f'propagate-{n}')
+    for _ in range(30):
+        grid, rows, cols = _random_instance(rng, n)
+        ok, result = _propagated(propagate, grid, rows, cols)
+        expected_ok, expected = _propagated(nonogram_solver._propagate_large, grid, rows, cols)
+        assert ok == expected_ok
+        if ok:
+            assert result == expected
+
+
+def _full_propagation(rows, cols, givens):
+    n = len(rows)
+    grid = [[-1] * n for _ in range(n)]
+    for (r, c), v in givens.items():
+        grid[r][c] = v
+    nonogram_solver._LINE_MEMO.clear()
+    return nonogram_solver._propagate_large(grid, rows, cols), grid
+
+
+@pytest.mark.parametrize('n', [8, 18])
+def test_incremental_updates_match_full_solve(n):
+    rng = random.Random(f'incremental-{n}')
+    solution = [[int(rng.random() < 0.55) for _ in range(n)] for _ in range(n)]
+    true_rows, true_cols = _clues_of(solution)
+    rows, cols = [c[:] for c in true_rows], [c[:] for c in true_cols]
+    givens = {}
+    solver = nonogram_solver.Solver(rows, cols)
+
+    wrong = []
+    for _ in range(80):
+        action = rng.random()
+        if wrong and (action < 0.4 or len(wrong) > 1):
+            # 修正之前的错误：约束改回正确值，错误的给定格取消
+            kind, i, j = wrong.pop(rng.randrange(len(wrong)))
+            if kind == 'cell':
+                del givens[(i, j)]
+                solver.set_cells([(i, j, -1)])
+            else:
+                clue = (true_rows if kind == 'row' else true_cols)[i][:]
+                (rows if kind == 'row' else cols)[i] = clue
+                solver.update_clue(kind, i, clue)
+        elif action < 0.7:
+            # OCR 误读一条约束
+            kind, i = rng.choice(('row', 'col')), rng.randrange(n)
+            clue = _random_line(rng, n)[1]
+            if clue != (rows if kind == 'row' else cols)[i]:
+                wrong.append((kind, i, None))
+            (rows if kind == 'row' else cols)[i] = clue
+            solver.update_clue(kind, i, clue)
+        else:
+            # 给定一个格子（偶尔给错）
+            r, c = rng.randrange(n), rng.randrange(n)
+            if (r, c) in givens:
+                continue
+            v = solution[r][c] if rng.random() < 0.8 else 1 - solution[r][c]
+            if v != solution[r][c]:
+                wrong.append(('cell', r, c))
+            givens[(r, c)] = v
+            solver.set_cells([(r, c, v)])
+
+        ok, grid = _full_propagation(rows, cols, givens)
+        assert solver.consistent == ok
+        if ok:
+            assert solver.grid == grid
+        result = solver.solve()
+        if not givens:
+            assert (result is None) == (nonogram_solver.solve(rows, cols) is None)
+        if not ok:
+            assert result is None
+        elif result is not None:
+            assert _clues_of(result) == (rows, cols)
+            assert all(result[r][c] == v for (r, c), v in givens.items())
+
+
+def test_line_memo_is_bounded_lru():
+    memo = nonogram_solver._LineMemo(capacity=3)
+    calls = []
+
+    def compute(value):
+        return lambda: calls.append(value) or value
+
+    for key in 'abc':
+        memo.lookup(key, compute(key))
+    assert memo.lookup('a', compute('x')) == 'a'  # 命中后移到最新
+    memo.lookup('d', compute(None))               # 矛盾（None）同样缓存
+    assert memo.lookup('d', compute('y')) is None
+    assert list(memo._entries) == ['c', 'a', 'd']
+    assert calls == ['a', 'b', 'c', None]
+    assert memo.info() == {'hits': 2, 'misses': 4, 'hit_rate': 0.3333, 'size': 3, 'capacity': 3}
+
+    memo.capacity = 1  # 缩小容量后在下一次写入时淘汰
+    memo.lookup('e', compute('e'))
+    assert list(memo._entries) == ['e']
+    memo.clear()
+    assert memo.info()['size'] == memo.info()['hits'] == 0
+
+
+def test_solve_with_tiny_line_memo(monkeypatch):
+    monkeypatch.setattr(nonogram_solver, '_LINE_MEMO', nonogram_solver._LineMemo(capacity=4))
+    for n in (10, 20):
+        rows, cols = _hard_puzzle(n, f'memo-{n}')
+        assert _clues_of(nonogram_solver.solve(rows, cols)) == (rows, cols)
+        assert nonogram_solver.line_memo_info()['size'] <= 4
+    nonogram_solver.set_line_memo_capacity(2)
+    assert nonogram_solver.line_memo_info()['capacity'] == 2
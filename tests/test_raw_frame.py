@@ -0,0 +1,65 @@
+import struct
+
+import numpy as np
+import pytest
+
+from raw_frame import (PIXEL_FORMAT_BGRA_8888, PIXEL_FORMAT_RGB_888, PIXEL_FORMAT_RGBA_8888,
+                       parse_raw_screencap)
+
+
+def _pixels(width, height, bpp):
+    return np.arange(width * height * bpp, dtype=np.uint8).reshape(height, width, bpp)
+
+
+@pytest.mark.parametrize('header', [
+    lambda w, h, fmt: struct.pack('<3I', w, h, fmt),      # Android 8 及以下
+    lambda w, h, fmt: struct.pack('<4I', w, h, fmt, 0),   # Android 9 及以上（带 colorspace）
+])
+@pytest.mark.parametrize('fmt, bpp', [(PIXEL_FORMAT_RGBA_8888, 4), (PIXEL_FORMAT_RGB_888, 3)])
+def test_parses_both_header_versions(header, fmt, bpp):
+    pixels = _pixels(5, 3, bpp)
+    frame = parse_raw_screencap(header(5, 3, fmt) + pixels.tobytes())
+    assert (frame.width, frame.height, frame.format) == (5, 3, fmt)
+    assert np.array_equal(frame.pixels, pixels)
+    assert np.array_equal(frame.to_bgr(), pixels[:, :, 2::-1])
+
+
+def test_bgra_channel_order():
+    pixels = _pixels(4, 2, 4)
+    frame = parse_raw_screencap(struct.pack('<4I', 4, 2, PIXEL_FORMAT_BGRA_8888, 0) + pixels.tobytes())
+    assert np.array_equal(frame.to_bgr(), pixels[:, :, :3])
+    assert np.array_equal(frame.rgb, pixels[:, :, 2::-1])
+
+
+@pytest.mark.parametrize('data', [
+    b'',
+    struct.pack('<2I', 4, 2),                                            # 头部不完整
+    struct.pack('<4I', 4, 2, PIXEL_FORMAT_RGBA_8888, 0) + bytes(31),     # 像素少一个字节
+    struct.pack('<4I', 4, 2, PIXEL_FORMAT_RGBA_8888, 0) + bytes(33),     # 多出一个字节
+    struct.pack('<4I', 4, 2, 99, 0) + bytes(32),                         # 不支持的像素格式
+])
+def test_rejects_malformed_buffers(data):
+    with pytest.raises(ValueError):
+        parse_raw_screencap(data)
+
+
+def test_pixels_are_zero_copy_views():
+    pixels = _pixels(6, 4, 4)
+    buffer = bytearray(struct.pack('<4I', 6, 4, PIXEL_FORMAT_RGBA_8888, 0) + pixels.tobytes())
+    frame = parse_raw_screencap(buffer)
+    region = frame.region(1, 1, 3, 2)
+    assert np.shares_memory(frame.pixels, np.frombuffer(buffer, dtype=np.uint8))
+    assert np.shares_memory(region.pixels, frame.pixels)
+
+    buffer[16] = 255  # 第一个像素的 R 通道
+    assert frame.pixels[0, 0, 0] == 255
+    # 转换为 BGR 时才复制
+    assert not np.shares_memory(frame.to_bgr(), frame.pixels)
+
+
+def test_to_bytes_round_trip():
+    pixels = _pixels(3, 2, 4)
+    frame = parse_raw_screencap(struct.pack('<3I', 3, 2, PIXEL_FORMAT_RGBA_8888) + pixels.tobytes())
+    again = parse_raw_screencap(frame.region(1, 0, 2, 2).to_bytes())
+    assert (again.width, again.height) == (2, 2)
+    assert np.array_equal(again.pixels, pixels[:, 1:3])
@@ -0,0 +1,81 @@
+import cv2
+import numpy as np
+import pytest
+
+from image_source import encode_png
+from raw_frame import PIXEL_FORMAT_RGBA_8888, RawFrame, parse_raw_screencap
+from screenshot_render import (FORMAT_JPEG, FORMAT_PNG, FORMAT_RAW, parse_roi, parse_scale,
+                               render_screenshot)
+
+
+@pytest.fixture(scope='module')
+def screen():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, size=(120, 80, 3), dtype=np.uint8)
+
+
+@pytest.fixture(scope='module')
+def frame(screen):
+    rgba = np.dstack([screen[:, :, ::-1], np.full(screen.shape[:2], 255, dtype=np.uint8)])
+    return parse_raw_screencap(RawFrame(80, 120, PIXEL_FORMAT_RGBA_8888, rgba).to_bytes())
+
+
+def _decode(body):
+    return cv2.imdecode(np.frombuffer(body, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+@pytest.mark.parametrize('source', ['frame', 'png'])
+def test_png_roi_is_exact_crop(source, screen, frame):
+    body, content_type, headers = render_screenshot(
+        frame if source == 'frame' else encode_png(screen), FORMAT_PNG, roi=(10, 20, 30, 40))
+    assert content_type == 'image/png'
+    assert np.array_equal(_decode(body), screen[20:60, 10:40])
+    assert headers == {'X-Screen-Width': '80', 'X-Screen-Height': '120',
+                       'X-Roi': '10,20,30,40', 'X-Scale': '1'}
+
+
+def test_roi_is_clipped_to_screen(frame, screen):
+    body, _, headers = render_screenshot(frame, FORMAT_PNG, roi=(70, 100, 50, 50))
+    assert headers['X-Roi'] == '70,100,10,20'
+    assert np.array_equal(_decode(body), screen[100:, 70:])
+    with pytest.raises(ValueError):
+        render_screenshot(frame, FORMAT_PNG, roi=(80, 0, 10, 10))
+
+
+def test_scale_applies_after_roi(frame, screen):
+    body, content_type, headers = render_screenshot(frame, FORMAT_JPEG, roi=(0, 0, 40, 60), scale=0.5)
+    assert content_type == 'image/jpeg'
+    assert _decode(body).shape == (30, 20, 3)
+    assert headers['X-Scale'] == '0.5'
+
+    expected = cv2.resize(screen[:60, :40], (20, 30), interpolation=cv2.INTER_AREA)
+    png, _, _ = render_screenshot(frame, FORMAT_PNG, roi=(0, 0, 40, 60), scale=0.5)
+    assert np.array_equal(_decode(png), expected)
+
+
+def test_raw_format_keeps_pixel_format(frame):
+    body, content_type, headers = render_screenshot(frame, FORMAT_RAW, roi=(5, 6, 20, 10), scale=0.5)
+    assert content_type == 'application/octet-stream'
+    region = parse_raw_screencap(body)
+    assert (region.width, region.height, region.format) == (10, 5, PIXEL_FORMAT_RGBA_8888)
+
+    body, _, _ = render_screenshot(frame, FORMAT_RAW, roi=(5, 6, 20, 10))
+    assert np.array_equal(parse_raw_screencap(body).pixels, frame.pixels[6:16, 5:25])
+    with pytest.raises(ValueError):
+        render_screenshot(encode_png(np.zeros((4, 4, 3), dtype=np.uint8)), FORMAT_RAW)
+
+
+@pytest.mark.parametrize('value', ['1,2,3', '1,2,0,4', '-1,0,5,5', 'a,b,c,d'])
+def test_parse_roi_rejects(value):
+    with pytest.raises(ValueError):
+        parse_roi(value)
+
+
+def test_parse_query_values():
+    assert parse_roi(None) is None
+    assert parse_roi('1,2,3,4') == (1, 2, 3, 4)
+    assert parse_scale(None) == 1.0
+    assert parse_scale('0.25') == 0.25
+    for value in ('0', '1.5', 'x'):
+        with pytest.raises(ValueError):
+            parse_scale(value)
@@ -0,0 +1,83 @@
+import time
+
+import pytest
+
+import adb_client
+from adb_client import ADBClient, ADBError, ShellSession
+from fake_adb_server import DEFAULT_SERIAL, FakeADBServer
+
+
+@pytest.fixture
+def fake():
+    with FakeADBServer() as server:
+        yield server
+
+
+@pytest.fixture
+def session(fake):
+    session = ShellSession(ADBClient(port=fake.port, timeout=5))
+    yield session
+    session.close()
+
+
+def _taps(fake):
+    return [command for serial, kind, command in fake.commands if kind == 'sh']
+
+
+class _BrokenSocket:
+    """sendall 失败的连接（模拟写入中途断开）"""
+
+    def __init__(self, sock):
+        self._sock = sock
+
+    def sendall(self, data):
+        raise BrokenPipeError('broken pipe')
+
+    def close(self):
+        self._sock.close()
+
+
+def test_batches_run_in_submit_order(fake, session):
+    seqs = [session.submit([f'input tap {i} {i}', f'input tap {i} {i + 1}']) for i in range(3)]
+    assert seqs == sorted(seqs)
+    for seq in reversed(seqs):
+        session.wait(seq)
+    assert _taps(fake) == [f'input tap {i} {i + d}' for i in range(3) for d in (0, 1)]
+    assert all(serial == DEFAULT_SERIAL for serial, _, _ in fake.commands)
+    assert fake.requests.count(adb_client.SHELL_SESSION_SERVICE) == 1
+
+
+def test_failed_write_is_not_replayed(fake, session):
+    session.run(['input tap 1 1'])
+    session._sock = _BrokenSocket(session._sock)
+    with pytest.raises(ADBError):
+        session.submit(['input tap 2 2'])
+    # 下一批重连执行，失败的批次不重发
+    session.run(['input tap 3 3'])
+    assert _taps(fake) == ['input tap 1 1', 'input tap 3 3']
+    assert fake.requests.count(adb_client.SHELL_SESSION_SERVICE) == 2
+
+
+def test_reconnects_after_peer_closes(fake, session):
+    session.run(['input tap 1 1'])
+    seq = session.submit(['exit'])  # 远端 sh 退出，哨兵不会回显
+    with pytest.raises(ADBError):
+        session.wait(seq)
+    session.run(['input tap 2 2'])
+    assert _taps(fake) == ['input tap 1 1', 'input tap 2 2']
+    assert fake.requests.count(adb_client.SHELL_SESSION_SERVICE) == 2
+
+
+def test_wait_raises_for_pruned_failure(fake, session, monkeypatch):
+    monkeypatch.setattr(adb_client, 'FAILED_RETENTION', 2)
+    first = session.submit(['exit'])
+    while not session.done(first):
+        time.sleep(0.01)
+    for i in range(3):
+        session.run([f'input tap {i} {i}'])
+    second = session.submit(['exit'])
+    with pytest.raises(ADBError):
+        session.wait(second)
+    # 第一个失败批次的记录已被丢弃，不能当作成功
+    with pytest.raises(ADBError, match='已丢弃'):
+        session.wait(first)
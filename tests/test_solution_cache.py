@@ -0,0 +1,51 @@
+import pytest
+
+import nonogram_solver
+import solution_cache
+from solution_cache import HIT_DISK, MISS, SolutionCache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    path = str(tmp_path / 'solutions.sqlite3')
+    monkeypatch.setattr(solution_cache, '_default', SolutionCache(path))
+    yield path
+    solution_cache._default.close()
+
+
+def _disk_lookup(path, rows, cols):
+    disk = SolutionCache(path, capacity=0)
+    try:
+        return disk.lookup(solution_cache.KIND_NONOGRAM, solution_cache.nonogram_key(rows, cols))
+    finally:
+        disk.close()
+
+
+def test_complete_grid_is_cached(cache):
+    rows = cols = [[3], [1, 1], [3]]
+    grid = solution_cache.solve_nonogram(rows, cols)
+    assert _disk_lookup(cache, rows, cols) == (HIT_DISK, grid)
+
+
+def test_unsolvable_puzzle_is_not_cached(cache):
+    rows, cols = [[3], [3], [3]], [[1], [1], [1]]
+    assert solution_cache.solve_nonogram(rows, cols) is None
+    assert _disk_lookup(cache, rows, cols) == (MISS, None)
+
+
+def test_partial_grid_is_not_cached(cache, monkeypatch):
+    # 未知约束只做传播，结果含 -1
+    rows, cols = [[-1], [1], [1]], [[1], [1], [-1]]
+    partial = [[-1] * 3 for _ in range(3)]
+    monkeypatch.setattr(nonogram_solver, 'solve', lambda r, c: partial)
+    assert solution_cache.solve_nonogram(rows, cols) == partial
+    assert _disk_lookup(cache, rows, cols) == (MISS, None)
+
+
+def test_nonogram_key_includes_solver_version(monkeypatch):
+    rows = cols = [[1]]
+    key = solution_cache.nonogram_key(rows, cols)
+    assert solution_cache.nonogram_key([[1]], [[1]]) == key
+    assert solution_cache.nonogram_key([[0]], [[0]]) == solution_cache.nonogram_key([[]], [[]])
+    monkeypatch.setattr(nonogram_solver, 'SOLVER_VERSION', nonogram_solver.SOLVER_VERSION + 1)
+    assert solution_cache.nonogram_key(rows, cols) != key